@@ -1,8 +1,15 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError
-from utils import load_video_paths, get_video_sequence
+import html
+from utils import get_video_sequence
+from config import get_config
+from catalog import get_catalog
+import metrics
+import telemetry
+from search import get_search_index
+from stitch import get_stitcher
+from decision_tree import get_decision_tree, canonical_path, path_slug, format_step_text, FINAL_STEP
 
 #==============================================================================
 # APPLICATION CONFIGURATION
@@ -15,14 +22,245 @@ st.set_page_config(
     layout="wide"
 )
 
+# Player library for browsers without native HLS support
+HLS_JS_URL = "https://cdn.jsdelivr.net/npm/hls.js@1"
+
+# Query parameter holding the selected path, e.g. ?path=superficial/heel/sheet
+PATH_QUERY_PARAM = "path"
+
+#==============================================================================
+# RESOURCE LOADING
+#==============================================================================
+# Video paths (either from local storage or S3 bucket) come from the
+# process-wide catalog, so reruns do not rescan the video directory
+catalog = get_catalog()
+
+# The decision tree is compiled once per process from decision_tree.json
+tree = get_decision_tree()
+
+# Application settings (playback mode etc.)
+config = get_config()
+
+# Metrics endpoint / JSON dump, started once per process
+metrics.start_metrics_export(config)
+
+#==============================================================================
+# HELPER FUNCTIONS
+#==============================================================================
+def reset_guide():
+    """Return to the first step with no selections"""
+    st.session_state.current_step = tree.start
+    st.session_state.selected_videos = []
+    st.session_state.video_sequence = []
+    st.session_state.current_video = 0
+    st.session_state.video_start = {}
+
+def jump_to_video(hit):
+    """Open the video sequence of a search hit at the matching video (and transcript cue)"""
+    st.session_state.selected_videos = tree.selections_for(hit.path)
+    st.session_state.current_step = tree.step_for_path(hit.path)
+    st.session_state.current_video = hit.position
+    st.session_state.video_start = {hit.ref: int(hit.start_time)} if hit.start_time else {}
+    st.session_state.search_query = ""
+
+def sync_query_path():
+    """
+    Keep the selected path and the ?path= query parameter in step
+
+    A path in the URL that the session has not seen yet (a bookmark, QR
+    code or shared link) replaces the session's selections, so the guide
+    opens at that step in this same run. Otherwise the URL is updated to
+    follow the session after buttons, Back and Restart.
+    """
+    url_slug = st.query_params.get(PATH_QUERY_PARAM, "")
+    previous_slug = st.session_state.get("synced_path")
+    from_link = url_slug != (previous_slug or "")
+    
+    if from_link:
+        path = tree.path_for_slug(url_slug)
+        if path is not None:
+            st.session_state.selected_videos = tree.selections_for(path)
+            st.session_state.current_step = tree.step_for_path(path)
+            st.session_state.current_video = 0
+        else:
+            st.warning(f"The link's guide path '{url_slug}' does not exist; please choose the options below.")
+    
+    slug = path_slug(canonical_path(st.session_state.selected_videos))
+    st.session_state.synced_path = slug
+    
+    # Every step transition (buttons, Back, Restart, links) passes through here
+    if slug != previous_slug:
+        st.session_state.path_visit = st.session_state.get("path_visit", 0) + 1
+        telemetry.record('step', path=slug, step=st.session_state.current_step,
+                         source='link' if from_link else 'app')
+    if slug != url_slug:
+        if slug:
+            st.query_params[PATH_QUERY_PARAM] = slug
+        else:
+            del st.query_params[PATH_QUERY_PARAM]
+
+def first_shown(ref, view):
+    """
+    Whether a video is shown for the first time in this view of the sequence
+
+    Reruns that do not move to another path or video show the same view
+    again, so plays and served videos are only counted the first time.
+    """
+    shown_view, shown = st.session_state.get("shown_videos", (None, set()))
+    if shown_view != view:
+        shown = set()
+        st.session_state.shown_videos = (view, shown)
+    if ref in shown:
+        return False
+    shown.add(ref)
+    return True
+
+def render_video(ref, title):
+    """Embed the player for a video reference"""
+    view = (st.session_state.get("path_visit"), st.session_state.get("current_video", 0))
+    new_play = first_shown(ref, view)
+    if new_play:
+        telemetry.record('play', ref=ref)
+    
+    # Search hits on a transcript cue start playback at that cue
+    start_time = st.session_state.get("video_start", {}).get(ref, 0)
+    
+    # Check if this reference has a corresponding video file
+    video_path = catalog.get(ref, "")
+    media = catalog.media_info(ref)
+    
+    # Files that are not real MP4/MOV videos (e.g. placeholders) get the placeholder
+    if media is not None and not media['valid']:
+        video_path = ""
+    
+    # Case 1: Local file exists
+    if video_path and os.path.exists(video_path):
+        if new_play:
+            metrics.inc('videos_served_total', ref=ref, source='app')
+        with metrics.span('render_video', source='file'):
+            st.video(video_path, start_time=start_time)
+    
+    # Case 2: HLS package with adaptive bitrate (local video server)
+    elif video_path.endswith(".m3u8"):
+        if new_play:
+            metrics.inc('videos_served_total', ref=ref, source='app')
+        with metrics.span('render_video', source='hls'):
+            render_hls_player(video_path, start_time)
+    
+    # Case 3: URL (S3 or the local video server)
+    elif video_path and video_path.startswith("http"):
+        try:
+            if new_play:
+                metrics.inc('videos_served_total', ref=ref, source='app')
+            with metrics.span('render_video', source='url'):
+                st.video(video_path, start_time=start_time)
+        except Exception as e:
+            st.error(f"Error displaying video: {str(e)}")
+            st.info(f"You can access the video directly at: [{video_path}]({video_path})")
+    
+    # Case 4: Fallback to placeholder
+    else:
+        st.info(f"Video placeholder for {title} (Reference: {ref})")
+        
+        # Create visual placeholder
+        st.markdown(
+            f"""
+            <div style="background-color: #e0e0e0; padding: 100px; border-radius: 5px; text-align: center;">
+                <h3>Video: {title}</h3>
+                <p>Reference: {ref}</p>
+            </div>
+            """, 
+            unsafe_allow_html=True
+        )
+
+def render_hls_player(playlist_url, start_time=0):
+    """Embed a player that switches HLS renditions to match bandwidth"""
+    # Safari/iOS play HLS natively; other browsers need hls.js
+    components.html(
+        f"""
+        <video id="player" controls playsinline style="width: 100%; max-height: 480px;"></video>
+        <script src="{HLS_JS_URL}"></script>
+        <script>
+            const video = document.getElementById("player");
+            const start = {start_time};
+            if (video.canPlayType("application/vnd.apple.mpegurl")) {{
+                video.src = "{playlist_url}";
+                video.addEventListener("loadedmetadata", () => {{ video.currentTime = start; }}, {{ once: true }});
+            }} else if (window.Hls && Hls.isSupported()) {{
+                const hls = new Hls({{ startPosition: start }});
+                hls.loadSource("{playlist_url}");
+                hls.attachMedia(video);
+            }}
+        </script>
+        """,
+        height=500
+    )
+
+def render_preload(url):
+    """Let the browser start buffering a video the user will probably play next"""
+    # A component iframe keeps the <video> element, which Streamlit's
+    # markdown sanitizing does not promise to; the response lands in the
+    # browser's HTTP cache for the real player to reuse
+    components.html(
+        f'<video src="{html.escape(url)}" preload="auto" muted playsinline></video>',
+        height=0
+    )
+
+def render_stitched_video(stream, current):
+    """Embed one player for a whole stitched sequence, starting at the current video"""
+    ref, _, chapter_start = stream.chapters[current]
+    # Search hits on a transcript cue start playback at that cue
+    start_time = int((chapter_start or 0) + st.session_state.get("video_start", {}).get(ref, 0))
+    
+    # Jumping between chapters keeps playing the same stream
+    view = (st.session_state.get("path_visit"), 'stitched')
+    for chapter_ref, _, _ in stream.chapters:
+        if first_shown(chapter_ref, view):
+            telemetry.record('play', ref=chapter_ref, stitched=True)
+            metrics.inc('videos_served_total', ref=chapter_ref, source='stitched')
+    
+    with metrics.span('render_video', source='stitched'):
+        if stream.source.endswith(".m3u8"):
+            render_hls_player(stream.source, start_time)
+        else:
+            st.video(stream.source, start_time=start_time)
+    
+    # Chapter list: jump to any video of the sequence
+    for i, (chapter_ref, title, start) in enumerate(stream.chapters):
+        timestamp = f"{int(start) // 60}:{int(start) % 60:02d} " if start is not None else ""
+        if st.button(f"{timestamp}{i+1}. {title} (Ref: {chapter_ref})", key=f"chapter_{i}",
+                     disabled=start is None):
+            st.session_state.current_video = i
+            st.session_state.video_start = {}
+            st.rerun()
+
+def render_poster(ref, title):
+    """Show a lightweight stand-in for a video that is not loaded yet"""
+    # Poster frame generated by generate_thumbnails.py, if available
+    poster = catalog.poster_for(ref)
+    if poster:
+        st.image(poster, caption=f"{title} (Reference: {ref})", width=320)
+        return
+    
+    st.markdown(
+        f"""
+        <div style="background-color: #e0e0e0; padding: 24px; border-radius: 5px; text-align: center;">
+            <strong>{title}</strong><br/>
+            <small>Reference: {ref}</small>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
 #==============================================================================
 # SESSION STATE INITIALIZATION
 #==============================================================================
 # Initialize session state variables to track user progress through the flow
 if 'current_step' not in st.session_state:
-    st.session_state.current_step = 'start'
-    st.session_state.selected_videos = []
-    st.session_state.video_sequence = []
+    reset_guide()
+
+# Deep links (?path=...) resolve here, before anything is rendered
+sync_query_path()
 
 #==============================================================================
 # MAIN INTERFACE HEADER
@@ -31,12 +269,6 @@ if 'current_step' not in st.session_state:
 st.title("Wound Care Video Guide System")
 st.markdown("---")
 
-#==============================================================================
-# VIDEO RESOURCE LOADING
-#==============================================================================
-# Load video paths (either from local storage or S3 bucket)
-videos = load_video_paths()
-
 #==============================================================================
 # SIDEBAR NAVIGATION
 #==============================================================================
@@ -45,34 +277,41 @@ with st.sidebar:
     
     # Reset button to start over
     if st.button("Restart Guide"):
-        st.session_state.current_step = 'start'
-        st.session_state.selected_videos = []
-        st.session_state.video_sequence = []
+        reset_guide()
         st.rerun()
     
     # Back button (only shown when not at start)
-    if st.session_state.current_step != 'start':
+    if st.session_state.current_step != tree.start:
         if st.button("Back to Previous Step"):
             if len(st.session_state.selected_videos) > 0:
                 # Remove the last selection
                 st.session_state.selected_videos.pop()
                 
-                # Reset to start if no selections remain
-                if len(st.session_state.selected_videos) == 0:
-                    st.session_state.current_step = 'start'
-                else:
-                    # Otherwise set appropriate step based on the last remaining selection
-                    last_selection = st.session_state.selected_videos[-1]
-                    if "type_of_wound" in last_selection:
-                        st.session_state.current_step = 'type_selection'
-                    elif "location" in last_selection:
-                        st.session_state.current_step = 'location_selection'
-                    elif "dressing" in last_selection:
-                        st.session_state.current_step = 'dressing_selection'
+                # The step for the remaining selections is a table lookup
+                remaining_path = canonical_path(st.session_state.selected_videos)
+                st.session_state.current_step = tree.step_for_path(remaining_path) or tree.start
+                st.session_state.current_video = 0
                 
                 # Refresh the page with the new state
                 st.rerun()
     
+    # Search titles, option labels and transcripts without clicking through the tree
+    st.header("Search")
+    query = st.text_input("Search videos", key="search_query", placeholder="e.g. heel, iodosorb, saline")
+    if query.strip():
+        # Videos shown in several paths open in the path used most often
+        hits = get_search_index().search(query, limit=5, path_counts=dict(telemetry.hot_paths()))
+        if not hits:
+            st.caption("No matching videos")
+        for hit in hits:
+            if hit.path is None:
+                continue
+            st.button(f"{hit.title} (Ref: {hit.ref})", key=f"search_hit_{hit.ref}",
+                      on_click=jump_to_video, args=(hit,), use_container_width=True)
+            if hit.snippet:
+                minutes, seconds = divmod(int(hit.start_time), 60)
+                st.caption(f"{minutes}:{seconds:02d} {hit.snippet}")
+    
     # About section with app description
     st.header("About")
     st.info("""
@@ -87,151 +326,47 @@ with st.sidebar:
 #==============================================================================
 
 #------------------------------------------------------------------------------
-# STEP 1: WOUND TYPE SELECTION
+# SELECTION STEPS (wound type, location, dressing)
 #------------------------------------------------------------------------------
-if st.session_state.current_step == 'start':
-    st.header("Select Type of Wound")
-    
-    # Create two columns for the wound type buttons
-    wound_type_col1, wound_type_col2 = st.columns(2)
-    
-    # First column of wound type options
-    with wound_type_col1:
-        # Option 1: Superficial Wound
-        if st.button("Superficial Wound", use_container_width=True):
-            st.session_state.selected_videos.append({"type_of_wound": "superficial"})
-            st.session_state.current_step = 'location_selection'
-            st.rerun()
-        
-        # Option 2: Cavity/Concave Wound
-        if st.button("Cavity/Concave Wound", use_container_width=True):
-            st.session_state.selected_videos.append({"type_of_wound": "cavity"})
-            st.session_state.current_step = 'location_selection'
-            st.rerun()
+# Steps, their options and transitions are defined in decision_tree.json
+if st.session_state.current_step in tree.steps:
+    step = tree.steps[st.session_state.current_step]
+    path = canonical_path(st.session_state.selected_videos)
     
-    # Second column of wound type options
-    with wound_type_col2:
-        # Option 3: Webspace Wound (direct path)
-        if st.button("Webspace Wound", use_container_width=True):
-            st.session_state.selected_videos.append({"type_of_wound": "webspace", "video_ref": "2.3"})
-            st.session_state.current_step = 'final'
-            st.rerun()
-        
-        # Option 4: Multiple toe wounds (direct path)
-        if st.button("Multiple toe wounds with inadine", use_container_width=True):
-            st.session_state.selected_videos.append({"type_of_wound": "multiple_toes", "video_ref": "2.4"})
-            st.session_state.current_step = 'final'
-            st.rerun()
-        
-        # Option 5: Povidone iodine wounds (direct path)
-        if st.button("Wounds for povidone iodine soaked gauze", use_container_width=True):
-            st.session_state.selected_videos.append({"type_of_wound": "povidone", "video_ref": "2.5"})
-            st.session_state.current_step = 'final'
-            st.rerun()
-
-#------------------------------------------------------------------------------
-# STEP 2: WOUND LOCATION SELECTION
-#------------------------------------------------------------------------------
-# Only shown for superficial and cavity wounds
-elif st.session_state.current_step == 'location_selection':
-    st.header("Select Location of Wound")
-    
-    # Display the previously selected wound type
-    wound_type = st.session_state.selected_videos[0]["type_of_wound"]
-    st.subheader(f"Selected Wound Type: {wound_type.replace('_', ' ').title()}")
-    
-    # Create three columns for location options
-    location_col1, location_col2, location_col3 = st.columns(3)
-    
-    # First column: Toes location
-    with location_col1:
-        if st.button("Toes", use_container_width=True):
-            st.session_state.selected_videos.append({"location": "toes", "video_ref": "3.1"})
-            # Different next step based on wound type
-            if wound_type == "superficial":
-                st.session_state.current_step = 'primary_dressing'
-            else:  # cavity
-                st.session_state.current_step = 'cavity_dressing'
-            st.rerun()
-    
-    # Second column: Mid foot/ankle location
-    with location_col2:
-        if st.button("Mid foot/ankle", use_container_width=True):
-            st.session_state.selected_videos.append({"location": "midfoot", "video_ref": "3.2"})
-            # Different next step based on wound type
-            if wound_type == "superficial":
-                st.session_state.current_step = 'primary_dressing'
-            else:  # cavity
-                st.session_state.current_step = 'cavity_dressing'
-            st.rerun()
-    
-    # Third column: Heel location
-    with location_col3:
-        if st.button("Heel", use_container_width=True):
-            st.session_state.selected_videos.append({"location": "heel", "video_ref": "3.3"})
-            # Different next step based on wound type
-            if wound_type == "superficial":
-                st.session_state.current_step = 'primary_dressing'
-            else:  # cavity
-                st.session_state.current_step = 'cavity_dressing'
-            st.rerun()
-
-#------------------------------------------------------------------------------
-# STEP 3A: PRIMARY DRESSING SELECTION (FOR SUPERFICIAL WOUNDS)
-#------------------------------------------------------------------------------
-elif st.session_state.current_step == 'primary_dressing':
-    st.header("Select Type of Primary Dressing")
+    st.header(step.header)
     
     # Display previously selected options
-    wound_type = st.session_state.selected_videos[0]["type_of_wound"]
-    location = st.session_state.selected_videos[1]["location"]
+    if step.subheader:
+        st.subheader(format_step_text(step.subheader, path))
     
-    st.subheader(f"Selected Wound: {wound_type.replace('_', ' ').title()} wound at {location.replace('_', ' ').title()}")
+    if step.info:
+        st.info(step.info)
     
-    # Create two columns for dressing options
-    dressing_col1, dressing_col2 = st.columns(2)
+    # Lay the options out in the columns given by the tree
+    columns = st.columns(step.columns)
     
-    # First column: Sheet dressing option
-    with dressing_col1:
-        if st.button("Sheet dressing", use_container_width=True):
-            st.session_state.selected_videos.append({"dressing": "sheet", "video_ref": "2.1.1"})
-            st.session_state.current_step = 'final'
-            st.rerun()
-    
-    # Second column: Iodosorb powder/Gels option
-    with dressing_col2:
-        if st.button("Iodosorb powder/Gels", use_container_width=True):
-            st.session_state.selected_videos.append({"dressing": "iodosorb", "video_ref": "2.1.2"})
-            st.session_state.current_step = 'final'
-            st.rerun()
-
-#------------------------------------------------------------------------------
-# STEP 3B: CAVITY WOUND TREATMENT (FOR CAVITY WOUNDS)
-#------------------------------------------------------------------------------
-elif st.session_state.current_step == 'cavity_dressing':
-    st.header("Cavity Wound Treatment")
-    
-    # Display previously selected options
-    wound_type = st.session_state.selected_videos[0]["type_of_wound"]
-    location = st.session_state.selected_videos[1]["location"]
-    
-    st.subheader(f"Selected Wound: {wound_type.replace('_', ' ').title()} wound at {location.replace('_', ' ').title()}")
-    
-    st.info("For cavity/concave wounds, cut dressing to conform to wound shape")
-    
-    # Single option for cavity wounds
-    if st.button("Primary Dressing for Cavity Wounds"):
-        st.session_state.selected_videos.append({"dressing": "cavity_primary", "video_ref": "2.2.1"})
-        st.session_state.current_step = 'final'
-        st.rerun()
+    for option in step.options:
+        with columns[option.column]:
+            if st.button(option.label, use_container_width=True):
+                st.session_state.selected_videos.append(dict(option.selection))
+                # Next step depends on the whole path, precomputed by the tree
+                st.session_state.current_step = tree.next_step(path, step, option)
+                st.session_state.current_video = 0
+                st.rerun()
 
 #------------------------------------------------------------------------------
 # FINAL STEP: VIDEO SEQUENCE DISPLAY
 #------------------------------------------------------------------------------
-elif st.session_state.current_step == 'final':
+elif st.session_state.current_step == FINAL_STEP:
     # Determine the complete video sequence based on all selections
     st.session_state.video_sequence = get_video_sequence(st.session_state.selected_videos)
     
+    # Once per arrival at this page, not on every rerun
+    if st.session_state.get("sequence_visit") != st.session_state.get("path_visit"):
+        st.session_state.sequence_visit = st.session_state.get("path_visit")
+        telemetry.record('sequence', path=st.session_state.synced_path,
+                         refs=[video["ref"] for video in st.session_state.video_sequence])
+    
     st.header("Wound Care Video Guide")
     
     #--------------------------------------------------
@@ -252,46 +387,59 @@ elif st.session_state.current_step == 'final':
     #--------------------------------------------------
     st.subheader("Video Sequence:")
     
+    sequence = st.session_state.video_sequence
+    current = min(st.session_state.get("current_video", 0), len(sequence) - 1)
+    
+    # Continuous mode plays the whole sequence as one stitched stream once it
+    # is built; until then (or if it cannot be stitched) each video plays alone
+    stitcher = get_stitcher()
+    stream = stitcher.get(sequence) if stitcher is not None else None
+    
+    if stream is not None:
+        render_stitched_video(stream, current)
+    
     # Loop through each video in the sequence
-    for i, video_info in enumerate(st.session_state.video_sequence):
+    for i, video_info in enumerate(sequence if stream is None else ()):
         ref = video_info.get("ref", "")
         title = video_info.get("title", "")
         
+        # Eager mode embeds every player; lazy mode only the current one
+        is_active = not config["LAZY_PLAYBACK"] or i == current
+        
         # Create an expandable section for each video
-        with st.expander(f"{i+1}. {title} (Ref: {ref})", expanded=True):
-            # Check if this reference has a corresponding video file
-            video_path = videos.get(ref, "")
-            
-            # Case 1: Local file exists
-            if video_path and os.path.exists(video_path):
-                st.video(video_path)
-            
-            # Case 2: S3 URL
-            elif video_path and video_path.startswith("http"):
-                try:
-                    st.video(video_path)
-                except Exception as e:
-                    st.error(f"Error displaying video: {str(e)}")
-                    st.info(f"You can access the video directly at: [{video_path}]({video_path})")
-            
-            # Case 3: Fallback to placeholder
+        with st.expander(f"{i+1}. {title} (Ref: {ref})", expanded=is_active):
+            if is_active:
+                render_video(ref, title)
             else:
-                st.info(f"Video placeholder for {title} (Reference: {ref})")
-                
-                # Create visual placeholder
-                st.markdown(
-                    f"""
-                    <div style="background-color: #e0e0e0; padding: 100px; border-radius: 5px; text-align: center;">
-                        <h3>Video: {title}</h3>
-                        <p>Reference: {ref}</p>
-                    </div>
-                    """, 
-                    unsafe_allow_html=True
-                )
+                # Lightweight poster until the user asks for this video
+                render_poster(ref, title)
+                if st.button("Play this video", key=f"play_video_{i}"):
+                    st.session_state.current_video = i
+                    st.rerun()
+    
+    if config["LAZY_PLAYBACK"] and stream is None:
+        #--------------------------------------------------
+        # Step through the sequence one player at a time
+        #--------------------------------------------------
+        previous_col, next_col = st.columns(2)
+        
+        with previous_col:
+            if current > 0 and st.button("Previous Video", use_container_width=True):
+                st.session_state.current_video = current - 1
+                st.rerun()
+        
+        with next_col:
+            if current < len(sequence) - 1 and st.button("Next Video", use_container_width=True):
+                st.session_state.current_video = current + 1
+                st.rerun()
+        
+        # Let the browser start buffering the next video in the background
+        if config["PRELOAD_NEXT_VIDEO"] and current < len(sequence) - 1:
+            next_url = catalog.get(sequence[current + 1]["ref"], "")
+            if next_url.startswith("http"):
+                render_preload(next_url)
     
     # Button to start a new guide
     if st.button("Start New Guide"):
-        st.session_state.current_step = 'start'
-        st.session_state.selected_videos = []
-        st.session_state.video_sequence = []
+        reset_guide()
         st.rerun()
\ No newline at end of file
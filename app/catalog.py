@@ -0,0 +1,467 @@
+import os
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+import metrics
+from config import get_config
+from mp4info import probe_file
+from utils import (
+    load_local_videos,
+    get_local_video_dir,
+    parse_video_filename,
+    parse_thumbnail_filename,
+    parse_transcript_filename,
+    file_content_hash,
+    read_into_page_cache,
+    thumbnail_filename,
+    transcript_filename,
+    hls_package_relpath,
+    HLS_MASTER_PLAYLIST,
+)
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# VIDEO CATALOG
+#==============================================================================
+# Shared empty mapping for catalogs without their own titles or transcripts
+_NO_TITLES = MappingProxyType({})
+
+class VideoCatalog:
+    """
+    Process-wide, thread-safe mapping of video references to their locations
+
+    The mapping is built once by a loader function and published as a
+    read-only snapshot. Streamlit reruns read the snapshot without taking a
+    lock or touching the disk; it is only rebuilt when it has expired or
+    when a subclass reports a change.
+    """
+
+    # Label of this catalog's metrics
+    kind = 'base'
+
+    # Compiled CatalogManifest the catalog serves, if any
+    manifest = None
+
+    def __init__(self, loader, ttl=0):
+        """
+        Args:
+            loader: Callable returning a dictionary of references to paths/URLs
+            ttl: Seconds before the snapshot is rebuilt (0 = never expire)
+        """
+        self._loader = loader
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._videos = MappingProxyType({})
+        self._loaded_at = None
+        self.version = 0
+
+    #--------------------------------------------------------------------------
+    # Snapshot access
+    #--------------------------------------------------------------------------
+    def videos(self):
+        """Return the current read-only mapping of references to paths/URLs"""
+        if self._needs_refresh():
+            with self._lock:
+                # Another thread may have refreshed while we waited
+                if self._needs_refresh():
+                    self._publish(self._load_snapshot())
+        return self._videos
+
+    def get(self, ref, default=None):
+        """Look up the path/URL for a single video reference"""
+        return self.videos().get(ref, default)
+
+    def titles(self):
+        """Return titles provided by the storage itself (none by default)"""
+        return _NO_TITLES
+
+    def poster_for(self, ref):
+        """Return the poster image path/URL for a reference, if one exists"""
+        return None
+
+    def transcripts(self):
+        """Return references mapped to local WebVTT transcript paths (none by default)"""
+        return _NO_TITLES
+
+    def media_info(self, ref):
+        """Return the MP4 header details of a reference (see mp4info.probe), if known"""
+        return None
+
+    def content_version(self, ref):
+        """Return a string that changes whenever a reference's video content changes, if known"""
+        return None
+
+    def preload(self, ref):
+        """Make a reference's video local and warm (e.g. in the page cache); returns whether it is"""
+        return False
+
+    def refresh(self):
+        """Force a full rebuild of the catalog"""
+        with self._lock:
+            self._publish(self._load_snapshot())
+
+    def use_manifest(self, manifest):
+        """Switch to another compiled manifest (e.g. a new shared snapshot) and republish"""
+        with self._lock:
+            self.manifest = manifest
+            self._publish(self._load_snapshot())
+
+    def _load_snapshot(self):
+        metrics.inc('catalog_refreshes_total', catalog=self.kind)
+        with metrics.span('catalog_refresh', catalog=self.kind):
+            return self._loader()
+
+    def _needs_refresh(self):
+        if self._loaded_at is None:
+            return True
+        return bool(self._ttl) and time.monotonic() - self._loaded_at > self._ttl
+
+    def _publish(self, videos):
+        # Swap in a new snapshot instead of mutating the old one, so readers
+        # holding a reference never see a half-updated mapping
+        self._loaded_at = time.monotonic()
+        if self.version and videos == self._videos:
+            return
+        self._videos = MappingProxyType(dict(videos))
+        self.version += 1
+        metrics.inc('catalog_updates_total', catalog=self.kind)
+        logger.info(f"Video catalog updated (version {self.version}, {len(videos)} videos)")
+
+#------------------------------------------------------------------------------
+# LOCAL CATALOG WITH FILESYSTEM WATCHING
+#------------------------------------------------------------------------------
+class LocalVideoCatalog(VideoCatalog):
+    """
+    Catalog of local videos kept up to date by a watchdog observer
+
+    File events on the video directory update only the affected reference,
+    so a new or replaced video shows up without rescanning the directory.
+    """
+
+    kind = 'local'
+
+    def __init__(self, video_dir=None, ttl=0, probe_media=True, manifest=None):
+        """
+        Args:
+            video_dir: Directory holding the videos (default app/static/videos)
+            ttl: Seconds before the snapshot is rebuilt (0 = never expire)
+            probe_media: Read MP4 box headers of the videos
+            manifest: Compiled CatalogManifest to serve instead of scanning
+        """
+        super().__init__(self._load, ttl=ttl)
+        self.video_dir = video_dir or get_local_video_dir()
+        self.probe_media = probe_media
+        self.manifest = manifest
+        self._media = MappingProxyType({})
+        self._observer = None
+        self._manifest_path = None
+        self._video_server = None
+        self._urls = MappingProxyType({})
+        self._posters = MappingProxyType({})
+        self._transcripts = MappingProxyType({})
+        self._hls = MappingProxyType({})
+        self.prefer_hls = False
+
+    #--------------------------------------------------------------------------
+    # HTTP streaming
+    #--------------------------------------------------------------------------
+    def serve_over_http(self, video_server, prefer_hls=False):
+        """
+        Hand out video server URLs instead of file paths
+
+        Players then stream byte ranges from the video server rather than
+        Streamlit loading whole files into its media manager. With
+        prefer_hls, references packaged by package_hls.py are handed out as
+        their HLS master playlist instead.
+        """
+        with self._lock:
+            self._video_server = video_server
+            self.prefer_hls = prefer_hls
+            self._urls = self._build_urls(self._videos)
+            self._posters = self._build_posters(self._videos)
+            self._hls = self._build_hls(self._videos)
+
+    def get(self, ref, default=None):
+        """Look up the path (or streaming URL) for a single video reference"""
+        path = self.videos().get(ref)
+        if path is None:
+            return default
+        if self._video_server is not None:
+            if self.prefer_hls and ref in self._hls:
+                return self._hls[ref]
+            # Placeholder paths have no URL and keep falling back to the path
+            return self._urls.get(ref, path)
+        return path
+
+    def file_url(self, path):
+        """Return the video server URL of a file in the video directory (the path itself without a server)"""
+        return self._video_server.url_for(path) if self._video_server is not None else path
+
+    def hls_for(self, ref):
+        """Return the HLS master playlist URL for a reference, if packaged"""
+        return self._hls.get(ref)
+
+    def poster_for(self, ref):
+        """Return the poster generated by generate_thumbnails.py, if any"""
+        return self._posters.get(ref)
+
+    def transcripts(self):
+        """Return the WebVTT transcripts stored next to the videos (a new mapping after each change)"""
+        self.videos()
+        return self._transcripts
+
+    def media_info(self, ref):
+        """Return the MP4 header details of a local video, if probed"""
+        self.videos()
+        return self._media.get(ref)
+
+    def preload(self, ref):
+        """Read a local video into the page cache"""
+        path = self.videos().get(ref)
+        if not path or not os.path.isfile(path):
+            return False
+        read_into_page_cache(path)
+        return True
+
+    def content_version(self, ref):
+        """Return the SHA-256 of a local video (from the manifest, or by reading the file)"""
+        if self.manifest is not None:
+            return (self.manifest.videos.get(ref) or {}).get('sha256')
+        path = self.videos().get(ref)
+        return file_content_hash(path) if path and os.path.isfile(path) else None
+
+    def _publish(self, videos):
+        super()._publish(videos)
+        if self._video_server is not None:
+            self._urls = self._build_urls(self._videos)
+            self._hls = self._build_hls(self._videos)
+        self._posters = self._build_posters(self._videos)
+        self._transcripts = self._build_transcripts(self._videos)
+        if self.probe_media:
+            self._media = self._build_media(self._videos)
+
+    def _load(self):
+        if self.manifest is None:
+            return load_local_videos(self.video_dir)
+        return {
+            ref: os.path.join(self.video_dir, entry['key'])
+            for ref, entry in self.manifest.available().items()
+        }
+
+    def _build_media(self, videos):
+        # Manifests already record the media details of every video
+        if self.manifest is not None:
+            return MappingProxyType({
+                ref: self.manifest.media_info(ref)
+                for ref in videos
+                if self.manifest.media_info(ref) is not None
+            })
+
+        # Only the box headers are read, and files whose size and
+        # modification time are unchanged keep their previous result
+        media = {}
+        for ref, path in videos.items():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            previous = self._media.get(ref)
+            stamp = (path, stat.st_size, stat.st_mtime_ns)
+            if previous is not None and previous['stamp'] == stamp:
+                media[ref] = previous
+                continue
+
+            try:
+                info = probe_file(path)
+            except OSError as e:
+                logger.warning(f"Could not read {path}: {str(e)}")
+                continue
+            info['stamp'] = stamp
+            media[ref] = info
+
+            if not info['valid']:
+                logger.warning(f"{os.path.basename(path)} is not a valid MP4/MOV file")
+            elif not info['faststart']:
+                logger.warning(f"{os.path.basename(path)} is not faststart; run faststart.py so playback can begin before the download completes")
+        return MappingProxyType(media)
+
+    def _build_posters(self, videos):
+        posters = {}
+        for ref in videos:
+            path = os.path.join(self.video_dir, thumbnail_filename(ref, 'poster'))
+            if os.path.isfile(path):
+                posters[ref] = self._video_server.url_for(path) if self._video_server else path
+        return MappingProxyType(posters)
+
+    def _build_transcripts(self, videos):
+        transcripts = {}
+        for ref in videos:
+            path = os.path.join(self.video_dir, transcript_filename(ref))
+            if os.path.isfile(path):
+                transcripts[ref] = path
+        return MappingProxyType(transcripts)
+
+    def _build_hls(self, videos):
+        # HLS needs an HTTP origin, so packages are only used with the server
+        if self._video_server is None:
+            return MappingProxyType({})
+        packages = {}
+        for ref in videos:
+            path = os.path.join(self.video_dir, hls_package_relpath(ref), HLS_MASTER_PLAYLIST)
+            if os.path.isfile(path):
+                packages[ref] = self._video_server.url_for(path)
+        return MappingProxyType(packages)
+
+    def _build_urls(self, videos):
+        return MappingProxyType({
+            ref: self._video_server.url_for(path)
+            for ref, path in videos.items()
+            if os.path.isfile(path)
+        })
+
+    def start_watching(self, manifest_path=None):
+        """
+        Start watching the video directory (and the manifest file, if any) for changes
+
+        While the observer runs, events keep the snapshot current, so the
+        TTL rescan is turned off and reruns never wait for one.
+        """
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            logger.warning("watchdog is not installed, relying on catalog TTL only")
+            return
+
+        catalog = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    # HLS packages are swapped in as whole directories
+                    catalog._on_directory_changed()
+                    return
+                catalog._on_file_changed(event.src_path)
+                # Moves report both the old and the new name
+                dest_path = getattr(event, 'dest_path', None)
+                if dest_path:
+                    catalog._on_file_changed(dest_path)
+
+        os.makedirs(self.video_dir, exist_ok=True)
+        self._observer = Observer()
+        self._observer.daemon = True
+        # Recursive so HLS packages in subdirectories are noticed too
+        self._observer.schedule(_Handler(), self.video_dir, recursive=True)
+        if manifest_path:
+            self._manifest_path = os.path.abspath(manifest_path)
+            manifest_dir = os.path.dirname(self._manifest_path)
+            if os.path.commonpath([manifest_dir, os.path.abspath(self.video_dir)]) != os.path.abspath(self.video_dir):
+                self._observer.schedule(_Handler(), manifest_dir, recursive=False)
+        self._observer.start()
+        self._ttl = 0
+        logger.info(f"Watching {self.video_dir} for video changes")
+
+    def stop_watching(self):
+        """Stop the watchdog observer if it is running"""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer = None
+
+    def _on_file_changed(self, path):
+        if self._manifest_path is not None and os.path.abspath(path) == self._manifest_path:
+            self._reload_manifest()
+            return
+        parsed = parse_video_filename(path)
+        # A manifest is the file list: video files it does not list are not served
+        if parsed and self.manifest is not None:
+            return
+        if not parsed:
+            # Regenerated posters only need the poster map rebuilt
+            if parse_thumbnail_filename(path):
+                with self._lock:
+                    self._posters = self._build_posters(self._videos)
+            # Edited transcripts get a new mapping so the search index notices
+            elif parse_transcript_filename(path):
+                with self._lock:
+                    self._transcripts = self._build_transcripts(self._videos)
+            # New or removed HLS packages (the master playlist is written last)
+            elif os.path.basename(path) == HLS_MASTER_PLAYLIST:
+                with self._lock:
+                    self._hls = self._build_hls(self._videos)
+            return
+        ref = parsed[0]
+
+        with self._lock:
+            # Nothing to update until the first full load has happened
+            if self._loaded_at is None:
+                return
+
+            videos = dict(self._videos)
+            path = self._resolve_ref(ref)
+            if path:
+                videos[ref] = path
+            else:
+                videos.pop(ref, None)
+
+            # Fall back to a full load (and its placeholders) when empty
+            if not videos:
+                videos = self._load_snapshot()
+
+            self._publish(videos)
+
+    def _reload_manifest(self):
+        from manifest import load_manifest
+        try:
+            manifest = load_manifest(self._manifest_path)
+        except (OSError, ValueError, KeyError) as e:
+            # Removed, or not a manifest (yet); keep serving the current one
+            logger.warning(f"Could not reload the manifest {self._manifest_path}: {str(e)}")
+            return
+        if self.manifest is None or manifest.version != self.manifest.version:
+            self.use_manifest(manifest)
+
+    def _on_directory_changed(self):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._hls = self._build_hls(self._videos)
+
+    def _resolve_ref(self, ref):
+        # Same format priority as load_local_videos: mp4 wins over mov
+        base_name = f"video_{ref.replace('.', '_')}"
+        for ext in ('.mp4', '.mov'):
+            for candidate in (base_name + ext, base_name + ext.upper()):
+                path = os.path.join(self.video_dir, candidate)
+                if os.path.isfile(path):
+                    return path
+        return None
+
+#==============================================================================
+# PROCESS-WIDE CATALOG ACCESS
+#==============================================================================
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog():
+    """
+    Return the video catalog shared by every session in this process
+
+    The catalog is created on first use; subsequent calls are a plain
+    attribute read.
+    """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = _create_catalog()
+    return _catalog
+
+def _create_catalog():
+    # Imported here so only the selected backend's modules get loaded
+    from storage import create_storage_catalog
+    return create_storage_catalog(get_config())
@@ -1,20 +1,74 @@
 import os
+import logging
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
 
 #==============================================================================
 # DEFAULT CONFIGURATION SETTINGS
 #==============================================================================
 # Default configuration values
 DEFAULT_CONFIG = {
+    "STORAGE_BACKEND": "",         # local, s3 or http (default: s3 if USE_S3, else local)
     "USE_S3": False,               # Whether to use S3 for video storage (vs local)
     "S3_BUCKET_NAME": "wound-care-videos",  # S3 bucket name if using S3
     "S3_PREFIX": "videos/",        # Prefix/folder for videos in S3 bucket
     "AWS_REGION": "us-east-1",     # AWS region for S3 bucket
+    "S3_ENDPOINT_URL": "",         # Custom S3 endpoint (e.g. MinIO or moto server)
+    "S3_REFRESH_SECONDS": 60,      # Interval between background S3 catalog refreshes
+    "S3_MAX_POOL_CONNECTIONS": 20, # Connection pool size of the shared S3 client
+    "S3_PRESIGN_URLS": False,      # Serve presigned URLs instead of public object URLs
+    "S3_PRESIGN_EXPIRES_SECONDS": 3600,  # Lifetime of each presigned URL
+    "S3_PRESIGN_RENEW_SECONDS": 300,     # Renew presigned URLs this long before expiry
+    "S3_METADATA_WORKERS": 16,     # Concurrent HEAD requests enriching the catalog (0 = skip)
+    "S3_METADATA_ATTEMPTS": 3,     # Tries per HEAD request, with exponential backoff
+    "S3_DISK_CACHE_DIR": "",       # Cache S3 videos on local disk here and serve them from it
+    "S3_DISK_CACHE_MAX_MB": 2048,  # Size cap of the disk cache (least recently used files go first)
+    "S3_DISK_CACHE_WORKERS": 4,    # Concurrent downloads into the disk cache
+    "HTTP_VIDEO_BASE_URL": "",     # Base URL of video_<ref> files for the http backend (e.g. a CDN)
+    "HTTP_VIDEO_EXTENSION": ".mp4",  # Extension of the videos under HTTP_VIDEO_BASE_URL
+    "LOCAL_VIDEO_SERVER": False,   # Stream local videos over HTTP with Range support
+    "VIDEO_SERVER_HOST": "0.0.0.0",  # Bind address of the local video server
+    "VIDEO_SERVER_PORT": 8502,     # Port of the local video server
+    "VIDEO_SERVER_PUBLIC_URL": "", # Browser-facing base URL (default http://localhost:<port>)
+    "USE_HLS": False,              # Play HLS packages from package_hls.py (needs LOCAL_VIDEO_SERVER)
+    "LAZY_PLAYBACK": False,        # Embed only the current video's player on the final page
+    "PRELOAD_NEXT_VIDEO": False,   # Let the browser buffer the next video in lazy mode
+    "CONTINUOUS_PLAYBACK": "",     # Play each sequence as one stitched stream: mp4 or hls (stitch.py, needs LOCAL_VIDEO_SERVER; "" = off)
+    "DECISION_TREE_PATH": "",      # Decision tree definition (default app/decision_tree.json)
+    "PROBE_MEDIA": True,           # Read MP4/MOV box headers for duration, bitrate and faststart
+    "MANIFEST_PATH": "",           # Compiled catalog manifest (manifest.py); skips video discovery
+    "CATALOG_TTL_SECONDS": 300,    # Max age of the cached video catalog (0 = never expire; off while watchdog watches local videos)
+    "CATALOG_ROLE": "",            # "replica" to serve the snapshot of shared_catalog.py ("" = standalone)
+    "CATALOG_SNAPSHOT_PATH": "",   # Shared catalog snapshot published by the refresher
+    "CATALOG_SNAPSHOT_SECONDS": 60,  # Interval between snapshot refreshes
+    "CATALOG_SNAPSHOT_POLL_SECONDS": 2,  # How often replicas check for a new snapshot
+    "CATALOG_SNAPSHOT_WAIT_SECONDS": 120,  # How long a starting replica waits for the first snapshot
+    "METRICS_PORT": 0,             # Port of the ops server with /metrics (0 = disabled)
+    "METRICS_HOST": "0.0.0.0",     # Bind address of the ops server
+    "METRICS_DUMP_PATH": "",       # Periodically write a JSON metrics snapshot here
+    "METRICS_DUMP_SECONDS": 60,    # Interval between JSON metrics snapshots
+    "TELEMETRY": False,            # Record which paths and videos are used (telemetry.py)
+    "TELEMETRY_PATH": "",          # Usage event store: *.db/*.sqlite = SQLite, else JSONL ("" = statistics only)
+    "TELEMETRY_QUEUE_SIZE": 10000, # Events buffered before new ones are dropped
+    "TELEMETRY_BATCH_SIZE": 500,   # Most events written in one batch
+    "TELEMETRY_FLUSH_SECONDS": 5,  # Longest time an event waits to be written
+    "WARMUP_PRELOAD_VIDEOS": False,  # serve.py: read the videos every sequence shows into the page cache
     "DEBUG": False                 # Debug mode flag
 }
 
 #==============================================================================
 # CONFIGURATION HANDLING
 #==============================================================================
+# Accepted spellings of boolean settings (case-insensitive)
+TRUE_VALUES = ('true', '1', 'yes', 'on')
+FALSE_VALUES = ('false', '0', 'no', 'off', '')
+
+# Invalid (key, value) pairs already reported; get_config runs on every rerun
+_reported = set()
+
 def get_config():
     """
     Get configuration from environment variables or use defaults
@@ -26,10 +80,32 @@ def get_config():
     for key in config:
         env_value = os.environ.get(key)
         if env_value is not None:
-            # Convert string to boolean for boolean values
-            if isinstance(config[key], bool):
-                config[key] = env_value.lower() == 'true'
-            else:
-                config[key] = env_value
+            try:
+                config[key] = _parse_value(env_value, config[key])
+            except ValueError:
+                # A typo in one setting should not stop the app from starting
+                if (key, env_value) not in _reported:
+                    _reported.add((key, env_value))
+                    logger.warning(f"Ignoring {key}={env_value!r}: expected {_describe_type(config[key])}; using {config[key]!r}")
     
     return config
+
+def _parse_value(env_value, default):
+    """Convert an environment variable to the type of its default"""
+    # Convert string to boolean for boolean values
+    if isinstance(default, bool):
+        value = env_value.strip().lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        raise ValueError(env_value)
+    # Convert string to number for numeric values
+    if isinstance(default, (int, float)):
+        return type(default)(env_value.strip())
+    return env_value
+
+def _describe_type(default):
+    if isinstance(default, bool):
+        return f"one of {', '.join(value for value in TRUE_VALUES + FALSE_VALUES if value)}"
+    return 'an integer' if isinstance(default, int) else 'a number'
@@ -0,0 +1,235 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from config import get_config
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# TREE DEFINITION
+#==============================================================================
+# Default location of the decision tree definition
+DEFAULT_TREE_PATH = os.path.join(os.path.dirname(__file__), 'decision_tree.json')
+
+# Reserved step shown once a path is complete
+FINAL_STEP = 'final'
+
+# Immutable records produced by the compiler
+Step = namedtuple('Step', ['id', 'header', 'subheader', 'info', 'selection_key', 'columns', 'options'])
+Option = namedtuple('Option', ['value', 'label', 'column', 'video_ref', 'selection'])
+
+#==============================================================================
+# COMPILED TREE
+#==============================================================================
+class CompiledDecisionTree:
+    """
+    Immutable transition table compiled from the decision tree definition
+
+    A path is the canonical tuple of (selection key, value) pairs chosen so
+    far, e.g. (('type_of_wound', 'superficial'), ('location', 'heel')).
+    Every reachable path is mapped to the step it leads to, and every
+    complete path to its full video sequence, so the app only does lookups.
+    """
+
+    def __init__(self, definition, fingerprint=None):
+        self.version = definition.get('version', 1)
+        self.fingerprint = fingerprint
+        self.start = definition['start']
+        self.titles = MappingProxyType(dict(definition.get('titles', {})))
+        self.common_tail = tuple(definition.get('common_tail', []))
+        self.steps = MappingProxyType({
+            step_id: _compile_step(step_id, raw)
+            for step_id, raw in definition['steps'].items()
+        })
+
+        path_steps = {}
+        sequences = {}
+        self._walk(definition, self.start, (), (), path_steps, sequences)
+        self.path_steps = MappingProxyType(path_steps)
+        self.sequences = MappingProxyType(sequences)
+        # Reachable paths by their URL form, e.g. "superficial/heel/sheet"
+        self.slugs = MappingProxyType({path_slug(path): path for path in path_steps})
+
+    #--------------------------------------------------------------------------
+    # Lookups
+    #--------------------------------------------------------------------------
+    def step_for_path(self, path):
+        """Return the step reached by a path, or None if it is not reachable"""
+        return self.path_steps.get(path)
+
+    def next_step(self, path, step, option):
+        """Return the step that follows choosing an option at a path"""
+        return self.path_steps[path + ((step.selection_key, option.value),)]
+
+    def sequence_for(self, path):
+        """Return the tuple of video references for a complete path, or None"""
+        return self.sequences.get(path)
+
+    def path_for_slug(self, slug):
+        """Return the path named by a URL slug such as 'superficial/heel/sheet', or None"""
+        return self.slugs.get(slug.strip('/'))
+
+    def selections_for(self, path):
+        """Rebuild the session's selection dictionaries for a reachable path"""
+        selections = []
+        for i, (_, value) in enumerate(path):
+            step = self.steps[self.path_steps[path[:i]]]
+            option = next(option for option in step.options if option.value == value)
+            selections.append(dict(option.selection))
+        return selections
+
+    def title_for(self, ref):
+        """Get a descriptive title for a video reference"""
+        return self.titles.get(ref, f"Video {ref}")
+
+    #--------------------------------------------------------------------------
+    # Compilation
+    #--------------------------------------------------------------------------
+    def _walk(self, definition, step_id, path, refs, path_steps, sequences):
+        path_steps[path] = step_id
+
+        if step_id == FINAL_STEP:
+            sequences[path] = refs + self.common_tail
+            return
+
+        if step_id not in self.steps:
+            raise ValueError(f"Decision tree refers to unknown step '{step_id}'")
+        if len(path) > len(self.steps):
+            raise ValueError(f"Decision tree contains a cycle through step '{step_id}'")
+
+        step = self.steps[step_id]
+        raw_options = definition['steps'][step_id]['options']
+        chosen = dict(path)
+
+        for option, raw in zip(step.options, raw_options):
+            next_id = _resolve_next(raw.get('next', FINAL_STEP), chosen, step_id, option.value)
+            option_refs = refs + ((option.video_ref,) if option.video_ref else ())
+            self._walk(
+                definition,
+                next_id,
+                path + ((step.selection_key, option.value),),
+                option_refs,
+                path_steps,
+                sequences
+            )
+
+#------------------------------------------------------------------------------
+# COMPILER HELPERS
+#------------------------------------------------------------------------------
+def _compile_step(step_id, raw):
+    if 'selection_key' not in raw or not raw.get('options'):
+        raise ValueError(f"Step '{step_id}' needs a selection_key and at least one option")
+
+    columns = raw.get('columns', 1)
+    options = []
+    for option in raw['options']:
+        column = option.get('column', 0)
+        if not 0 <= column < columns:
+            raise ValueError(f"Option '{option['value']}' of step '{step_id}' uses column {column} of {columns}")
+
+        # Selections keep the shape the rest of the app already stores
+        selection = {raw['selection_key']: option['value']}
+        if option.get('video_ref'):
+            selection['video_ref'] = option['video_ref']
+
+        options.append(Option(
+            value=option['value'],
+            label=option['label'],
+            column=column,
+            video_ref=option.get('video_ref'),
+            selection=MappingProxyType(selection)
+        ))
+
+    return Step(
+        id=step_id,
+        header=raw.get('header', ''),
+        subheader=raw.get('subheader'),
+        info=raw.get('info'),
+        selection_key=raw['selection_key'],
+        columns=columns,
+        options=tuple(options)
+    )
+
+def _resolve_next(next_spec, chosen, step_id, value):
+    # A plain step id, or {"<earlier selection key>": {"<value>": "<step id>"}}
+    if isinstance(next_spec, str):
+        return next_spec
+
+    (key, cases), = next_spec.items()
+    if chosen.get(key) not in cases:
+        raise ValueError(
+            f"Option '{value}' of step '{step_id}' has no next step for {key}={chosen.get(key)}"
+        )
+    return cases[chosen[key]]
+
+#==============================================================================
+# PATH HELPERS
+#==============================================================================
+def canonical_path(selections):
+    """
+    Convert the selections stored in session state into a path tuple
+
+    Args:
+        selections: List of dictionaries such as {"location": "toes", "video_ref": "3.1"}
+
+    Returns:
+        Tuple of (selection key, value) pairs
+    """
+    path = []
+    for selection in selections:
+        for key, value in selection.items():
+            if key != 'video_ref':
+                path.append((key, value))
+                break
+    return tuple(path)
+
+def path_slug(path):
+    """Join the values of a path into its URL form, e.g. 'superficial/heel/sheet'"""
+    return '/'.join(value for _, value in path)
+
+def format_step_text(template, path):
+    """Fill a step's text template with the readable values chosen so far"""
+    values = {key: value.replace('_', ' ').title() for key, value in path}
+    return template.format_map(values)
+
+#==============================================================================
+# TREE LOADING
+#==============================================================================
+def load_decision_tree(path=None):
+    """Load and compile the decision tree definition from a JSON file"""
+    path = path or get_config()["DECISION_TREE_PATH"] or DEFAULT_TREE_PATH
+
+    with open(path, 'rb') as f:
+        raw = f.read()
+
+    tree = CompiledDecisionTree(json.loads(raw), fingerprint=hashlib.sha256(raw).hexdigest())
+    logger.info(f"Compiled decision tree from {path} ({len(tree.path_steps)} paths, {len(tree.sequences)} sequences)")
+    return tree
+
+_tree = None
+_tree_lock = threading.Lock()
+
+def get_decision_tree():
+    """Return the compiled decision tree shared by every session in this process"""
+    global _tree
+    if _tree is None:
+        with _tree_lock:
+            if _tree is None:
+                _tree = load_decision_tree()
+    return _tree
+
+def reload_decision_tree(path=None):
+    """Recompile the decision tree, e.g. after its definition was edited"""
+    global _tree
+    tree = load_decision_tree(path)
+    with _tree_lock:
+        _tree = tree
+    return tree
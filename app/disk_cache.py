@@ -0,0 +1,185 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# DISK CACHE
+#==============================================================================
+# Suffix of files still being downloaded
+PARTIAL_SUFFIX = '.part'
+
+# Partial files untouched this long are left over from a crashed download;
+# younger ones may belong to another process sharing the directory
+STALE_PARTIAL_SECONDS = 3600
+
+class DiskCache:
+    """
+    Bounded read-through cache of S3 objects on local disk
+
+    A lookup that misses returns None straight away and starts a background
+    download, so callers keep handing out the S3 URL until the file is on
+    disk. Concurrent misses for the same object share one download. Files
+    are evicted least recently used first once the cache exceeds its size.
+
+    Files are named after the object key and ETag, so a replaced object is
+    fetched again and the cache can be rebuilt from the directory on start.
+    """
+
+    def __init__(self, cache_dir, max_bytes, client, bucket, fetch_workers=4):
+        """
+        Args:
+            cache_dir: Directory holding the cached files
+            max_bytes: Total size the cache may grow to
+            client: S3 client used to download objects
+            bucket: S3 bucket name
+            fetch_workers: Downloads running at the same time
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.client = client
+        self.bucket = bucket
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # filename -> size, least recent first
+        self._total = 0
+        self._pending = {}  # filename -> Future of the running download
+        self._executor = ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix='disk-cache')
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        # Oldest modification time first approximates the previous LRU order
+        files = []
+        now = time.time()
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(PARTIAL_SUFFIX):
+                try:
+                    if now - os.path.getmtime(path) > STALE_PARTIAL_SECONDS:
+                        os.remove(path)
+                except OSError:
+                    pass
+            elif os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+            self._total += size
+        self._evict()
+        logger.info(f"Disk cache at {self.cache_dir} holds {len(self._entries)} files ({self._total} bytes)")
+
+    #--------------------------------------------------------------------------
+    # Lookups
+    #--------------------------------------------------------------------------
+    @staticmethod
+    def filename_for(key, etag):
+        """Return the cache filename of one version of an object"""
+        key_hash = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        version = (etag or '').strip('"').replace('-', '_') or 'latest'
+        return f"{key_hash}-{version}{os.path.splitext(key)[1].lower()}"
+
+    def get(self, key, etag=None, size=None):
+        """
+        Return the local path of a cached object, or None on a miss
+
+        A miss schedules a background download unless one is already
+        running or the object is larger than the whole cache.
+        """
+        name = self.filename_for(key, etag)
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+                metrics.inc('cache_hits_total', cache='disk')
+                return os.path.join(self.cache_dir, name)
+
+            metrics.inc('cache_misses_total', cache='disk')
+            if name not in self._pending and (size is None or size <= self.max_bytes):
+                self._pending[name] = self._executor.submit(self._fetch, key, name)
+        return None
+
+    def fetch(self, key, etag=None, size=None):
+        """
+        Download an object now (or wait for the running download) and return its path
+
+        Returns None if the download fails or the object is larger than the
+        whole cache.
+        """
+        name = self.filename_for(key, etag)
+        with self._lock:
+            if name in self._entries:
+                return os.path.join(self.cache_dir, name)
+            if size is not None and size > self.max_bytes:
+                return None
+            future = self._pending.get(name)
+            if future is None:
+                future = self._pending[name] = self._executor.submit(self._fetch, key, name)
+        return future.result()
+
+    #--------------------------------------------------------------------------
+    # Downloads and eviction
+    #--------------------------------------------------------------------------
+    def _fetch(self, key, name):
+        path = os.path.join(self.cache_dir, name)
+        # Named per process, so replicas sharing the directory never write the same file
+        partial = f"{path}.{os.getpid()}{PARTIAL_SUFFIX}"
+        try:
+            with metrics.span('disk_cache_fetch'):
+                self.client.download_file(self.bucket, key, partial)
+            size = os.path.getsize(partial)
+            if size > self.max_bytes:
+                # Inserting it would evict every other file and then itself
+                raise ValueError(f"{size} bytes is more than the whole cache ({self.max_bytes} bytes)")
+            os.replace(partial, path)
+        except Exception as e:
+            logger.error(f"Could not cache {key}: {str(e)}")
+            if os.path.exists(partial):
+                os.remove(partial)
+            with self._lock:
+                self._pending.pop(name, None)
+            return None
+
+        metrics.inc('disk_cache_bytes_fetched_total', amount=size)
+        with self._lock:
+            self._pending.pop(name, None)
+            # Older versions of the same object will never be asked for again
+            key_prefix = name.split('-', 1)[0] + '-'
+            for stale in [n for n in self._entries if n.startswith(key_prefix) and n != name]:
+                self._remove(stale)
+            self._entries[name] = size
+            self._total += size
+            self._evict()
+        logger.debug(f"Cached {key} ({size} bytes)")
+        return path
+
+    def _evict(self):
+        # Caller holds the lock (or is the constructor)
+        while self._total > self.max_bytes and self._entries:
+            name = next(iter(self._entries))
+            self._remove(name)
+            metrics.inc('disk_cache_evictions_total')
+
+    def _remove(self, name):
+        self._total -= self._entries.pop(name)
+        try:
+            # Players already streaming the file keep their open handle; their
+            # later range requests are redirected to S3 by the video server
+            os.remove(os.path.join(self.cache_dir, name))
+        except OSError:
+            pass
+
+    @property
+    def size(self):
+        """Total bytes currently cached"""
+        return self._total
@@ -0,0 +1,298 @@
+import os
+import sys
+import json
+import html
+import shutil
+import hashlib
+import argparse
+
+from config import get_config
+from catalog import get_catalog
+from decision_tree import get_decision_tree, path_slug, format_step_text, FINAL_STEP
+from utils import get_video_sequence
+from pwa import pwa_head, write_pwa, DEFAULT_VIDEO_CACHE_BYTES
+
+#==============================================================================
+# EXPORT SETTINGS
+#==============================================================================
+# Directory (inside the export) that local videos and posters are copied to
+MEDIA_DIR = 'media'
+
+# Shared stylesheet and the index of everything that was exported
+STYLESHEET = 'style.css'
+EXPORT_INDEX = 'export.json'
+
+STYLES = """
+body { font-family: -apple-system, "Segoe UI", Roboto, sans-serif; margin: 0; color: #262730; }
+header { padding: 16px 24px; border-bottom: 1px solid #e6e6e6; }
+header h1 { margin: 0; font-size: 1.6rem; }
+nav { padding: 12px 24px; background: #f0f2f6; }
+nav a { margin-right: 16px; }
+main { padding: 16px 24px; max-width: 960px; }
+.info { background: #e8f0fe; padding: 12px 16px; border-radius: 5px; }
+.options { display: grid; gap: 12px; margin-top: 16px; }
+.option { display: block; padding: 12px; border: 1px solid #d0d3da; border-radius: 5px; text-align: center; text-decoration: none; color: inherit; }
+.option:hover { border-color: #ff4b4b; color: #ff4b4b; }
+details { border: 1px solid #e6e6e6; border-radius: 5px; margin: 8px 0; padding: 8px 12px; }
+video { width: 100%; max-height: 480px; background: #000; }
+.placeholder { background: #e0e0e0; padding: 60px; border-radius: 5px; text-align: center; }
+"""
+
+#==============================================================================
+# PAGE LAYOUT
+#==============================================================================
+def page_file(path):
+    """Return the export-relative HTML file of a path, e.g. superficial/heel/index.html"""
+    slug = path_slug(path)
+    return f"{slug}/index.html" if slug else "index.html"
+
+def _root_prefix(path):
+    # Pages are nested one directory per selection, so links stay relative
+    # and the export works under any URL prefix
+    return '../' * len(path)
+
+def _page(title, body, path, pwa=False):
+    root = _root_prefix(path)
+    nav = [f'<a href="{root}index.html">Restart Guide</a>']
+    if path:
+        nav.append(f'<a href="{root}{page_file(path[:-1])}">Back to Previous Step</a>')
+    head = pwa_head(root) if pwa else ''
+
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<title>{html.escape(title)} - Wound Care Guide</title>
+<link rel="stylesheet" href="{root}{STYLESHEET}">{head}
+</head>
+<body>
+<header><h1>Wound Care Video Guide System</h1></header>
+<nav>{' '.join(nav)}</nav>
+<main>
+{body}
+</main>
+</body>
+</html>
+"""
+
+#==============================================================================
+# PAGE RENDERING
+#==============================================================================
+def render_step_page(tree, path, step, pwa=False):
+    """Render a selection step with one link per option"""
+    root = _root_prefix(path)
+    parts = [f"<h2>{html.escape(step.header)}</h2>"]
+    if step.subheader:
+        parts.append(f"<h3>{html.escape(format_step_text(step.subheader, path))}</h3>")
+    if step.info:
+        parts.append(f'<p class="info">{html.escape(step.info)}</p>')
+
+    links = []
+    for option in step.options:
+        option_path = path + ((step.selection_key, option.value),)
+        links.append(
+            f'<a class="option" style="grid-column: {option.column + 1}" '
+            f'href="{root}{page_file(option_path)}">{html.escape(option.label)}</a>'
+        )
+    parts.append(
+        f'<div class="options" style="grid-template-columns: repeat({step.columns}, 1fr)">\n'
+        + '\n'.join(links) + '\n</div>'
+    )
+    return _page(step.header, '\n'.join(parts), path, pwa)
+
+def render_final_page(tree, path, sequence, media, pwa=False):
+    """
+    Render the video sequence of a complete path
+
+    Args:
+        media: Callable returning (video href or None, poster href or None) for a reference
+    """
+    selections = tree.selections_for(path)
+    options = ''.join(
+        f"<li><strong>{html.escape(key.replace('_', ' ').title())}</strong>: "
+        f"{html.escape(value.replace('_', ' ').title())}</li>"
+        for selection in selections
+        for key, value in selection.items()
+        if key != 'video_ref'
+    )
+    parts = [
+        "<h2>Wound Care Video Guide</h2>",
+        f"<h3>Selected Options:</h3>\n<ul>{options}</ul>",
+        "<h3>Video Sequence:</h3>",
+    ]
+
+    for i, video_info in enumerate(sequence):
+        ref, title = video_info["ref"], video_info["title"]
+        video_href, poster_href = media(ref)
+        label = html.escape(f"{i+1}. {title} (Ref: {ref})")
+
+        if video_href:
+            poster = f' poster="{html.escape(poster_href)}"' if poster_href else ''
+            # Only the first video fetches anything before the user presses play
+            preload = 'metadata' if i == 0 else 'none'
+            player = (
+                f'<video controls playsinline preload="{preload}"{poster} '
+                f'src="{html.escape(video_href)}"></video>'
+            )
+        else:
+            player = (
+                f'<div class="placeholder"><h3>Video: {html.escape(title)}</h3>'
+                f'<p>Reference: {html.escape(ref)}</p></div>'
+            )
+        parts.append(f"<details{' open' if i == 0 else ''}><summary>{label}</summary>\n{player}\n</details>")
+
+    parts.append(f'<p><a class="option" href="{_root_prefix(path)}index.html">Start New Guide</a></p>')
+    return _page("Video Sequence", '\n'.join(parts), path, pwa)
+
+#==============================================================================
+# MEDIA RESOLUTION
+#==============================================================================
+class MediaPublisher:
+    """
+    Resolve video and poster locations for exported pages
+
+    URLs (S3, HTTP/CDN) are linked as they are; local files are copied into
+    the export's media directory once and linked relative to each page.
+    """
+
+    def __init__(self, output_dir, catalog, copy_local=True):
+        self.output_dir = output_dir
+        self.catalog = catalog
+        self.copy_local = copy_local
+        self.files = {}  # source path -> export-relative path
+        self.videos = {}  # export-relative path or URL -> {"ref", "version"}
+        self.posters = set()
+
+    def resolver(self, path):
+        """Return a media(ref) callable for the page of a path"""
+        root = _root_prefix(path)
+
+        def media(ref):
+            info = self.catalog.media_info(ref)
+            video = self._publish(self.catalog.videos().get(ref))
+            # Placeholders and other invalid files get the placeholder block
+            if info is not None and not info['valid']:
+                video = None
+            poster = self._publish(self.catalog.poster_for(ref))
+
+            if video and video not in self.videos:
+                self.videos[video] = {'ref': ref, 'version': self.catalog.content_version(ref)}
+            if poster:
+                self.posters.add(poster)
+            return _relative_to(video, root), _relative_to(poster, root)
+        return media
+
+    def _publish(self, location):
+        """Return the export-relative path (copying local files) or URL of a location"""
+        if not location:
+            return None
+        if location.startswith(('http://', 'https://')):
+            return location
+        if not self.copy_local or not os.path.isfile(location):
+            return None
+
+        relative = self.files.get(location)
+        if relative is None:
+            relative = f"{MEDIA_DIR}/{os.path.basename(location)}"
+            target = os.path.join(self.output_dir, relative)
+            if not _same_file(location, target):
+                shutil.copy2(location, target)
+            self.files[location] = relative
+        return relative
+
+def _relative_to(href, root):
+    if not href or href.startswith(('http://', 'https://')):
+        return href
+    return root + href
+
+def _same_file(source, target):
+    # Unchanged media is not copied again on re-export
+    if not os.path.isfile(target):
+        return False
+    a, b = os.stat(source), os.stat(target)
+    return a.st_size == b.st_size and int(a.st_mtime) == int(b.st_mtime)
+
+#==============================================================================
+# EXPORT
+#==============================================================================
+def export_site(output_dir, catalog=None, tree=None, copy_local=True, pwa=False,
+                video_cache_bytes=DEFAULT_VIDEO_CACHE_BYTES):
+    """
+    Render every screen of the decision tree to static HTML
+
+    Every reachable path gets its own page: selection steps link to the
+    page of each option and complete paths show their video sequence from
+    get_video_sequence, linking to the catalog's video locations. With pwa,
+    the site also gets a web app manifest and an offline service worker.
+
+    Returns:
+        The export index (pages, media files, videos and a content version)
+    """
+    catalog = catalog or get_catalog()
+    tree = tree or get_decision_tree()
+
+    os.makedirs(os.path.join(output_dir, MEDIA_DIR), exist_ok=True)
+    publisher = MediaPublisher(output_dir, catalog, copy_local)
+    digest = hashlib.sha256()
+    pages = []
+
+    for path, step_id in sorted(tree.path_steps.items()):
+        if step_id == FINAL_STEP:
+            sequence = get_video_sequence(tree.selections_for(path))
+            content = render_final_page(tree, path, sequence, publisher.resolver(path), pwa)
+        else:
+            content = render_step_page(tree, path, tree.steps[step_id], pwa)
+
+        relative = page_file(path)
+        target = os.path.join(output_dir, relative)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'w', encoding='utf-8') as f:
+            f.write(content)
+        digest.update(relative.encode('utf-8') + b'\0' + content.encode('utf-8'))
+        pages.append(relative)
+
+    with open(os.path.join(output_dir, STYLESHEET), 'w', encoding='utf-8') as f:
+        f.write(STYLES.lstrip())
+    digest.update(STYLES.encode('utf-8'))
+    digest.update(json.dumps(publisher.videos, sort_keys=True).encode('utf-8'))
+
+    index = {
+        # Changes whenever any page, the stylesheet or a video's content changes
+        'version': digest.hexdigest()[:16],
+        'pages': pages,
+        'assets': [STYLESHEET],
+        'media': sorted(publisher.files.values()),
+        'posters': sorted(publisher.posters),
+        'videos': publisher.videos,
+    }
+    if pwa:
+        write_pwa(output_dir, index, tree.common_tail, video_cache_bytes)
+    with open(os.path.join(output_dir, EXPORT_INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export every decision path as static HTML pages")
+    parser.add_argument('--output', default='site', help="Directory to write the static site to (default: site)")
+    parser.add_argument('--clean', action='store_true', help="Remove the output directory before exporting")
+    parser.add_argument('--no-copy', action='store_true', help="Do not copy local videos and posters into the export")
+    parser.add_argument('--pwa', action='store_true', help="Add a web app manifest and an offline service worker")
+    parser.add_argument('--video-cache-mb', type=int, default=DEFAULT_VIDEO_CACHE_BYTES // (1024 * 1024),
+                        help="Storage budget of videos cached on first view in PWA mode")
+    args = parser.parse_args()
+
+    # The export links files and object URLs directly, so the catalog must
+    # not hand out video server URLs (and there is no server to start)
+    os.environ["LOCAL_VIDEO_SERVER"] = "False"
+    os.environ["S3_DISK_CACHE_DIR"] = ""
+
+    if get_config()["S3_PRESIGN_URLS"]:
+        print("Warning: presigned URLs expire, so the export links to the plain object URLs instead")
+    if args.clean and os.path.isdir(args.output):
+        shutil.rmtree(args.output)
+
+    index = export_site(args.output, copy_local=not args.no_copy, pwa=args.pwa,
+                        video_cache_bytes=args.video_cache_mb * 1024 * 1024)
+    print(f"Exported {len(index['pages'])} pages and {len(index['media'])} media files to {args.output} (version {index['version']})")
+    sys.exit(0)
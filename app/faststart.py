@@ -0,0 +1,157 @@
+import os
+import sys
+import struct
+import shutil
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from mp4info import iter_boxes, probe_file, CONTAINER_BOXES
+from utils import get_local_video_dir, parse_video_filename
+
+#==============================================================================
+# MOOV REWRITING
+#==============================================================================
+def _patch_chunk_offsets(moov, start, end, shift_from, shift_to, delta):
+    """
+    Shift the stco/co64 chunk offsets inside a moov box held in memory
+
+    Offsets pointing into [shift_from, shift_to) move by delta, which is where
+    the media data lands once the moov box is moved in front of it.
+    """
+    def read_at(offset, length):
+        return bytes(moov[offset:offset + length])
+
+    for box_type, offset, size, header_size in iter_boxes(read_at, start, end):
+        if box_type in CONTAINER_BOXES:
+            _patch_chunk_offsets(moov, offset + header_size, offset + size, shift_from, shift_to, delta)
+        elif box_type in (b'stco', b'co64'):
+            # version/flags (4 bytes) then the entry count
+            table = offset + header_size + 8
+            count = struct.unpack_from('>I', moov, offset + header_size + 4)[0]
+            fmt, width = ('>I', 4) if box_type == b'stco' else ('>Q', 8)
+
+            for i in range(count):
+                position = table + i * width
+                value = struct.unpack_from(fmt, moov, position)[0]
+                if shift_from <= value < shift_to:
+                    value += delta
+                    if box_type == b'stco' and value > 0xFFFFFFFF:
+                        raise ValueError("Chunk offsets overflow 32 bits; use ffmpeg -movflags +faststart")
+                    struct.pack_into(fmt, moov, position, value)
+        elif box_type == b'cmov':
+            raise ValueError("Compressed movie headers are not supported")
+
+def rewrite_faststart(path):
+    """
+    Move the moov box of an MP4/MOV file in front of its media data
+
+    The file is rewritten to a temporary file next to it and swapped in
+    atomically, so a failure never leaves a half-written video behind.
+
+    Returns:
+        Status message for the file
+    """
+    info = probe_file(path)
+    if not info['valid']:
+        return 'skipped (not a valid MP4/MOV file)'
+    if info['faststart']:
+        return 'already faststart'
+
+    file_size = info['size']
+    with open(path, 'rb') as f:
+        def read_at(offset, length):
+            f.seek(offset)
+            return f.read(length)
+
+        boxes = list(iter_boxes(read_at, 0, file_size))
+        moov_index = next(i for i, box in enumerate(boxes) if box[0] == b'moov')
+        mdat_index = next(i for i, box in enumerate(boxes) if box[0] == b'mdat')
+        _, moov_offset, moov_size, moov_header = boxes[moov_index]
+
+        # The moov goes right before the first mdat; everything between
+        # there and its old position moves back by the size of the moov
+        insert_offset = boxes[mdat_index][1]
+        moov = bytearray(read_at(moov_offset, moov_size))
+        _patch_chunk_offsets(
+            moov, moov_header, moov_size,
+            shift_from=insert_offset, shift_to=moov_offset, delta=moov_size
+        )
+
+        tmp_path = path + '.faststart.tmp'
+        try:
+            with open(tmp_path, 'wb') as out:
+                for i, (box_type, offset, size, _) in enumerate(boxes):
+                    if i == mdat_index:
+                        out.write(moov)
+                    if i == moov_index:
+                        continue
+                    f.seek(offset)
+                    _copy_bytes(f, out, size)
+            shutil.copystat(path, tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    return 'rewritten'
+
+def _copy_bytes(src, dst, length, chunk_size=1024 * 1024):
+    while length > 0:
+        chunk = src.read(min(chunk_size, length))
+        if not chunk:
+            raise ValueError("Unexpected end of file while copying")
+        dst.write(chunk)
+        length -= len(chunk)
+
+def _rewrite_worker(path):
+    # Runs in a worker process; report errors instead of raising them
+    try:
+        return path, rewrite_faststart(path)
+    except (OSError, ValueError, StopIteration) as e:
+        return path, f"failed ({e})"
+
+#==============================================================================
+# BATCH PROCESSING
+#==============================================================================
+def find_videos(video_dir):
+    """Return the paths of every video_<ref> file in a directory"""
+    return sorted(
+        os.path.join(video_dir, filename)
+        for filename in os.listdir(video_dir)
+        if parse_video_filename(filename)
+    )
+
+def rewrite_all(video_dir=None, workers=None, dry_run=False):
+    """Rewrite every non-faststart video in parallel worker processes"""
+    video_dir = video_dir or get_local_video_dir()
+    pending = []
+
+    for path in find_videos(video_dir):
+        info = probe_file(path)
+        name = os.path.basename(path)
+        if not info['valid']:
+            print(f"{name}: skipped (not a valid MP4/MOV file)")
+        elif info['faststart']:
+            print(f"{name}: already faststart")
+        else:
+            pending.append(path)
+            print(f"{name}: moov at offset {info['moov_offset']} after media data")
+
+    if dry_run or not pending:
+        return True
+
+    ok = True
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, status in executor.map(_rewrite_worker, pending):
+            print(f"{os.path.basename(path)}: {status}")
+            ok = ok and not status.startswith('failed')
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move the moov atom of catalog videos to the front for fast playback start")
+    parser.add_argument('--video-dir', help="Directory holding video_<ref> files (default: app/static/videos)")
+    parser.add_argument('--workers', type=int, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--dry-run', action='store_true', help="Only report which files need rewriting")
+    args = parser.parse_args()
+
+    sys.exit(0 if rewrite_all(args.video_dir, args.workers, args.dry_run) else 1)
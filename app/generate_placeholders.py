@@ -1,6 +1,8 @@
 import os
 import sys
 
+from decision_tree import get_decision_tree
+
 def create_placeholder_files(format="mp4"):
     """
     Create placeholder text files to represent videos
@@ -8,24 +10,9 @@ def create_placeholder_files(format="mp4"):
     Args:
         format: File format to use for placeholders ("mp4" or "mov")
     """
-    video_refs = [
-        "2.1.1", "2.1.2", "2.2.1", "2.3", "2.4", "2.5",
-        "3.1", "3.2", "3.3", "4.0", "5.0"
-    ]
-
-    video_titles = {
-        "2.1.1": "Sheet Dressing Application",
-        "2.1.2": "Iodosorb Powder/Gels Application",
-        "2.2.1": "Primary Dressing for Cavity Wounds",
-        "2.3": "Webspace Wound Treatment",
-        "2.4": "Multiple Toe Wounds with Inadine",
-        "2.5": "Wounds for Povidone Iodine Soaked Gauze",
-        "3.1": "Toes Location Treatment",
-        "3.2": "Mid Foot/Ankle Location Treatment",
-        "3.3": "Heel Location Treatment",
-        "4.0": "Tubifast to Secure",
-        "5.0": "Things to Watch Out For"
-    }
+    # Video references and titles come from the decision tree definition
+    video_titles = get_decision_tree().titles
+    video_refs = list(video_titles)
 
     # Path to the videos directory
     video_dir = os.path.join(os.path.dirname(__file__), 'static', 'videos')
@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import (
+    get_local_video_dir,
+    parse_video_filename,
+    thumbnail_filename,
+    file_content_hash,
+)
+
+#==============================================================================
+# THUMBNAIL SETTINGS
+#==============================================================================
+# Index of generated thumbnails, stored in the video directory
+INDEX_FILENAME = 'thumbnails.json'
+
+# Poster frame width in pixels (height keeps the aspect ratio)
+POSTER_WIDTH = 480
+
+# Preview sprite: a grid of small frames sampled across the video
+SPRITE_FRAME_WIDTH = 160
+SPRITE_COLUMNS = 5
+SPRITE_ROWS = 2
+
+#==============================================================================
+# FFMPEG HELPERS
+#==============================================================================
+def probe_duration(video_path):
+    """Return the duration of a video in seconds using ffprobe"""
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'format=duration',
+            '-of', 'default=noprint_wrappers=1:nokey=1',
+            video_path
+        ],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+def extract_poster(video_path, output_path, duration):
+    """Extract a single frame a little way into the video as the poster"""
+    # Skip the first moments, which are often black or a title card
+    timestamp = min(duration * 0.1, 5.0)
+    subprocess.run(
+        [
+            'ffmpeg', '-y', '-v', 'error',
+            '-ss', f"{timestamp:.2f}",
+            '-i', video_path,
+            '-frames:v', '1',
+            '-vf', f"scale={POSTER_WIDTH}:-2",
+            '-q:v', '4',
+            output_path
+        ],
+        check=True
+    )
+
+def extract_sprite(video_path, output_path, duration):
+    """Tile evenly spaced frames from the video into one preview sprite"""
+    frame_count = SPRITE_COLUMNS * SPRITE_ROWS
+    interval = max(duration / frame_count, 0.1)
+    subprocess.run(
+        [
+            'ffmpeg', '-y', '-v', 'error',
+            '-i', video_path,
+            '-vf', (
+                f"fps=1/{interval:.3f},"
+                f"scale={SPRITE_FRAME_WIDTH}:-2,"
+                f"tile={SPRITE_COLUMNS}x{SPRITE_ROWS}"
+            ),
+            '-frames:v', '1',
+            '-q:v', '5',
+            output_path
+        ],
+        check=True
+    )
+
+#==============================================================================
+# THUMBNAIL INDEX
+#==============================================================================
+def load_index(video_dir):
+    """Load the thumbnail index, or an empty one if it does not exist"""
+    path = os.path.join(video_dir, INDEX_FILENAME)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_index(video_dir, index):
+    """Write the thumbnail index atomically"""
+    path = os.path.join(video_dir, INDEX_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+#==============================================================================
+# THUMBNAIL GENERATION
+#==============================================================================
+def find_source_videos(video_dir):
+    """Return {ref: path} for the videos the catalog would serve (MP4 over MOV)"""
+    sources = {}
+    for filename in sorted(os.listdir(video_dir)):
+        parsed = parse_video_filename(filename)
+        if not parsed:
+            continue
+        ref, ext = parsed
+        if ref in sources and ext == '.mov':
+            continue
+        sources[ref] = os.path.join(video_dir, filename)
+    return sources
+
+def generate_for_video(ref, video_path, entry, force=False):
+    """
+    Generate the poster and sprite for one video if its content changed
+
+    Args:
+        ref: Video reference (e.g. 2.1.1)
+        video_path: Path of the source video
+        entry: Previous index entry for this reference, or None
+        force: Regenerate even if the content hash is unchanged
+
+    Returns:
+        Tuple of (index entry, status message)
+    """
+    video_dir = os.path.dirname(video_path)
+    stat = os.stat(video_path)
+    poster_path = os.path.join(video_dir, thumbnail_filename(ref, 'poster'))
+    sprite_path = os.path.join(video_dir, thumbnail_filename(ref, 'sprite'))
+    outputs_exist = os.path.isfile(poster_path) and os.path.isfile(sprite_path)
+
+    entry = dict(entry or {})
+
+    # Cheap check first: same file, same size and modification time
+    if (not force and outputs_exist
+            and entry.get('source') == os.path.basename(video_path)
+            and entry.get('size') == stat.st_size
+            and entry.get('mtime_ns') == stat.st_mtime_ns):
+        return entry, 'unchanged'
+
+    content_hash = file_content_hash(video_path)
+    entry.update({
+        'source': os.path.basename(video_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    })
+
+    # Touched but identical content does not need new images
+    if not force and outputs_exist and entry.get('sha256') == content_hash:
+        return entry, 'unchanged (content hash matches)'
+
+    duration = probe_duration(video_path)
+    extract_poster(video_path, poster_path, duration)
+    extract_sprite(video_path, sprite_path, duration)
+
+    entry.update({
+        'sha256': content_hash,
+        'duration': duration,
+        'poster': os.path.basename(poster_path),
+        'sprite': os.path.basename(sprite_path),
+        'sprite_grid': [SPRITE_COLUMNS, SPRITE_ROWS],
+        'sprite_interval': duration / (SPRITE_COLUMNS * SPRITE_ROWS),
+    })
+    return entry, 'generated'
+
+def generate_thumbnails(video_dir=None, force=False, workers=2):
+    """Generate posters and sprites for every catalog video that changed"""
+    video_dir = video_dir or get_local_video_dir()
+
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("Error: ffmpeg and ffprobe must be installed to generate thumbnails")
+        return False
+
+    index = load_index(video_dir)
+    sources = find_source_videos(video_dir)
+    ok = True
+
+    def process(item):
+        ref, path = item
+        try:
+            return ref, generate_for_video(ref, path, index.get(ref), force)
+        except (subprocess.CalledProcessError, ValueError) as e:
+            # e.g. placeholder text files that are not real videos
+            return ref, (index.get(ref), f"failed ({e})")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for ref, (entry, status) in executor.map(process, sorted(sources.items())):
+            print(f"{ref}: {status}")
+            if status.startswith('failed'):
+                ok = False
+            if entry:
+                index[ref] = entry
+
+    # Forget videos that no longer exist
+    for ref in set(index) - set(sources):
+        del index[ref]
+
+    save_index(video_dir, index)
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate poster frames and preview sprites for the video catalog")
+    parser.add_argument('--video-dir', help="Directory holding video_<ref> files (default: app/static/videos)")
+    parser.add_argument('--force', action='store_true', help="Regenerate even if videos are unchanged")
+    parser.add_argument('--workers', type=int, default=2, help="Number of videos processed in parallel")
+    args = parser.parse_args()
+
+    sys.exit(0 if generate_thumbnails(args.video_dir, args.force, args.workers) else 1)
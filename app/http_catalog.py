@@ -0,0 +1,71 @@
+from config import get_config
+from catalog import VideoCatalog
+from decision_tree import get_decision_tree
+
+#==============================================================================
+# HTTP/CDN VIDEO LOADING
+#==============================================================================
+def build_http_url(base_url, ref, extension='.mp4'):
+    """Build the URL of a video published under a base URL"""
+    return f"{base_url.rstrip('/')}/video_{ref.replace('.', '_')}{extension}"
+
+def load_http_videos(base_url, extension='.mp4'):
+    """
+    Map every video reference in the decision tree to its URL under a base URL
+
+    Plain HTTP origins and CDNs cannot be listed, so the references come
+    from the decision tree and the URLs follow the video_<ref> convention.
+    """
+    return {
+        ref: build_http_url(base_url, ref, extension)
+        for ref in get_decision_tree().titles
+    }
+
+#==============================================================================
+# HTTP VIDEO CATALOG
+#==============================================================================
+class HttpVideoCatalog(VideoCatalog):
+    """Catalog of videos served from a plain HTTP origin or CDN"""
+
+    kind = 'http'
+
+    def __init__(self, base_url, extension='.mp4', ttl=0, manifest=None):
+        """
+        Args:
+            base_url: URL the video_<ref> files are published under
+            extension: File extension of the published videos
+            ttl: Seconds before the snapshot is rebuilt (0 = never expire)
+            manifest: Compiled CatalogManifest listing the published videos
+        """
+        super().__init__(self._load, ttl=ttl)
+        self.base_url = base_url
+        self.extension = extension
+        self.manifest = manifest
+
+    def _load(self):
+        if self.manifest is not None:
+            return {ref: entry['url'] for ref, entry in self.manifest.available().items()}
+        return load_http_videos(self.base_url, self.extension)
+
+    def media_info(self, ref):
+        """Return the MP4 header details recorded in the manifest, if any"""
+        return self.manifest.media_info(ref) if self.manifest is not None else None
+
+    def content_version(self, ref):
+        """Return the SHA-256 or ETag recorded in the manifest, if any"""
+        entry = self.manifest.videos.get(ref) if self.manifest is not None else None
+        return (entry.get('sha256') or entry.get('etag')) if entry else None
+
+def create_http_catalog(config=None, manifest=None):
+    """Create an HTTP catalog from the application configuration"""
+    config = config or get_config()
+    if not config["HTTP_VIDEO_BASE_URL"] and manifest is None:
+        raise ValueError("STORAGE_BACKEND=http requires HTTP_VIDEO_BASE_URL")
+
+    return HttpVideoCatalog(
+        config["HTTP_VIDEO_BASE_URL"],
+        extension=config["HTTP_VIDEO_EXTENSION"],
+        # URLs only change with the tree, so there is nothing to refresh
+        ttl=0,
+        manifest=manifest
+    )
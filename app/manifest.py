@@ -0,0 +1,341 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import logging
+import argparse
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import Request, urlopen
+from urllib.error import URLError
+
+from config import get_config
+from decision_tree import get_decision_tree
+from mp4info import probe_file, probe_s3_object, probe_url
+from utils import get_local_video_dir, parse_video_filename, file_content_hash
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# MANIFEST FORMAT
+#==============================================================================
+# Version of the manifest file layout, bumped on incompatible changes
+MANIFEST_FORMAT = 1
+
+# Metadata key S3 uploads may carry with the object's SHA-256 digest
+S3_HASH_METADATA_KEY = 'sha256'
+
+class CatalogManifest:
+    """
+    Read-only view of a compiled catalog manifest
+
+    The manifest lists every video reference with its title and, for the
+    videos present in storage, the chosen object/file, format, size, media
+    details, content hash and URL. Catalogs built from it skip directory
+    and bucket listings entirely.
+    """
+
+    def __init__(self, data):
+        if data.get('format') != MANIFEST_FORMAT:
+            raise ValueError(f"Unsupported manifest format {data.get('format')!r} (expected {MANIFEST_FORMAT})")
+        self.version = data['version']
+        self.backend = data['backend']
+        self.source = MappingProxyType(dict(data.get('source', {})))
+        self.videos = MappingProxyType({
+            ref: MappingProxyType(entry) for ref, entry in data['videos'].items()
+        })
+
+    def available(self):
+        """Return {ref: entry} for the videos present in storage"""
+        return {ref: entry for ref, entry in self.videos.items() if entry.get('key')}
+
+    def titles(self):
+        """Return {ref: title} for every reference in the manifest"""
+        return {ref: entry['title'] for ref, entry in self.videos.items() if entry.get('title')}
+
+    def media_info(self, ref):
+        """Return the MP4 header details recorded for a reference, if any"""
+        entry = self.videos.get(ref)
+        return entry.get('media') if entry else None
+
+def load_manifest(path):
+    """Load a compiled manifest with a single read"""
+    with open(path, 'rb') as f:
+        manifest = CatalogManifest(json.loads(f.read()))
+    logger.info(f"Loaded catalog manifest {manifest.version} from {path} ({len(manifest.available())} videos)")
+    return manifest
+
+def save_manifest(path, data):
+    """Write a manifest atomically"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+#==============================================================================
+# MANIFEST COMPILATION
+#==============================================================================
+def _entry(key, ext, size, media, sha256=None, etag=None, url=None):
+    return {
+        'key': key,
+        'format': ext.lstrip('.'),
+        'size': size,
+        'duration': media.get('duration') if media else None,
+        'media': media,
+        'sha256': sha256,
+        'etag': etag,
+        'url': url,
+    }
+
+# Descriptions of unchanged files/objects, reused by long-running callers
+# such as the shared catalog refresher instead of re-hashing and re-probing
+_described = {}
+
+def _keep_described(kind, used):
+    """Forget remembered descriptions of one kind that the last build did not use"""
+    for stamp in [stamp for stamp in _described if stamp[0] == kind and stamp not in used]:
+        del _described[stamp]
+
+def _preferred_by_ref(names):
+    """Group video file names/keys by reference, keeping MP4 over MOV"""
+    chosen = {}
+    for name in sorted(names):
+        parsed = parse_video_filename(name)
+        if not parsed:
+            continue
+        ref, ext = parsed
+        if ref not in chosen or (ext == '.mp4' and chosen[ref][1] != '.mp4'):
+            chosen[ref] = (name, ext)
+    return chosen
+
+def describe_local(video_dir, workers):
+    """Describe the local videos the catalog would serve"""
+    chosen = _preferred_by_ref(os.listdir(video_dir))
+    used = set()
+
+    def describe(item):
+        ref, (filename, ext) = item
+        path = os.path.join(video_dir, filename)
+        stat = os.stat(path)
+        stamp = ('local', path, stat.st_size, stat.st_mtime_ns)
+        used.add(stamp)
+        if stamp not in _described:
+            _described[stamp] = _entry(
+                filename, ext, stat.st_size, probe_file(path),
+                sha256=file_content_hash(path)
+            )
+        return ref, _described[stamp]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        described = dict(executor.map(describe, sorted(chosen.items())))
+    _keep_described('local', used)
+    return described
+
+def describe_s3(config, workers):
+    """Describe the S3 objects the catalog would serve"""
+    from s3_catalog import get_s3_client, iter_s3_objects, build_s3_url
+
+    client = get_s3_client(config["AWS_REGION"], config["S3_ENDPOINT_URL"] or None)
+    bucket = config["S3_BUCKET_NAME"]
+    objects = {obj['Key']: obj for obj in iter_s3_objects(client, bucket, config["S3_PREFIX"])}
+    chosen = _preferred_by_ref(objects)
+    used = set()
+
+    def describe(item):
+        ref, (key, ext) = item
+        size = objects[key]['Size']
+        stamp = ('s3', bucket, key, objects[key].get('ETag'), objects[key].get('LastModified'))
+        used.add(stamp)
+        if stamp not in _described:
+            head = client.head_object(Bucket=bucket, Key=key)
+            _described[stamp] = _entry(
+                key, ext, size, probe_s3_object(client, bucket, key, size),
+                sha256=head.get('Metadata', {}).get(S3_HASH_METADATA_KEY),
+                etag=objects[key].get('ETag'),
+                url=build_s3_url(bucket, config["AWS_REGION"], key, config["S3_ENDPOINT_URL"] or None)
+            )
+        return ref, _described[stamp]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        described = dict(executor.map(describe, sorted(chosen.items())))
+    _keep_described('s3', used)
+    return described
+
+def describe_http(config, refs, workers):
+    """Describe the videos published under the HTTP base URL"""
+    from http_catalog import build_http_url
+
+    base_url = config["HTTP_VIDEO_BASE_URL"]
+    extension = config["HTTP_VIDEO_EXTENSION"]
+    used = set()
+
+    def describe(ref):
+        url = build_http_url(base_url, ref, extension)
+        try:
+            headers = _http_head(url)
+        except URLError as e:
+            logger.warning(f"{url} is not reachable: {e}")
+            return ref, None
+        size = int(headers.get('Content-Length', 0))
+        stamp = ('http', url, size, headers.get('ETag'), headers.get('Last-Modified'))
+        used.add(stamp)
+        if stamp in _described:
+            return ref, _described[stamp]
+        try:
+            media = probe_url(url, size) if size else None
+        except OSError as e:
+            logger.warning(f"Could not read MP4 headers of {url}: {e}")
+            # Not remembered, so the next build probes again
+            return ref, _entry(url.rsplit('/', 1)[-1], extension, size, None, etag=headers.get('ETag'), url=url)
+        _described[stamp] = _entry(
+            url.rsplit('/', 1)[-1], extension, size, media,
+            etag=headers.get('ETag'), url=url
+        )
+        return ref, _described[stamp]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        described = {ref: entry for ref, entry in executor.map(describe, refs) if entry}
+    _keep_described('http', used)
+    return described
+
+def _http_head(url, timeout=10):
+    with urlopen(Request(url, method='HEAD'), timeout=timeout) as response:
+        return response.headers
+
+def build_manifest(config=None, backend=None, workers=8):
+    """
+    Compile the manifest of the configured storage backend
+
+    Every reference in the decision tree is listed with its title, so the
+    manifest also records which videos are still missing from storage.
+    """
+    from storage import get_storage_backend_name
+
+    config = config or get_config()
+    backend = backend or get_storage_backend_name(config)
+    tree = get_decision_tree()
+
+    if backend == 'local':
+        video_dir = get_local_video_dir()
+        found = describe_local(video_dir, workers)
+        source = {'video_dir': video_dir}
+    elif backend == 's3':
+        found = describe_s3(config, workers)
+        source = {'bucket': config["S3_BUCKET_NAME"], 'prefix': config["S3_PREFIX"]}
+    else:
+        found = describe_http(config, list(tree.titles), workers)
+        source = {'base_url': config["HTTP_VIDEO_BASE_URL"]}
+
+    videos = {}
+    for ref in sorted(set(tree.titles) | set(found)):
+        entry = {'title': tree.title_for(ref)}
+        entry.update(found.get(ref) or {'key': None})
+        videos[ref] = entry
+
+    # The version identifies the content, so unchanged storage compiles to
+    # the same version and caches keyed on it stay valid
+    digest = hashlib.sha256(json.dumps(videos, sort_keys=True).encode('utf-8')).hexdigest()
+    return {
+        'format': MANIFEST_FORMAT,
+        'version': digest[:16],
+        'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'backend': backend,
+        'source': source,
+        'tree_fingerprint': tree.fingerprint,
+        'videos': videos,
+    }
+
+#==============================================================================
+# MANIFEST VERIFICATION
+#==============================================================================
+def verify_manifest(manifest, config=None, workers=8, deep=False):
+    """
+    Check every available manifest entry against storage in parallel
+
+    Sizes (and ETags for S3) are compared for every entry; with deep, local
+    files are re-hashed too.
+
+    Returns:
+        List of (ref, problem) tuples, empty when the manifest is current
+    """
+    config = config or get_config()
+    backend = manifest.backend
+
+    if backend == 's3':
+        from s3_catalog import get_s3_client
+        client = get_s3_client(config["AWS_REGION"], config["S3_ENDPOINT_URL"] or None)
+        bucket = manifest.source.get('bucket') or config["S3_BUCKET_NAME"]
+    video_dir = manifest.source.get('video_dir') or get_local_video_dir()
+
+    def check(item):
+        ref, entry = item
+        try:
+            if backend == 'local':
+                path = os.path.join(video_dir, entry['key'])
+                if not os.path.isfile(path):
+                    return ref, f"missing file {path}"
+                if os.path.getsize(path) != entry['size']:
+                    return ref, f"size changed ({entry['size']} -> {os.path.getsize(path)})"
+                if deep and entry.get('sha256') and file_content_hash(path) != entry['sha256']:
+                    return ref, "content hash changed"
+            elif backend == 's3':
+                head = client.head_object(Bucket=bucket, Key=entry['key'])
+                if head['ContentLength'] != entry['size']:
+                    return ref, f"size changed ({entry['size']} -> {head['ContentLength']})"
+                if entry.get('etag') and head.get('ETag') != entry['etag']:
+                    return ref, "ETag changed"
+            else:
+                headers = _http_head(entry['url'])
+                size = int(headers.get('Content-Length', -1))
+                if size != entry['size']:
+                    return ref, f"size changed ({entry['size']} -> {size})"
+        except Exception as e:
+            return ref, f"check failed ({e})"
+        return ref, None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(check, sorted(manifest.available().items()))
+        return [(ref, problem) for ref, problem in results if problem]
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Compile or verify the catalog manifest of the video storage")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Compile a manifest from the configured storage backend")
+    build_parser.add_argument('--output', default=get_config()["MANIFEST_PATH"] or 'catalog_manifest.json',
+                              help="Manifest file to write (default: MANIFEST_PATH or catalog_manifest.json)")
+    build_parser.add_argument('--backend', choices=['local', 's3', 'http'], help="Storage backend (default: configured)")
+    build_parser.add_argument('--workers', type=int, default=8, help="Videos described in parallel")
+
+    verify_parser = subparsers.add_parser('verify', help="Check a manifest against its storage backend")
+    verify_parser.add_argument('manifest', nargs='?', default=get_config()["MANIFEST_PATH"] or 'catalog_manifest.json',
+                               help="Manifest file to verify (default: MANIFEST_PATH or catalog_manifest.json)")
+    verify_parser.add_argument('--workers', type=int, default=8, help="Entries checked in parallel")
+    verify_parser.add_argument('--deep', action='store_true', help="Re-hash local files instead of comparing sizes only")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        data = build_manifest(backend=args.backend, workers=args.workers)
+        save_manifest(args.output, data)
+        missing = [ref for ref, entry in data['videos'].items() if not entry['key']]
+        print(f"Wrote manifest {data['version']} to {args.output} ({len(data['videos']) - len(missing)} videos)")
+        if missing:
+            print(f"Missing from storage: {', '.join(missing)}")
+        return True
+
+    problems = verify_manifest(load_manifest(args.manifest), workers=args.workers, deep=args.deep)
+    for ref, problem in problems:
+        print(f"{ref}: {problem}")
+    print("Manifest is up to date" if not problems else f"{len(problems)} entries are out of date")
+    return not problems
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from config import get_config
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# METRIC SETTINGS
+#==============================================================================
+# Prefix of every exported metric name
+METRIC_PREFIX = 'woundcare_'
+
+# Upper bounds (seconds) of the span duration histogram buckets
+SPAN_BUCKETS = (0.00001, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+# Descriptions shown in the Prometheus output
+METRIC_HELP = {
+    'span_seconds': 'Duration of instrumented operations',
+    'catalog_refreshes_total': 'Full video catalog rebuilds',
+    'catalog_updates_total': 'Catalog snapshots published with changed content',
+    's3_requests_total': 'S3 API calls made by the app',
+    'cache_hits_total': 'Cache lookups answered from the cache',
+    'cache_misses_total': 'Cache lookups that had to build or fetch the value',
+    'videos_served_total': 'Videos rendered in the app or streamed by the video server',
+    'video_server_bytes_total': 'Bytes the local video server was asked to send',
+    'telemetry_events_total': 'Usage events taken from the telemetry queue',
+    'telemetry_events_dropped_total': 'Usage events dropped because the queue was full or the store failed',
+}
+
+#==============================================================================
+# METRIC REGISTRY
+#==============================================================================
+# Series are keyed by (name, sorted label tuple); one lock guards all of
+# them, since every update is a couple of dictionary operations
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+def _series_key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    """Add to a counter, e.g. inc('cache_hits_total', cache='presign')"""
+    key = _series_key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+def observe(name, value, **labels):
+    """Record a value (seconds) in a histogram"""
+    key = _series_key(name, labels)
+    index = bisect_left(SPAN_BUCKETS, value)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            # Per-bucket counts (plus +Inf), then sum and count
+            histogram = _histograms[key] = [0] * (len(SPAN_BUCKETS) + 1) + [0.0, 0]
+        histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+@contextmanager
+def span(name, **labels):
+    """Time a block and record its duration under span_seconds{span=name}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('span_seconds', time.perf_counter() - start, span=name, **labels)
+
+def timed(name):
+    """Decorator recording every call of a function as a span"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def reset():
+    """Clear every series (used by benchmarks between runs)"""
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+#------------------------------------------------------------------------------
+# EXPORT FORMATS
+#------------------------------------------------------------------------------
+def snapshot():
+    """Return every series as plain data for JSON export"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    result = {'timestamp': time.time(), 'counters': [], 'histograms': []}
+    for (name, labels), value in sorted(counters.items()):
+        result['counters'].append({'name': name, 'labels': dict(labels), 'value': value})
+    for (name, labels), values in sorted(histograms.items()):
+        count = values[-1]
+        result['histograms'].append({
+            'name': name,
+            'labels': dict(labels),
+            'count': count,
+            'sum': values[-2],
+            'mean': values[-2] / count if count else None,
+            'buckets': dict(zip([str(b) for b in SPAN_BUCKETS] + ['+Inf'], _cumulative(values[:-2]))),
+        })
+    return result
+
+def render_prometheus():
+    """Render every series in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: list(values) for key, values in _histograms.items()}
+
+    lines = []
+    described = set()
+
+    def describe(name, metric_type):
+        if name not in described:
+            described.add(name)
+            lines.append(f"# HELP {METRIC_PREFIX}{name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {METRIC_PREFIX}{name} {metric_type}")
+
+    for (name, labels), value in sorted(counters.items()):
+        describe(name, 'counter')
+        lines.append(f"{METRIC_PREFIX}{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), values in sorted(histograms.items()):
+        describe(name, 'histogram')
+        bounds = [repr(b) for b in SPAN_BUCKETS] + ['+Inf']
+        for bound, count in zip(bounds, _cumulative(values[:-2])):
+            lines.append(f"{METRIC_PREFIX}{name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+        lines.append(f"{METRIC_PREFIX}{name}_sum{_format_labels(labels)} {values[-2]}")
+        lines.append(f"{METRIC_PREFIX}{name}_count{_format_labels(labels)} {values[-1]}")
+
+    return '\n'.join(lines) + '\n'
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+#==============================================================================
+# OPS HTTP SERVER
+#==============================================================================
+# Path -> callable returning (status, content type, body); other modules
+# can add endpoints (e.g. readiness checks) with register_route
+_routes = {}
+
+def register_route(path, handler):
+    """Serve a callable's (status, content type, body) result at a path"""
+    _routes[path] = handler
+
+register_route('/metrics', lambda: (200, 'text/plain; version=0.0.4', render_prometheus()))
+register_route('/metrics.json', lambda: (200, 'application/json', json.dumps(snapshot())))
+
+class OpsRequestHandler(BaseHTTPRequestHandler):
+    """Answer GET requests for the registered operational endpoints"""
+
+    server_version = 'WoundCareOps/1.0'
+
+    def do_GET(self):
+        handler = _routes.get(urlsplit(self.path).path)
+        if handler is None:
+            status, content_type, body = 404, 'text/plain', 'Not found\n'
+        else:
+            try:
+                status, content_type, body = handler()
+            except Exception as e:
+                logger.error(f"Ops endpoint {self.path} failed: {str(e)}")
+                status, content_type, body = 500, 'text/plain', 'Internal error\n'
+
+        payload = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+class OpsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_ops_server(host='0.0.0.0', port=9102):
+    """Start the process-wide ops server in a background thread (idempotent)"""
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = OpsServer((host, port), OpsRequestHandler)
+            threading.Thread(target=server.serve_forever, name='ops-server', daemon=True).start()
+            _server = server
+            logger.info(f"Serving ops endpoints on {host}:{server.server_address[1]}")
+    return _server
+
+def write_snapshot(path):
+    """Write the current metrics as JSON, replacing the file atomically"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(snapshot(), f, indent=2)
+    os.replace(tmp_path, path)
+
+_exporting = False
+_export_lock = threading.Lock()
+
+def start_metrics_export(config=None):
+    """
+    Start the exporters enabled in the configuration
+
+    METRICS_PORT starts the ops server with /metrics (Prometheus text) and
+    /metrics.json; METRICS_DUMP_PATH starts a thread writing a JSON snapshot
+    every METRICS_DUMP_SECONDS. Only the first call does anything, so it is
+    safe to call on every rerun.
+    """
+    global _exporting
+    if _exporting:
+        return
+    with _export_lock:
+        if _exporting:
+            return
+        _exporting = True
+        config = config or get_config()
+
+        if config["METRICS_PORT"]:
+            try:
+                start_ops_server(config["METRICS_HOST"], config["METRICS_PORT"])
+            except OSError as e:
+                logger.error(f"Could not start the ops server: {str(e)}")
+
+        dump_path = config["METRICS_DUMP_PATH"]
+        if dump_path:
+            interval = config["METRICS_DUMP_SECONDS"]
+
+            def dump_loop():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        write_snapshot(dump_path)
+                    except OSError as e:
+                        logger.error(f"Could not write metrics to {dump_path}: {str(e)}")
+
+            threading.Thread(target=dump_loop, name='metrics-dump', daemon=True).start()
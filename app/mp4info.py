@@ -0,0 +1,151 @@
+import os
+import struct
+
+#==============================================================================
+# MP4/MOV BOX PARSING
+#==============================================================================
+# Top-level box types expected in MP4/QuickTime files. Anything else at the
+# start of a file means it is not a real video (e.g. a placeholder text file).
+TOP_LEVEL_BOXES = {
+    b'ftyp', b'moov', b'mdat', b'free', b'skip', b'wide', b'uuid',
+    b'pdin', b'moof', b'mfra', b'meta', b'styp', b'sidx', b'pnot',
+}
+
+# Boxes on the path from moov to the chunk offset tables
+CONTAINER_BOXES = {b'moov', b'trak', b'mdia', b'minf', b'stbl'}
+
+def iter_boxes(read_at, start, end):
+    """
+    Yield (type, offset, size, header_size) for the boxes between two offsets
+
+    Args:
+        read_at: Callable (offset, length) -> bytes reading the underlying file
+        start: Offset of the first box
+        end: Offset where the enclosing box (or file) ends
+    """
+    offset = start
+    while offset + 8 <= end:
+        header = read_at(offset, 16)
+        if len(header) < 8:
+            return
+
+        size, box_type = struct.unpack('>I4s', header[:8])
+        header_size = 8
+        if size == 1:
+            # 64-bit size follows the type
+            if len(header) < 16:
+                raise ValueError(f"Truncated box header at offset {offset}")
+            size = struct.unpack('>Q', header[8:16])[0]
+            header_size = 16
+        elif size == 0:
+            # Box extends to the end of the file
+            size = end - offset
+
+        if size < header_size or offset + size > end:
+            raise ValueError(f"Invalid size for box {box_type!r} at offset {offset}")
+
+        yield box_type, offset, size, header_size
+        offset += size
+
+def _parse_mvhd(read_at, offset, header_size):
+    """Return (timescale, duration) from a movie header box"""
+    body = read_at(offset + header_size, 32)
+    version = body[0]
+    if version == 1:
+        timescale, duration = struct.unpack('>IQ', body[20:32])
+    else:
+        timescale, duration = struct.unpack('>II', body[12:20])
+    return timescale, duration
+
+def probe(read_at, file_size):
+    """
+    Read the box headers of an MP4/MOV file without reading media data
+
+    Only a few small reads are made (one per top-level box plus the movie
+    header), so this works on local files and on remote objects through
+    ranged reads.
+
+    Returns:
+        Dictionary with valid, faststart, moov_offset, mdat_offset,
+        duration (seconds), bitrate (bits per second) and brand
+    """
+    info = {
+        'valid': False,
+        'faststart': False,
+        'size': file_size,
+        'brand': None,
+        'moov_offset': None,
+        'mdat_offset': None,
+        'duration': None,
+        'bitrate': None,
+    }
+
+    try:
+        boxes = []
+        for box_type, offset, size, header_size in iter_boxes(read_at, 0, file_size):
+            if not boxes and box_type not in TOP_LEVEL_BOXES:
+                return info
+            boxes.append((box_type, offset, size, header_size))
+
+        for box_type, offset, size, header_size in boxes:
+            if box_type == b'ftyp' and info['brand'] is None:
+                info['brand'] = read_at(offset + header_size, 4).decode('ascii', 'replace')
+            elif box_type == b'moov' and info['moov_offset'] is None:
+                info['moov_offset'] = offset
+                for child, child_offset, _, child_header in iter_boxes(read_at, offset + header_size, offset + size):
+                    if child == b'mvhd':
+                        timescale, duration = _parse_mvhd(read_at, child_offset, child_header)
+                        if timescale:
+                            info['duration'] = duration / timescale
+                        break
+            elif box_type == b'mdat' and info['mdat_offset'] is None:
+                info['mdat_offset'] = offset
+    except (ValueError, struct.error):
+        return info
+
+    if info['moov_offset'] is None:
+        return info
+
+    info['valid'] = True
+    # Without an mdat box (e.g. fragmented files) the moov is already first
+    info['faststart'] = info['mdat_offset'] is None or info['moov_offset'] < info['mdat_offset']
+    if info['duration']:
+        info['bitrate'] = int(file_size * 8 / info['duration'])
+    return info
+
+#------------------------------------------------------------------------------
+# SOURCES
+#------------------------------------------------------------------------------
+def probe_file(path):
+    """Probe a local MP4/MOV file"""
+    with open(path, 'rb') as f:
+        def read_at(offset, length):
+            f.seek(offset)
+            return f.read(length)
+        return probe(read_at, os.fstat(f.fileno()).st_size)
+
+def probe_s3_object(client, bucket, key, size):
+    """Probe an MP4/MOV object in S3 using small ranged GET requests"""
+    def read_at(offset, length):
+        end = min(offset + length, size) - 1
+        if end < offset:
+            return b''
+        response = client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{end}")
+        return response['Body'].read()
+    return probe(read_at, size)
+
+def probe_url(url, size, timeout=10):
+    """Probe an MP4/MOV file on an HTTP server using Range requests"""
+    from urllib.request import Request, urlopen
+
+    def read_at(offset, length):
+        end = min(offset + length, size) - 1
+        if end < offset:
+            return b''
+        request = Request(url, headers={'Range': f"bytes={offset}-{end}"})
+        with urlopen(request, timeout=timeout) as response:
+            # Not a ValueError: that would mark the file itself as invalid
+            if response.status != 206:
+                raise OSError(f"Server ignored the Range request for {url}")
+            return response.read()
+    return probe(read_at, size)
@@ -0,0 +1,213 @@
+import os
+import sys
+import json
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import (
+    get_local_video_dir,
+    file_content_hash,
+    hls_package_relpath,
+    HLS_DIRNAME,
+    HLS_MASTER_PLAYLIST,
+)
+from generate_thumbnails import find_source_videos
+
+#==============================================================================
+# PACKAGING SETTINGS
+#==============================================================================
+# Record of the source a package was built from, used for incremental runs
+STAMP_FILENAME = 'source.json'
+
+# Seconds of video per HLS segment
+SEGMENT_SECONDS = 4
+
+# Bitrate ladder: (name, height, video bitrate, audio bitrate)
+RENDITIONS = [
+    ('360p', 360, '800k', '96k'),
+    ('540p', 540, '1400k', '128k'),
+    ('720p', 720, '2800k', '128k'),
+]
+
+#==============================================================================
+# PACKAGE LOCATIONS
+#==============================================================================
+def hls_package_dir(video_dir, ref):
+    """Return the directory holding the HLS package of a reference"""
+    return os.path.join(video_dir, hls_package_relpath(ref))
+
+def hls_master_path(video_dir, ref):
+    """Return the master playlist path of a reference's HLS package"""
+    return os.path.join(hls_package_dir(video_dir, ref), HLS_MASTER_PLAYLIST)
+
+#==============================================================================
+# FFMPEG HELPERS
+#==============================================================================
+def has_audio(video_path):
+    """Whether the video has an audio stream"""
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-select_streams', 'a',
+            '-show_entries', 'stream=index',
+            '-of', 'csv=p=0',
+            video_path
+        ],
+        capture_output=True, text=True, check=True
+    )
+    return bool(result.stdout.strip())
+
+def build_ffmpeg_command(video_path, output_dir, with_audio):
+    """Build a single ffmpeg command that encodes every rendition at once"""
+    count = len(RENDITIONS)
+    split_outputs = ''.join(f"[v{i}]" for i in range(count))
+    filters = [f"[0:v]split={count}{split_outputs}"]
+    for i, (_, height, _, _) in enumerate(RENDITIONS):
+        filters.append(f"[v{i}]scale=-2:{height}[v{i}out]")
+
+    command = [
+        'ffmpeg', '-y', '-v', 'error',
+        '-i', video_path,
+        '-filter_complex', ';'.join(filters),
+    ]
+
+    stream_map = []
+    for i, (name, _, video_bitrate, audio_bitrate) in enumerate(RENDITIONS):
+        command += [
+            '-map', f"[v{i}out]",
+            f"-c:v:{i}", 'libx264',
+            f"-b:v:{i}", video_bitrate,
+            f"-maxrate:v:{i}", video_bitrate,
+            f"-bufsize:v:{i}", video_bitrate,
+        ]
+        if with_audio:
+            command += ['-map', '0:a:0', f"-c:a:{i}", 'aac', f"-b:a:{i}", audio_bitrate]
+            stream_map.append(f"v:{i},a:{i},name:{name}")
+        else:
+            stream_map.append(f"v:{i},name:{name}")
+
+    command += [
+        # Keyframes on segment boundaries so players can switch cleanly
+        '-preset', 'veryfast',
+        '-g', str(SEGMENT_SECONDS * 30),
+        '-sc_threshold', '0',
+        '-force_key_frames', f"expr:gte(t,n_forced*{SEGMENT_SECONDS})",
+        '-f', 'hls',
+        '-hls_time', str(SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', os.path.join(output_dir, 'stream_%v_%03d.ts'),
+        '-master_pl_name', HLS_MASTER_PLAYLIST,
+        '-var_stream_map', ' '.join(stream_map),
+        os.path.join(output_dir, 'stream_%v.m3u8'),
+    ]
+    return command
+
+#==============================================================================
+# PACKAGING
+#==============================================================================
+def package_video(ref, video_path, video_dir, force=False):
+    """
+    Package one video as HLS renditions unless it is already up to date
+
+    Returns:
+        Status message for the reference
+    """
+    output_dir = hls_package_dir(video_dir, ref)
+    stamp_path = os.path.join(output_dir, STAMP_FILENAME)
+    stat = os.stat(video_path)
+
+    try:
+        with open(stamp_path) as f:
+            stamp = json.load(f)
+    except (OSError, ValueError):
+        stamp = {}
+
+    ladder = [list(r) for r in RENDITIONS]
+    master_exists = os.path.isfile(os.path.join(output_dir, HLS_MASTER_PLAYLIST))
+    up_to_date = (
+        not force
+        and master_exists
+        and stamp.get('ladder') == ladder
+        and stamp.get('source') == os.path.basename(video_path)
+    )
+
+    # Cheap check on size and modification time before hashing
+    if up_to_date and stamp.get('size') == stat.st_size and stamp.get('mtime_ns') == stat.st_mtime_ns:
+        return 'unchanged'
+
+    content_hash = file_content_hash(video_path)
+    if up_to_date and stamp.get('sha256') == content_hash:
+        stamp.update({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns})
+        _write_stamp(stamp_path, stamp)
+        return 'unchanged (content hash matches)'
+
+    # Encode into a scratch directory and swap it in, so the app never
+    # sees a half-written package
+    work_dir = output_dir + '.tmp'
+    shutil.rmtree(work_dir, ignore_errors=True)
+    os.makedirs(work_dir)
+    try:
+        subprocess.run(build_ffmpeg_command(video_path, work_dir, has_audio(video_path)), check=True)
+        _write_stamp(os.path.join(work_dir, STAMP_FILENAME), {
+            'source': os.path.basename(video_path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': content_hash,
+            'ladder': ladder,
+        })
+        shutil.rmtree(output_dir, ignore_errors=True)
+        os.replace(work_dir, output_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return 'packaged'
+
+def _write_stamp(path, stamp):
+    with open(path, 'w') as f:
+        json.dump(stamp, f, indent=2, sort_keys=True)
+
+def package_all(video_dir=None, force=False, workers=1):
+    """Package every catalog video whose source changed since the last run"""
+    video_dir = video_dir or get_local_video_dir()
+
+    if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+        print("Error: ffmpeg and ffprobe must be installed to package HLS renditions")
+        return False
+
+    sources = find_source_videos(video_dir)
+    ok = True
+
+    def process(item):
+        ref, path = item
+        try:
+            return ref, package_video(ref, path, video_dir, force)
+        except subprocess.CalledProcessError as e:
+            # e.g. placeholder text files that are not real videos
+            return ref, f"failed ({e})"
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for ref, status in executor.map(process, sorted(sources.items())):
+            print(f"{ref}: {status}")
+            ok = ok and not status.startswith('failed')
+
+    # Remove packages whose source video is gone
+    hls_root = os.path.join(video_dir, HLS_DIRNAME)
+    if os.path.isdir(hls_root):
+        current = {os.path.basename(hls_package_dir(video_dir, ref)) for ref in sources}
+        for name in os.listdir(hls_root):
+            if name not in current:
+                shutil.rmtree(os.path.join(hls_root, name), ignore_errors=True)
+                print(f"Removed stale package: {name}")
+
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Package catalog videos as adaptive-bitrate HLS renditions")
+    parser.add_argument('--video-dir', help="Directory holding video_<ref> files (default: app/static/videos)")
+    parser.add_argument('--force', action='store_true', help="Re-encode even if videos are unchanged")
+    parser.add_argument('--workers', type=int, default=1, help="Number of videos encoded in parallel")
+    args = parser.parse_args()
+
+    sys.exit(0 if package_all(args.video_dir, args.force, args.workers) else 1)
@@ -0,0 +1,139 @@
+import time
+import logging
+import threading
+
+import metrics
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# PRESIGNED URL CACHE
+#==============================================================================
+class PresignedUrlCache:
+    """
+    Cache of presigned S3 GET URLs keyed by (reference, object key)
+
+    A URL is handed out unchanged for most of its lifetime, so browsers and
+    CDNs see the same URL and can cache the video bytes. Shortly before it
+    expires a background thread signs a replacement; reruns only ever do a
+    dictionary lookup unless a URL is missing or already expired.
+    """
+
+    def __init__(self, client, bucket, expires_in=3600, renew_before=300):
+        """
+        Args:
+            client: S3 client used for signing
+            bucket: S3 bucket name
+            expires_in: Lifetime of each presigned URL in seconds
+            renew_before: Seconds before expiry at which a URL is renewed
+        """
+        self.client = client
+        self.bucket = bucket
+        self.expires_in = expires_in
+        # Never renew so early that a URL is replaced immediately
+        self.renew_before = min(renew_before, expires_in // 2)
+        self._entries = {}  # (ref, key) -> (url, expires_at)
+        # Kept apart from the URLs so recording a hit never writes an entry
+        # back over one the renewer just replaced
+        self._last_used = {}  # (ref, key) -> time of the last request
+        self._lock = threading.Lock()
+        self._renew_thread = None
+        self._stop_event = threading.Event()
+
+    #--------------------------------------------------------------------------
+    # URL access
+    #--------------------------------------------------------------------------
+    def get(self, ref, key):
+        """Return a presigned URL for an object, signing one if needed"""
+        cache_key = (ref, key)
+        now = time.time()
+        entry = self._entries.get(cache_key)
+
+        if entry is None or entry[1] <= now:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                if entry is None or entry[1] <= now:
+                    entry = self._sign(key, now)
+                    self._entries[cache_key] = entry
+                self._last_used[cache_key] = now
+            metrics.inc('cache_misses_total', cache='presign')
+            self._ensure_renewer()
+            return entry[0]
+
+        # Record use so idle URLs are not renewed forever
+        self._last_used[cache_key] = now
+        metrics.inc('cache_hits_total', cache='presign')
+        return entry[0]
+
+    def invalidate(self, ref=None):
+        """Drop cached URLs for one reference, or all of them"""
+        with self._lock:
+            if ref is None:
+                self._entries.clear()
+                self._last_used.clear()
+            else:
+                for cache_key in [k for k in self._entries if k[0] == ref]:
+                    del self._entries[cache_key]
+                    self._last_used.pop(cache_key, None)
+
+    def _sign(self, key, now):
+        url = self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=self.expires_in
+        )
+        return (url, now + self.expires_in)
+
+    #--------------------------------------------------------------------------
+    # Background renewal
+    #--------------------------------------------------------------------------
+    def _ensure_renewer(self):
+        if self._renew_thread is not None:
+            return
+        with self._lock:
+            if self._renew_thread is None:
+                self._renew_thread = threading.Thread(
+                    target=self._renew_loop,
+                    name='presign-renew',
+                    daemon=True
+                )
+                self._renew_thread.start()
+
+    def stop(self):
+        """Stop the background renewal thread"""
+        self._stop_event.set()
+
+    def _renew_loop(self):
+        interval = max(1, self.renew_before // 2)
+        while not self._stop_event.wait(interval):
+            try:
+                self.renew_expiring()
+            except Exception as e:
+                logger.error(f"Error renewing presigned URLs: {str(e)}")
+
+    def renew_expiring(self):
+        """Re-sign URLs that are about to expire and drop idle ones"""
+        now = time.time()
+        renewed = 0
+
+        for cache_key, (url, expires_at) in list(self._entries.items()):
+            # Forget URLs nobody asked for during a whole lifetime
+            if now - self._last_used.get(cache_key, now) > self.expires_in:
+                with self._lock:
+                    self._entries.pop(cache_key, None)
+                    self._last_used.pop(cache_key, None)
+                continue
+
+            if expires_at - now <= self.renew_before:
+                entry = self._sign(cache_key[1], now)
+                with self._lock:
+                    # Unless it was invalidated while signing
+                    if cache_key in self._entries:
+                        self._entries[cache_key] = entry
+                renewed += 1
+
+        if renewed:
+            logger.info(f"Renewed {renewed} presigned URL(s)")
@@ -0,0 +1,296 @@
+import os
+import json
+
+#==============================================================================
+# PWA SETTINGS
+#==============================================================================
+# Files added to the root of a static export (see export_static.py --pwa)
+MANIFEST_FILE = 'manifest.webmanifest'
+SERVICE_WORKER_FILE = 'sw.js'
+ICON_FILE = 'icon.svg'
+
+# Storage budget of videos cached on first view (precached videos excluded)
+DEFAULT_VIDEO_CACHE_BYTES = 512 * 1024 * 1024
+
+THEME_COLOR = '#ff4b4b'
+
+ICON_SVG = """<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 512 512">
+<rect width="512" height="512" rx="96" fill="#ff4b4b"/>
+<rect x="96" y="208" width="320" height="96" rx="48" fill="#fff" transform="rotate(-45 256 256)"/>
+<circle cx="236" cy="236" r="10" fill="#ff4b4b"/><circle cx="276" cy="276" r="10" fill="#ff4b4b"/>
+<circle cx="276" cy="236" r="10" fill="#ff4b4b"/><circle cx="236" cy="276" r="10" fill="#ff4b4b"/>
+</svg>
+"""
+
+#==============================================================================
+# SERVICE WORKER
+#==============================================================================
+# The service worker sits at the export root, so its scope covers every page
+# wherever the export is hosted. Placeholders (%%NAME%%) are filled with JSON.
+SERVICE_WORKER = """// Generated by export_static.py --pwa; re-export instead of editing
+const VERSION = %%VERSION%%;
+const SHELL_CACHE = "wound-care-shell-" + VERSION;
+const VIDEO_CACHE = "wound-care-videos";
+const SHELL_FILES = %%SHELL_FILES%%;
+const PINNED_VIDEOS = %%PINNED_VIDEOS%%;
+const VIDEO_VERSIONS = %%VIDEO_VERSIONS%%;
+const VIDEO_BUDGET = %%VIDEO_BUDGET%%;
+
+const scoped = (href) => new URL(href, self.registration.scope).href;
+const INDEX_URL = scoped("__video-index__");
+const versions = new Map(Object.entries(VIDEO_VERSIONS).map(([href, version]) => [scoped(href), version]));
+const pinned = new Set(PINNED_VIDEOS.map(scoped));
+const inflight = new Map();
+
+//------------------------------------------------------------------------------
+// Video index: url -> {version, size, used}, updated one change at a time
+//------------------------------------------------------------------------------
+let indexLock = Promise.resolve();
+
+function withIndex(change) {
+  const run = indexLock.then(async () => {
+    const cache = await caches.open(VIDEO_CACHE);
+    const stored = await cache.match(INDEX_URL);
+    const index = stored ? await stored.json() : {};
+    const result = await change(cache, index);
+    await cache.put(INDEX_URL, new Response(JSON.stringify(index), {headers: {"Content-Type": "application/json"}}));
+    return result;
+  });
+  indexLock = run.catch(() => null);
+  return run;
+}
+
+//------------------------------------------------------------------------------
+// Lifecycle
+//------------------------------------------------------------------------------
+self.addEventListener("install", (event) => {
+  event.waitUntil((async () => {
+    const shell = await caches.open(SHELL_CACHE);
+    await shell.addAll(SHELL_FILES.map(scoped));
+    // Videos in every sequence are available offline after the first visit
+    await Promise.all([...pinned].map((url) => cacheVideo(url).catch(() => null)));
+    await self.skipWaiting();
+  })());
+});
+
+self.addEventListener("activate", (event) => {
+  event.waitUntil((async () => {
+    for (const name of await caches.keys()) {
+      if (name.startsWith("wound-care-shell-") && name !== SHELL_CACHE) {
+        await caches.delete(name);
+      }
+    }
+    // Drop videos whose content changed or that are no longer exported
+    await withIndex(async (cache, index) => {
+      for (const url of Object.keys(index)) {
+        if (versions.get(url) !== index[url].version) {
+          delete index[url];
+          await cache.delete(url);
+        }
+      }
+    });
+    await self.clients.claim();
+  })());
+});
+
+//------------------------------------------------------------------------------
+// Requests
+//------------------------------------------------------------------------------
+self.addEventListener("fetch", (event) => {
+  const request = event.request;
+  if (request.method !== "GET") {
+    return;
+  }
+  const url = request.url.split("#")[0];
+  if (versions.has(url)) {
+    event.respondWith(serveVideo(event, url));
+  } else if (new URL(url).origin === self.location.origin) {
+    event.respondWith(serveShell(request));
+  }
+});
+
+async function serveShell(request) {
+  const options = {cacheName: SHELL_CACHE, ignoreSearch: true};
+  const cached = await caches.match(request, options)
+    || (request.url.endsWith("/") && await caches.match(request.url + "index.html", options));
+  if (cached) {
+    return cached;
+  }
+  try {
+    return await fetch(request);
+  } catch (error) {
+    // Offline on a page that was not precached: show the start page
+    if (request.mode === "navigate") {
+      return caches.match(scoped("index.html"), options);
+    }
+    throw error;
+  }
+}
+
+async function serveVideo(event, url) {
+  const cache = await caches.open(VIDEO_CACHE);
+  const response = await cache.match(url);
+  const current = response && await withIndex(async (cache, index) => {
+    const entry = index[url];
+    if (!entry || entry.version !== versions.get(url)) {
+      return false;
+    }
+    entry.used = Date.now();
+    return true;
+  });
+  if (current) {
+    return rangeResponse(response, event.request.headers.get("range"));
+  }
+  // First view: play from the network while the whole file is cached
+  event.waitUntil(cacheVideo(url).catch(() => null));
+  return fetch(event.request);
+}
+
+//------------------------------------------------------------------------------
+// Video caching with a storage budget
+//------------------------------------------------------------------------------
+function cacheVideo(url) {
+  // Players issue several range requests; download each video only once
+  if (!inflight.has(url)) {
+    inflight.set(url, downloadVideo(url).finally(() => inflight.delete(url)));
+  }
+  return inflight.get(url);
+}
+
+async function downloadVideo(url) {
+  const version = versions.get(url);
+  const cached = await withIndex(async (cache, index) => Boolean(index[url] && index[url].version === version));
+  if (cached) {
+    return;
+  }
+
+  // Cross-origin videos (S3, CDN) need CORS to be cached
+  const response = await fetch(url, {mode: "cors", credentials: "omit"});
+  if (!response.ok) {
+    throw new Error("HTTP " + response.status + " for " + url);
+  }
+  const body = await response.blob();
+
+  await withIndex(async (cache, index) => {
+    // Evict the least recently used videos (never the pinned ones) until it fits
+    let total = 0;
+    for (const [other, entry] of Object.entries(index)) {
+      if (other !== url && !pinned.has(other)) {
+        total += entry.size;
+      }
+    }
+    const victims = Object.keys(index)
+      .filter((other) => other !== url && !pinned.has(other))
+      .sort((a, b) => index[a].used - index[b].used);
+    const budget = pinned.has(url) ? Infinity : VIDEO_BUDGET;
+    while (total + body.size > budget && victims.length) {
+      const victim = victims.shift();
+      total -= index[victim].size;
+      delete index[victim];
+      await cache.delete(victim);
+    }
+    if (total + body.size > budget) {
+      return;
+    }
+
+    await cache.put(url, new Response(body, {headers: {
+      "Content-Type": response.headers.get("Content-Type") || "video/mp4",
+      "Content-Length": String(body.size),
+    }}));
+    index[url] = {version: version, size: body.size, used: Date.now()};
+  });
+}
+
+async function rangeResponse(response, range) {
+  // Media elements ask for byte ranges, which the Cache API does not answer
+  const match = range && /^bytes=(\\d*)-(\\d*)$/.exec(range.trim());
+  if (!match || (match[1] === "" && match[2] === "")) {
+    return response;
+  }
+  const body = await response.blob();
+  let start;
+  let end;
+  if (match[1] === "") {
+    start = Math.max(0, body.size - Number(match[2]));
+    end = body.size - 1;
+  } else {
+    start = Number(match[1]);
+    end = match[2] === "" ? body.size - 1 : Math.min(Number(match[2]), body.size - 1);
+  }
+  if (start >= body.size || start > end) {
+    return new Response(null, {status: 416, headers: {"Content-Range": "bytes */" + body.size}});
+  }
+  return new Response(body.slice(start, end + 1), {status: 206, headers: {
+    "Content-Type": response.headers.get("Content-Type") || "video/mp4",
+    "Content-Length": String(end - start + 1),
+    "Content-Range": "bytes " + start + "-" + end + "/" + body.size,
+    "Accept-Ranges": "bytes",
+  }});
+}
+"""
+
+#==============================================================================
+# EXPORT HOOKS
+#==============================================================================
+def pwa_head(root):
+    """Return the <head> tags linking a page to the manifest and service worker"""
+    return f"""
+<link rel="manifest" href="{root}{MANIFEST_FILE}">
+<meta name="theme-color" content="{THEME_COLOR}">
+<script>
+if ("serviceWorker" in navigator) {{
+  window.addEventListener("load", () => {{
+    navigator.serviceWorker.register("{root}{SERVICE_WORKER_FILE}");
+    // Ask the browser not to clear cached videos under storage pressure
+    if (navigator.storage && navigator.storage.persist) {{
+      navigator.storage.persist();
+    }}
+  }});
+}}
+</script>"""
+
+def write_pwa(output_dir, index, pinned_refs, video_cache_bytes=DEFAULT_VIDEO_CACHE_BYTES):
+    """
+    Write the web app manifest, icon and service worker of a static export
+
+    The service worker precaches every page plus the videos of pinned_refs
+    (the common tail shown in every sequence) and caches other videos on
+    first view within video_cache_bytes. Pages are cached per export
+    version and each video per content version, so a re-export only
+    invalidates what actually changed.
+    """
+    # Videos without a known content version are tied to the export version
+    versions = {href: video['version'] or index['version'] for href, video in index['videos'].items()}
+    pinned = sorted(href for href, video in index['videos'].items() if video['ref'] in pinned_refs)
+    shell = (
+        index['pages'] + index['assets'] + [MANIFEST_FILE, ICON_FILE]
+        + [poster for poster in index['posters'] if not poster.startswith(('http://', 'https://'))]
+    )
+
+    worker = SERVICE_WORKER
+    for name, value in [
+        ('VERSION', index['version']),
+        ('SHELL_FILES', shell),
+        ('PINNED_VIDEOS', pinned),
+        ('VIDEO_VERSIONS', versions),
+        ('VIDEO_BUDGET', video_cache_bytes),
+    ]:
+        worker = worker.replace(f'%%{name}%%', json.dumps(value, sort_keys=True))
+
+    manifest = {
+        'name': 'Wound Care Video Guide',
+        'short_name': 'Wound Care',
+        'start_url': './index.html',
+        'scope': './',
+        'display': 'standalone',
+        'background_color': '#ffffff',
+        'theme_color': THEME_COLOR,
+        'icons': [{'src': ICON_FILE, 'sizes': 'any', 'type': 'image/svg+xml', 'purpose': 'any'}],
+    }
+
+    with open(os.path.join(output_dir, SERVICE_WORKER_FILE), 'w', encoding='utf-8') as f:
+        f.write(worker)
+    with open(os.path.join(output_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    with open(os.path.join(output_dir, ICON_FILE), 'w', encoding='utf-8') as f:
+        f.write(ICON_SVG)
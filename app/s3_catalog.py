@@ -0,0 +1,513 @@
+import logging
+import threading
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import get_config
+from catalog import VideoCatalog
+from mp4info import probe_s3_object
+from utils import load_local_videos, parse_video_filename, read_into_page_cache
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SHARED S3 CLIENT
+#==============================================================================
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_s3_client(region=None, endpoint_url=None):
+    """
+    Return a pooled S3 client shared by every thread in this process
+
+    boto3 clients are thread-safe, so one client (and its connection pool)
+    per region/endpoint is enough for all sessions.
+    """
+    config = get_config()
+    region = region or config["AWS_REGION"]
+    endpoint_url = endpoint_url or config["S3_ENDPOINT_URL"] or None
+    client_key = (region, endpoint_url)
+
+    client = _clients.get(client_key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(client_key)
+            if client is None:
+                import boto3
+                from botocore.config import Config
+
+                client = boto3.client(
+                    's3',
+                    region_name=region,
+                    endpoint_url=endpoint_url,
+                    config=Config(
+                        max_pool_connections=config["S3_MAX_POOL_CONNECTIONS"],
+                        retries={'max_attempts': 3, 'mode': 'standard'}
+                    )
+                )
+                count_s3_requests(client)
+                _clients[client_key] = client
+    return client
+
+def count_s3_requests(client):
+    """Count every API call a client makes under s3_requests_total"""
+    def on_call(model, **kwargs):
+        metrics.inc('s3_requests_total', operation=model.name)
+    client.meta.events.register('before-call.s3', on_call)
+
+#------------------------------------------------------------------------------
+# S3 HELPERS
+#------------------------------------------------------------------------------
+def iter_s3_objects(client, bucket, prefix):
+    """Yield every object summary under a prefix, following pagination"""
+    paginator = client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        yield from page.get('Contents', [])
+
+def build_s3_url(bucket, region, key, endpoint_url=None):
+    """Build the URL of an S3 object (path-style when a custom endpoint is used)"""
+    endpoint_url = endpoint_url or get_config()["S3_ENDPOINT_URL"]
+    if endpoint_url:
+        return f"{endpoint_url.rstrip('/')}/{bucket}/{key}"
+    return f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
+
+def select_preferred_object(candidates):
+    """Pick the object to serve for a reference (MP4 over MOV)"""
+    if not candidates:
+        return None
+    return min(candidates, key=lambda o: (o['ext'] != '.mp4', o['key']))
+
+#==============================================================================
+# S3 VIDEO CATALOG
+#==============================================================================
+class S3VideoCatalog(VideoCatalog):
+    """
+    Catalog of videos stored in an S3 bucket
+
+    Listings walk every page of the bucket prefix. Objects are diffed against
+    the previous listing by ETag and LastModified, so only new or changed keys
+    are reprocessed. The served objects are then enriched with their HEAD
+    metadata (content type, x-amz-meta-title), fetched concurrently and cached
+    by ETag. A background thread refreshes the listing on an interval so
+    reruns never wait on S3.
+    """
+
+    kind = 's3'
+
+    def __init__(self, bucket, prefix='videos/', region='us-east-1',
+                 endpoint_url=None, client=None, ttl=0, refresh_interval=60,
+                 presign_expires=0, presign_renew_before=300, probe_media=True,
+                 manifest=None, metadata_workers=16, metadata_attempts=3):
+        """
+        Args:
+            bucket: S3 bucket name
+            prefix: Key prefix holding the videos
+            region: AWS region of the bucket
+            endpoint_url: Custom endpoint (MinIO, moto server), or None for AWS
+            client: Pre-built S3 client (e.g. a moto-backed one in tests)
+            ttl: Seconds before a rerun triggers a blocking refresh (0 = never)
+            refresh_interval: Seconds between background refreshes
+            presign_expires: Lifetime of presigned URLs (0 = use public URLs)
+            presign_renew_before: Seconds before expiry to renew presigned URLs
+            probe_media: Read MP4 box headers of new objects with ranged GETs
+            manifest: Compiled CatalogManifest to serve instead of listing
+            metadata_workers: Concurrent HEAD requests for object metadata (0 = skip)
+            metadata_attempts: Tries per HEAD request before giving up
+        """
+        super().__init__(self._load, ttl=ttl)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.region = region
+        self.endpoint_url = endpoint_url
+        self.refresh_interval = refresh_interval
+        self.probe_media = probe_media
+        self.manifest = manifest
+        self._client = client
+        self._objects = {}  # key -> processed object summary
+        self._selected_keys = {}  # ref -> key of the object being served
+        self._listed = False
+        self._refresh_thread = None
+        self._stop_event = threading.Event()
+        self._presign_expires = presign_expires
+        self._presign_renew_before = presign_renew_before
+        self._presigner = None
+        self._disk_cache = None
+        self._video_server = None
+        self._cache_names = (None, {})  # catalog version, disk cache filename -> key
+        self._metadata_workers = metadata_workers
+        self._metadata_attempts = metadata_attempts
+        self._metadata_cache = None
+        self._metadata = {}  # key -> HEAD metadata of the served objects
+        self._titles = MappingProxyType({})
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_s3_client(self.region, self.endpoint_url)
+        return self._client
+
+    #--------------------------------------------------------------------------
+    # Listing and diffing
+    #--------------------------------------------------------------------------
+    def _load(self):
+        if self.manifest is not None:
+            return self._load_manifest()
+
+        try:
+            listing = list(iter_s3_objects(self.client, self.bucket, self.prefix))
+        except Exception as e:
+            logger.error(f"Error listing videos from S3: {str(e)}")
+            # Keep serving the last good listing if we have one
+            if self._listed:
+                return dict(self._videos)
+            return load_local_videos()
+
+        objects = {}
+        changed_refs = set()
+        new_records = []
+
+        for obj in listing:
+            key = obj['Key']
+            previous = self._objects.get(key)
+
+            # Unchanged objects are carried over without reprocessing
+            if (previous is not None
+                    and previous['etag'] == obj.get('ETag')
+                    and previous['last_modified'] == obj.get('LastModified')):
+                objects[key] = previous
+                continue
+
+            objects[key] = self._process_object(obj)
+            if objects[key]['ref']:
+                changed_refs.add(objects[key]['ref'])
+                new_records.append(objects[key])
+
+        # Each new or changed object is probed once, concurrently
+        self._probe_objects(new_records)
+
+        # Deleted objects affect their reference too
+        for key in self._objects.keys() - objects.keys():
+            if self._objects[key]['ref']:
+                changed_refs.add(self._objects[key]['ref'])
+
+        # Start from scratch if the previous snapshot was a local fallback
+        videos = dict(self._videos) if self._listed else {}
+
+        if changed_refs:
+            logger.info(f"S3 catalog changes for {len(changed_refs)} reference(s)")
+
+        # Group candidate objects of the changed references in one pass
+        candidates = {ref: [] for ref in changed_refs}
+        for obj in objects.values():
+            if obj['ref'] in candidates:
+                candidates[obj['ref']].append(obj)
+
+        selected_keys = dict(self._selected_keys)
+        for ref, ref_objects in candidates.items():
+            selected = select_preferred_object(ref_objects)
+            if selected:
+                videos[ref] = selected['url']
+                selected_keys[ref] = selected['key']
+            else:
+                videos.pop(ref, None)
+                selected_keys.pop(ref, None)
+            if self._presigner is not None:
+                self._presigner.invalidate(ref)
+
+        # Swap the new listing in only once it is complete
+        self._objects = objects
+        self._selected_keys = selected_keys
+        self._listed = True
+        self._fetch_metadata()
+
+        if not videos:
+            logger.warning("No videos found in S3 bucket with the expected naming convention")
+        return videos
+
+    def _load_manifest(self):
+        """Take the objects to serve from the manifest instead of a listing"""
+        objects = {}
+        selected_keys = {}
+        for ref, entry in self.manifest.available().items():
+            objects[entry['key']] = {
+                'key': entry['key'],
+                'ref': ref,
+                'ext': '.' + entry['format'],
+                'etag': entry.get('etag'),
+                'last_modified': None,
+                'size': entry['size'],
+                'url': entry['url'],
+                'media': entry.get('media'),
+            }
+            selected_keys[ref] = entry['key']
+
+        self._objects = objects
+        self._selected_keys = selected_keys
+        self._listed = True
+        return {ref: objects[key]['url'] for ref, key in selected_keys.items()}
+
+    def _fetch_metadata(self):
+        """HEAD the served objects that are new or changed since the last refresh"""
+        if not self._metadata_workers:
+            return
+        if self._metadata_cache is None:
+            from s3_metadata import ObjectMetadataCache
+            self._metadata_cache = ObjectMetadataCache(
+                self.client,
+                self.bucket,
+                workers=self._metadata_workers,
+                attempts=self._metadata_attempts
+            )
+        self._metadata = self._metadata_cache.fetch([
+            # Metadata-only updates (copy with REPLACE) keep the ETag but not LastModified
+            (key, (self._objects[key]['etag'], self._objects[key]['last_modified']))
+            for key in self._selected_keys.values()
+        ])
+
+    def _publish(self, videos):
+        titles = MappingProxyType({
+            ref: self._metadata[key]['title']
+            for ref, key in self._selected_keys.items()
+            if key in self._metadata and self._metadata[key]['title']
+        })
+        version = self.version
+        super()._publish(videos)
+        # A retitled object keeps its URL, but anything built from the
+        # titles (such as the sequence index) still needs a new version
+        if titles != self._titles:
+            self._titles = titles
+            if self.version == version:
+                self.version += 1
+
+    def _process_object(self, obj):
+        """Turn an S3 object summary into a catalog record"""
+        key = obj['Key']
+        parsed = parse_video_filename(key)
+        ref, ext = parsed if parsed else (None, None)
+
+        return {
+            'key': key,
+            'ref': ref,
+            'ext': ext,
+            'etag': obj.get('ETag'),
+            'last_modified': obj.get('LastModified'),
+            'size': obj.get('Size'),
+            'url': build_s3_url(self.bucket, self.region, key, self.endpoint_url) if ref else None,
+            # Filled in by _probe_objects
+            'media': None
+        }
+
+    def _probe_objects(self, records):
+        """Read the MP4 headers of new records with up to metadata_workers ranged GETs at once"""
+        if not self.probe_media or not records:
+            return
+        workers = min(max(self._metadata_workers, 1), len(records))
+        with metrics.span('s3_media_probe'):
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='s3-probe') as executor:
+                media = list(executor.map(lambda r: self._probe_object(r['key'], r['size']), records))
+        for record, info in zip(records, media):
+            record['media'] = info
+
+    def _probe_object(self, key, size):
+        if not self.probe_media or not size:
+            return None
+        try:
+            info = probe_s3_object(self.client, self.bucket, key, size)
+        except Exception as e:
+            logger.warning(f"Could not read MP4 headers of {key}: {str(e)}")
+            return None
+
+        if not info['valid']:
+            logger.warning(f"{key} is not a valid MP4/MOV file")
+        elif not info['faststart']:
+            logger.warning(f"{key} is not faststart; playback waits for the whole download")
+        return info
+
+    #--------------------------------------------------------------------------
+    # URL resolution
+    #--------------------------------------------------------------------------
+    def get(self, ref, default=None):
+        """
+        Look up the URL for a single video reference
+
+        When presigning is enabled the URL comes from the presigned URL cache,
+        so the same URL is returned until shortly before it expires. With a
+        disk cache, cached objects are served by the local video server and
+        misses keep using S3 while the object is fetched in the background.
+        """
+        url = self.videos().get(ref)
+        if url is None:
+            return default
+
+        key = self._selected_keys.get(ref)
+        if self._disk_cache is not None and key is not None:
+            obj = self._objects.get(key)
+            path = self._disk_cache.get(key, obj['etag'], obj['size']) if obj else None
+            if path is not None:
+                return self._video_server.url_for(path)
+
+        if not self._presign_expires or key is None:
+            return url
+        return self.presigner.get(ref, key)
+
+    def titles(self):
+        """Return titles set as x-amz-meta-title on the served objects"""
+        self.videos()
+        return self._titles
+
+    def object_metadata(self, ref):
+        """Return the HEAD metadata (size, content_type, title, metadata) of a reference, if fetched"""
+        self.videos()
+        key = self._selected_keys.get(ref)
+        return self._metadata.get(key) if key else None
+
+    def content_version(self, ref):
+        """Return the served object's SHA-256 from the manifest, or else its ETag"""
+        self.videos()
+        key = self._selected_keys.get(ref)
+        if key is None:
+            return None
+        if self.manifest is not None and (self.manifest.videos.get(ref) or {}).get('sha256'):
+            return self.manifest.videos[ref]['sha256']
+        obj = self._objects.get(key)
+        return obj['etag'].strip('"') if obj and obj['etag'] else None
+
+    def media_info(self, ref):
+        """Return the MP4 header details of the object served for a reference"""
+        self.videos()
+        key = self._selected_keys.get(ref)
+        obj = self._objects.get(key) if key else None
+        return obj['media'] if obj else None
+
+    def cache_on_disk(self, disk_cache, video_server):
+        """
+        Serve objects from a DiskCache through a video server rooted at its directory
+
+        Args:
+            disk_cache: DiskCache filled from this catalog's bucket
+            video_server: VideoServer serving disk_cache.cache_dir
+        """
+        self._disk_cache = disk_cache
+        self._video_server = video_server
+        # Players keep URLs of files that are evicted later; send them to S3
+        video_server.fallback = self._url_for_cache_file
+
+    def _url_for_cache_file(self, name):
+        """Return the S3 URL of the object a disk cache file (possibly evicted) was named after"""
+        self.videos()
+        version, names = self._cache_names
+        if version != self.version:
+            names = {
+                self._disk_cache.filename_for(key, obj['etag']): key
+                for key, obj in self._objects.items()
+            }
+            self._cache_names = (self.version, names)
+        key = names.get(name)
+        obj = self._objects.get(key) if key else None
+        if obj is None or not obj['ref']:
+            return None
+        if self._presign_expires:
+            return self.presigner.get(obj['ref'], key)
+        return obj['url']
+
+    def preload(self, ref):
+        """Download an object into the disk cache (if any) and read it into the page cache"""
+        self.videos()
+        key = self._selected_keys.get(ref)
+        obj = self._objects.get(key) if key else None
+        if self._disk_cache is None or obj is None:
+            return False
+        path = self._disk_cache.fetch(key, obj['etag'], obj['size'])
+        if path is None:
+            return False
+        read_into_page_cache(path)
+        return True
+
+    @property
+    def presigner(self):
+        if self._presigner is None:
+            from presign import PresignedUrlCache
+            self._presigner = PresignedUrlCache(
+                self.client,
+                self.bucket,
+                expires_in=self._presign_expires,
+                renew_before=self._presign_renew_before
+            )
+        return self._presigner
+
+    #--------------------------------------------------------------------------
+    # Background refresh
+    #--------------------------------------------------------------------------
+    def start_background_refresh(self):
+        """Start the thread that re-lists the bucket on an interval"""
+        if self._refresh_thread is not None or not self.refresh_interval:
+            return
+        self._stop_event.clear()
+        self._refresh_thread = threading.Thread(
+            target=self._refresh_loop,
+            name='s3-catalog-refresh',
+            daemon=True
+        )
+        self._refresh_thread.start()
+
+    def stop_background_refresh(self):
+        """Stop the background refresh thread"""
+        self._stop_event.set()
+        self._refresh_thread = None
+
+    def _refresh_loop(self):
+        while not self._stop_event.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Background S3 catalog refresh failed: {str(e)}")
+
+#------------------------------------------------------------------------------
+# FACTORY
+#------------------------------------------------------------------------------
+def create_s3_catalog(config=None, manifest=None):
+    """Create an S3 catalog from the application configuration"""
+    config = config or get_config()
+    refresh_interval = config["S3_REFRESH_SECONDS"]
+
+    catalog = S3VideoCatalog(
+        bucket=config["S3_BUCKET_NAME"],
+        prefix=config["S3_PREFIX"],
+        region=config["AWS_REGION"],
+        endpoint_url=config["S3_ENDPOINT_URL"] or None,
+        # With a background refresher, reruns never need to block on S3
+        ttl=0 if refresh_interval else config["CATALOG_TTL_SECONDS"],
+        refresh_interval=refresh_interval,
+        presign_expires=config["S3_PRESIGN_EXPIRES_SECONDS"] if config["S3_PRESIGN_URLS"] else 0,
+        presign_renew_before=config["S3_PRESIGN_RENEW_SECONDS"],
+        probe_media=config["PROBE_MEDIA"],
+        manifest=manifest,
+        metadata_workers=config["S3_METADATA_WORKERS"],
+        metadata_attempts=config["S3_METADATA_ATTEMPTS"]
+    )
+    # A manifest is fixed at deploy time, so there is nothing to re-list
+    if manifest is None:
+        catalog.start_background_refresh()
+
+    if config["S3_DISK_CACHE_DIR"]:
+        from disk_cache import DiskCache
+        from video_server import start_video_server
+
+        disk_cache = DiskCache(
+            config["S3_DISK_CACHE_DIR"],
+            max_bytes=config["S3_DISK_CACHE_MAX_MB"] * 1024 * 1024,
+            client=catalog.client,
+            bucket=catalog.bucket,
+            fetch_workers=config["S3_DISK_CACHE_WORKERS"]
+        )
+        catalog.cache_on_disk(disk_cache, start_video_server(
+            disk_cache.cache_dir,
+            host=config["VIDEO_SERVER_HOST"],
+            port=config["VIDEO_SERVER_PORT"],
+            public_url=config["VIDEO_SERVER_PUBLIC_URL"] or None
+        ))
+    return catalog
@@ -0,0 +1,148 @@
+import time
+import random
+import logging
+import threading
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# S3 REQUESTS WITH RETRY
+#==============================================================================
+# Error codes worth another attempt; anything else fails immediately
+RETRYABLE_ERROR_CODES = {
+    'SlowDown', 'Throttling', 'ThrottlingException', 'RequestTimeout',
+    'InternalError', 'ServiceUnavailable', '500', '502', '503', '504',
+}
+
+# User metadata key (x-amz-meta-title) holding a video's display title
+TITLE_METADATA_KEY = 'title'
+
+def call_with_retry(operation, attempts=3, backoff=0.5, **kwargs):
+    """
+    Call an S3 client method, retrying throttling, server and connection
+    errors with backoff; other errors are raised immediately
+    """
+    from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+
+    for attempt in range(attempts):
+        try:
+            return operation(**kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code', '')
+            if code not in RETRYABLE_ERROR_CODES or attempt == attempts - 1:
+                raise
+        except BotoConnectionError:
+            if attempt == attempts - 1:
+                raise
+        # Exponential backoff with jitter so parallel workers do not retry in step
+        time.sleep(backoff * (2 ** attempt) * (0.5 + random.random()))
+
+def head_object_with_retry(client, bucket, key, attempts=3, backoff=0.5):
+    """
+    HEAD an object, retrying throttling and server errors with backoff
+
+    Returns:
+        The head_object response, or None if the object no longer exists
+    """
+    from botocore.exceptions import ClientError
+
+    try:
+        return call_with_retry(client.head_object, attempts, backoff, Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code', '') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+#==============================================================================
+# OBJECT METADATA CACHE
+#==============================================================================
+class ObjectMetadataCache:
+    """
+    Object metadata from concurrent HEAD requests, cached by object version
+
+    A refresh only sends HEAD requests for objects that are new or whose
+    version (ETag and LastModified from the listing) changed, spread over a
+    bounded thread pool, so re-listing a large library costs a handful of
+    requests instead of one per object.
+    """
+
+    def __init__(self, client, bucket, workers=16, attempts=3, backoff=0.5):
+        """
+        Args:
+            client: S3 client used for HEAD requests
+            bucket: S3 bucket name
+            workers: HEAD requests running at the same time
+            attempts: Tries per object before giving up
+            backoff: Initial delay between tries in seconds
+        """
+        self.client = client
+        self.bucket = bucket
+        self.workers = workers
+        self.attempts = attempts
+        self.backoff = backoff
+        self._entries = {}  # key -> (version, metadata)
+        self._lock = threading.Lock()
+
+    def fetch(self, objects):
+        """
+        Return {key: metadata} for (key, version) pairs, fetching what is not cached
+
+        Metadata is a read-only mapping with size, content_type, title and
+        the raw user metadata. Objects whose HEAD request failed are left
+        out and tried again on the next call.
+        """
+        results = {}
+        missing = []
+        for key, version in objects:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                results[key] = cached[1]
+            else:
+                missing.append((key, version))
+
+        metrics.inc('cache_hits_total', amount=len(results), cache='s3_metadata')
+        if not missing:
+            return results
+        metrics.inc('cache_misses_total', amount=len(missing), cache='s3_metadata')
+
+        with metrics.span('s3_metadata_fetch'):
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(missing))) as executor:
+                fetched = list(executor.map(self._fetch_one, missing))
+
+        with self._lock:
+            for (key, version), metadata in zip(missing, fetched):
+                if metadata is not None:
+                    self._entries[key] = (version, metadata)
+                    results[key] = metadata
+            # Forget objects that are no longer listed
+            listed = {key for key, _ in objects}
+            for key in self._entries.keys() - listed:
+                del self._entries[key]
+
+        logger.info(f"Fetched metadata of {len(missing)} S3 object(s)")
+        return results
+
+    def _fetch_one(self, item):
+        key, _ = item
+        try:
+            head = head_object_with_retry(self.client, self.bucket, key, self.attempts, self.backoff)
+        except Exception as e:
+            logger.warning(f"Could not fetch metadata of {key}: {str(e)}")
+            return None
+        if head is None:
+            return None
+
+        user_metadata = head.get('Metadata', {})
+        return MappingProxyType({
+            'size': head.get('ContentLength'),
+            'content_type': head.get('ContentType'),
+            'title': user_metadata.get(TITLE_METADATA_KEY),
+            'metadata': MappingProxyType(dict(user_metadata)),
+        })
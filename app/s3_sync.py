@@ -0,0 +1,455 @@
+import os
+import sys
+import json
+import math
+import hashlib
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from config import get_config
+from manifest import S3_HASH_METADATA_KEY
+from s3_catalog import get_s3_client, iter_s3_objects, select_preferred_object
+from s3_metadata import call_with_retry, head_object_with_retry
+from utils import get_local_video_dir, parse_video_filename
+from video_server import SERVED_EXTENSIONS
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SYNC SETTINGS
+#==============================================================================
+# Files at least this large are sent as concurrent multipart uploads
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+# S3 limits: every part but the last is at least 5 MiB, at most 10,000 parts
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PARTS = 10000
+
+# Local file hashes and unfinished multipart uploads, kept between runs
+STATE_FILENAME = '.s3_sync_state.json'
+
+# Objects removed per DeleteObjects request (the API maximum)
+DELETE_BATCH = 1000
+
+#==============================================================================
+# SYNC STATE
+#==============================================================================
+class SyncState:
+    """
+    Hashes of local files and multipart uploads that have not completed
+
+    Hashes are reused while a file's size and modification time are
+    unchanged, so a re-run only reads files that changed. Upload IDs are
+    saved as soon as an upload starts, so an interrupted upload resumes
+    with the parts S3 already has.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}   # filename -> [size, mtime_ns, sha256, md5]
+        self.uploads = {}  # key -> {"upload_id", "sha256", "part_size"}
+        if path and os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.hashes = data.get('hashes', {})
+                self.uploads = data.get('uploads', {})
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable sync state {path}: {str(e)}")
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'hashes': self.hashes, 'uploads': self.uploads}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+#==============================================================================
+# CONTENT HASHES
+#==============================================================================
+def hash_file(path, chunk_size=1024 * 1024):
+    """Return the (SHA-256, MD5) hex digests of a file, read once"""
+    sha256, md5 = hashlib.sha256(), hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+def multipart_etag(path, part_size):
+    """Return the ETag S3 gives a multipart upload of a file in parts of part_size"""
+    digests = []
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(part_size), b''):
+            digests.append(hashlib.md5(chunk).digest())
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+def part_size_for(size, part_size):
+    """Grow the part size when a file would need more than MAX_PARTS parts"""
+    return max(part_size, MIN_PART_SIZE, math.ceil(size / MAX_PARTS))
+
+def _same_content(local, listed, head, part_size):
+    """Whether a bucket object already holds a local file's content"""
+    if listed['Size'] != local['size']:
+        return False
+    # Objects uploaded by this tool carry their SHA-256
+    sha256 = (head or {}).get('Metadata', {}).get(S3_HASH_METADATA_KEY)
+    if sha256:
+        return sha256 == local['sha256']
+
+    # Otherwise the ETag: the MD5 of single-part uploads, and the MD5 of
+    # the part MD5s for multipart uploads (tried with the likely part sizes)
+    etag = listed.get('ETag', '').strip('"')
+    if '-' not in etag:
+        return etag == local['md5']
+    parts = int(etag.split('-')[1])
+    candidates = {part_size_for(local['size'], part_size)}
+    mib = 1024 * 1024
+    candidates.add(math.ceil(local['size'] / parts / mib) * mib)
+    return any(multipart_etag(local['path'], size) == etag for size in candidates)
+
+#==============================================================================
+# SYNC PLAN
+#==============================================================================
+def _by_ref(names):
+    grouped = {}
+    for name in names:
+        parsed = parse_video_filename(name)
+        if parsed:
+            grouped.setdefault(parsed[0], []).append({'key': name, 'ext': parsed[1]})
+    return grouped
+
+def plan_sync(client, bucket, prefix, video_dir, state, workers=8, part_size=DEFAULT_PART_SIZE,
+              delete_missing=False, keep_alternates=False):
+    """
+    Compare the local videos with the bucket
+
+    Each reference's preferred local file (MP4 over MOV, as the catalogs
+    choose) is uploaded unless the object under the same key has the same
+    content. Other formats of a synced reference in the bucket are deleted
+    unless keep_alternates; references missing locally only with
+    delete_missing.
+
+    Returns:
+        Dictionary with the uploads to make, the keys that are up to date
+        and the keys to delete
+    """
+    local = {}
+    for ref, candidates in _by_ref(os.listdir(video_dir)).items():
+        filename = select_preferred_object(candidates)['key']
+        path = os.path.join(video_dir, filename)
+        stat = os.stat(path)
+        local[ref] = {'path': path, 'filename': filename, 'key': prefix + filename,
+                      'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    # Only objects directly under the prefix (not HLS packages and the like)
+    listed = {
+        obj['Key']: obj for obj in iter_s3_objects(client, bucket, prefix)
+        if '/' not in obj['Key'][len(prefix):]
+    }
+    remote = _by_ref(listed)
+
+    def describe(item):
+        cached = state.hashes.get(item['filename'])
+        if cached and cached[0] == item['size'] and cached[1] == item['mtime_ns']:
+            item['sha256'], item['md5'] = cached[2], cached[3]
+        else:
+            item['sha256'], item['md5'] = hash_file(item['path'])
+
+        obj = listed.get(item['key'])
+        head = None
+        if obj is not None and obj['Size'] == item['size']:
+            head = head_object_with_retry(client, bucket, item['key'])
+        item['up_to_date'] = obj is not None and _same_content(item, obj, head, part_size)
+        item['reason'] = 'changed' if obj is not None else 'new'
+        return item
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        described = list(executor.map(describe, local.values()))
+
+    state.hashes = {
+        item['filename']: [item['size'], item['mtime_ns'], item['sha256'], item['md5']]
+        for item in described
+    }
+
+    deletes = []
+    for ref, candidates in remote.items():
+        if ref in local:
+            if not keep_alternates:
+                deletes.extend(c['key'] for c in candidates if c['key'] != local[ref]['key'])
+        elif delete_missing:
+            deletes.extend(c['key'] for c in candidates)
+
+    return {
+        'uploads': sorted((item for item in described if not item['up_to_date']), key=lambda item: item['key']),
+        'up_to_date': sorted(item['key'] for item in described if item['up_to_date']),
+        'deletes': sorted(deletes),
+    }
+
+#==============================================================================
+# UPLOADS
+#==============================================================================
+class Uploader:
+    """
+    Upload files to S3 over a bounded pool of worker threads
+
+    Small files are single PUTs; larger ones are multipart uploads whose
+    parts are spread over the same pool, so at most `workers` requests (and
+    part buffers) are in flight. Every request is retried with backoff, and
+    a multipart upload left unfinished is resumed on the next run.
+    """
+
+    def __init__(self, client, bucket, state, workers=8, part_size=DEFAULT_PART_SIZE, attempts=5, backoff=0.5):
+        self.client = client
+        self.bucket = bucket
+        self.state = state
+        self.workers = workers
+        self.part_size = part_size
+        self.attempts = attempts
+        self.backoff = backoff
+
+    def upload_all(self, items):
+        """
+        Upload every item, returning (uploaded keys, {failed key: error})
+
+        A failed file does not stop the others.
+        """
+        uploaded, failed = [], {}
+        jobs = []
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for item in items:
+                try:
+                    jobs.append((item, *self._submit(pool, item)))
+                except Exception as e:
+                    failed[item['key']] = str(e)
+
+            for item, upload_id, parts, futures in jobs:
+                try:
+                    for number, future in futures.items():
+                        parts[number] = future.result()
+                    if upload_id is not None:
+                        self._complete(item, upload_id, parts)
+                    uploaded.append(item['key'])
+                    logger.info(f"Uploaded {item['key']} ({item['size']} bytes)")
+                except Exception as e:
+                    failed[item['key']] = str(e)
+                    logger.error(f"Could not upload {item['key']}: {str(e)}")
+        return uploaded, failed
+
+    def _submit(self, pool, item):
+        if item['size'] < self.part_size:
+            return None, {}, {0: pool.submit(self._put, item)}
+
+        part_size = part_size_for(item['size'], self.part_size)
+        upload_id, parts = self._start_multipart(item, part_size)
+        count = max(1, math.ceil(item['size'] / part_size))
+        futures = {
+            number: pool.submit(self._upload_part, item, upload_id, number, part_size)
+            for number in range(1, count + 1)
+            if number not in parts
+        }
+        return upload_id, parts, futures
+
+    def abort_stale(self, items):
+        """Abort saved multipart uploads that uploading items will not resume"""
+        # Their parts stay in the bucket (and are billed) until aborted
+        resumable = {item['key'] for item in items if item['size'] >= self.part_size}
+        stale = [key for key in self.state.uploads if key not in resumable]
+        for key in stale:
+            logger.info(f"Aborting the unfinished upload of {key}")
+            self._abort(key, self.state.uploads[key]['upload_id'])
+        if stale:
+            self.state.save()
+        return stale
+
+    def _put(self, item):
+        with open(item['path'], 'rb') as f:
+            data = f.read()
+        call_with_retry(
+            self.client.put_object, self.attempts, self.backoff,
+            Bucket=self.bucket, Key=item['key'], Body=data, **self._object_args(item)
+        )
+
+    def _object_args(self, item):
+        ext = os.path.splitext(item['key'])[1].lower()
+        return {
+            'ContentType': SERVED_EXTENSIONS.get(ext, 'application/octet-stream'),
+            'Metadata': {S3_HASH_METADATA_KEY: item['sha256']},
+        }
+
+    #--------------------------------------------------------------------------
+    # Multipart uploads
+    #--------------------------------------------------------------------------
+    def _start_multipart(self, item, part_size):
+        """Return (upload ID, {part number: ETag} already uploaded)"""
+        saved = self.state.uploads.get(item['key'])
+        if saved and saved['sha256'] == item['sha256'] and saved['part_size'] == part_size:
+            parts = self._uploaded_parts(item['key'], saved['upload_id'], item['size'], part_size)
+            if parts is not None:
+                logger.info(f"Resuming upload of {item['key']} ({len(parts)} parts already uploaded)")
+                return saved['upload_id'], parts
+        elif saved:
+            # The file changed since the upload started
+            self._abort(item['key'], saved['upload_id'])
+
+        response = call_with_retry(
+            self.client.create_multipart_upload, self.attempts, self.backoff,
+            Bucket=self.bucket, Key=item['key'], **self._object_args(item)
+        )
+        self.state.uploads[item['key']] = {
+            'upload_id': response['UploadId'], 'sha256': item['sha256'], 'part_size': part_size,
+        }
+        self.state.save()
+        return response['UploadId'], {}
+
+    def _uploaded_parts(self, key, upload_id, size, part_size):
+        from botocore.exceptions import ClientError
+
+        parts = {}
+        try:
+            paginator = self.client.get_paginator('list_parts')
+            for page in paginator.paginate(Bucket=self.bucket, Key=key, UploadId=upload_id):
+                for part in page.get('Parts', []):
+                    # Only complete parts of the expected size count
+                    expected = min(part_size, size - (part['PartNumber'] - 1) * part_size)
+                    if part['Size'] == expected:
+                        parts[part['PartNumber']] = part['ETag']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                return None
+            raise
+        return parts
+
+    def _upload_part(self, item, upload_id, number, part_size):
+        with open(item['path'], 'rb') as f:
+            f.seek((number - 1) * part_size)
+            data = f.read(part_size)
+        response = call_with_retry(
+            self.client.upload_part, self.attempts, self.backoff,
+            Bucket=self.bucket, Key=item['key'], UploadId=upload_id, PartNumber=number, Body=data
+        )
+        return response['ETag']
+
+    def _complete(self, item, upload_id, parts):
+        call_with_retry(
+            self.client.complete_multipart_upload, self.attempts, self.backoff,
+            Bucket=self.bucket, Key=item['key'], UploadId=upload_id,
+            MultipartUpload={'Parts': [
+                {'PartNumber': number, 'ETag': etag} for number, etag in sorted(parts.items())
+            ]}
+        )
+        del self.state.uploads[item['key']]
+        self.state.save()
+
+    def _abort(self, key, upload_id):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+        except ClientError as e:
+            logger.warning(f"Could not abort the previous upload of {key}: {str(e)}")
+        del self.state.uploads[key]
+
+#==============================================================================
+# SYNC
+#==============================================================================
+def delete_objects(client, bucket, keys, attempts=5):
+    """Delete keys in batches, returning {key: error} for objects that failed"""
+    failed = {}
+    for i in range(0, len(keys), DELETE_BATCH):
+        batch = keys[i:i + DELETE_BATCH]
+        response = call_with_retry(
+            client.delete_objects, attempts,
+            Bucket=bucket, Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        for error in response.get('Errors', []):
+            failed[error['Key']] = error.get('Message', error.get('Code'))
+    return failed
+
+def sync_videos(video_dir=None, bucket=None, prefix=None, client=None, state_path=None, workers=8,
+                part_size=DEFAULT_PART_SIZE, attempts=5, delete_missing=False, keep_alternates=False,
+                dry_run=False):
+    """
+    Push local video_<ref> files to the bucket, uploading only what changed
+
+    Returns:
+        Dictionary with the uploaded, up-to-date, deleted and failed keys,
+        and the keys whose unfinished multipart upload was aborted
+    """
+    config = get_config()
+    video_dir = video_dir or get_local_video_dir()
+    bucket = bucket or config["S3_BUCKET_NAME"]
+    prefix = config["S3_PREFIX"] if prefix is None else prefix
+    client = client or get_s3_client(config["AWS_REGION"], config["S3_ENDPOINT_URL"] or None)
+    state = SyncState(os.path.join(video_dir, STATE_FILENAME) if state_path is None else state_path)
+
+    plan = plan_sync(client, bucket, prefix, video_dir, state, workers, part_size,
+                     delete_missing, keep_alternates)
+    result = {
+        'uploaded': [], 'up_to_date': plan['up_to_date'], 'deleted': [], 'failed': {}, 'aborted': [],
+        'planned_uploads': [(item['key'], item['reason'], item['size']) for item in plan['uploads']],
+        'planned_deletes': plan['deletes'],
+    }
+    if dry_run:
+        return result
+
+    uploader = Uploader(client, bucket, state, workers, part_size, attempts)
+    result['aborted'] = uploader.abort_stale(plan['uploads'])
+    result['uploaded'], result['failed'] = uploader.upload_all(plan['uploads'])
+    state.save()
+
+    # Other formats of a reference whose upload failed are kept for now
+    failed_refs = {parse_video_filename(key)[0] for key in result['failed']}
+    deletes = [key for key in plan['deletes'] if parse_video_filename(key)[0] not in failed_refs]
+    if deletes:
+        failed_deletes = delete_objects(client, bucket, deletes, attempts)
+        result['failed'].update(failed_deletes)
+        result['deleted'] = [key for key in deletes if key not in failed_deletes]
+        for key in result['deleted']:
+            logger.info(f"Deleted {key}")
+    return result
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Upload changed local videos to the S3 bucket")
+    parser.add_argument('--video-dir', help="Directory holding video_<ref> files (default: app/static/videos)")
+    parser.add_argument('--bucket', default=config["S3_BUCKET_NAME"], help="Bucket (default: S3_BUCKET_NAME)")
+    parser.add_argument('--prefix', default=config["S3_PREFIX"], help="Key prefix (default: S3_PREFIX)")
+    parser.add_argument('--workers', type=int, default=8, help="Concurrent requests (hashes, HEADs, parts)")
+    parser.add_argument('--part-size-mb', type=int, default=DEFAULT_PART_SIZE // (1024 * 1024),
+                        help="Multipart part size; smaller files are single uploads")
+    parser.add_argument('--attempts', type=int, default=5, help="Tries per request before giving up")
+    parser.add_argument('--state', help=f"Sync state file (default: {STATE_FILENAME} in the video directory)")
+    parser.add_argument('--delete-missing', action='store_true', help="Delete objects of references missing locally")
+    parser.add_argument('--keep-alternates', action='store_true',
+                        help="Keep other formats (e.g. .mov next to .mp4) of synced references")
+    parser.add_argument('--dry-run', action='store_true', help="Only report what would change")
+    args = parser.parse_args()
+
+    result = sync_videos(
+        video_dir=args.video_dir, bucket=args.bucket, prefix=args.prefix, state_path=args.state,
+        workers=args.workers, part_size=args.part_size_mb * 1024 * 1024, attempts=args.attempts,
+        delete_missing=args.delete_missing, keep_alternates=args.keep_alternates, dry_run=args.dry_run
+    )
+
+    if args.dry_run:
+        for key, reason, size in result['planned_uploads']:
+            print(f"upload  {key} ({reason}, {size} bytes)")
+        for key in result['planned_deletes']:
+            print(f"delete  {key}")
+        print(f"{len(result['up_to_date'])} up to date, {len(result['planned_uploads'])} to upload, "
+              f"{len(result['planned_deletes'])} to delete")
+        sys.exit(0)
+
+    for key, error in sorted(result['failed'].items()):
+        print(f"failed  {key}: {error}")
+    print(f"{len(result['uploaded'])} uploaded, {len(result['up_to_date'])} up to date, "
+          f"{len(result['deleted'])} deleted, {len(result['failed'])} failed")
+    sys.exit(0 if not result['failed'] else 1)
@@ -0,0 +1,316 @@
+import os
+import re
+import math
+import logging
+import threading
+from bisect import bisect_left
+from collections import Counter, namedtuple
+
+import metrics
+from catalog import get_catalog
+from decision_tree import get_decision_tree, path_slug
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SEARCH SETTINGS
+#==============================================================================
+# BM25 term frequency saturation and document length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Each occurrence in a field counts this many times towards a term's frequency
+FIELD_WEIGHTS = {'title': 3, 'label': 2, 'transcript': 1}
+
+# Terms the last (still being typed) query word may expand to
+MAX_PREFIX_TERMS = 20
+
+STOPWORDS = frozenset(
+    'a an and are as at be by for from how in is it of on or that the this to with'.split()
+)
+
+# A search result: where the video sits in its best path, and where in the
+# video the matching transcript cue starts (None for title/label matches)
+SearchHit = namedtuple('SearchHit', ['ref', 'title', 'score', 'path', 'position', 'start_time', 'snippet'])
+
+#==============================================================================
+# TEXT PROCESSING
+#==============================================================================
+_WORD = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    """Split text into lowercase terms, dropping stopwords and plural 's'"""
+    terms = []
+    for word in _WORD.findall(text.lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+_TIMESTAMP = re.compile(r"(?:(\d+):)?(\d{1,2}):(\d{2})[.,](\d{3})")
+_TAG = re.compile(r"<[^>]*>")
+
+def parse_vtt(text):
+    """
+    Return the (start seconds, text) cues of a WebVTT file
+
+    Cue identifiers, settings, NOTE/STYLE blocks and markup tags are dropped.
+    """
+    cues = []
+    for block in re.split(r"\n\s*\n", text.replace('\r\n', '\n').replace('\r', '\n')):
+        lines = block.strip().split('\n')
+        for i, line in enumerate(lines):
+            if '-->' not in line:
+                continue
+            match = _TIMESTAMP.search(line.split('-->')[0])
+            if match:
+                hours, minutes, seconds, millis = match.groups()
+                start = int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+                cue_text = ' '.join(_TAG.sub('', cue_line).strip() for cue_line in lines[i + 1:])
+                if cue_text.strip():
+                    cues.append((start, cue_text.strip()))
+            break
+    return cues
+
+#==============================================================================
+# SEARCH INDEX
+#==============================================================================
+# What was indexed for one video: the inputs it was built from (to detect
+# changes), its weighted length and term frequencies, and its transcript cues
+_Document = namedtuple('_Document', ['signature', 'length', 'terms', 'cues'])
+
+# Everything a query reads, published together: documents by ref, posting
+# lists (term -> {ref: weighted term frequency}), sorted terms for prefix
+# matching and the summed document length
+_Snapshot = namedtuple('_Snapshot', ['documents', 'postings', 'terms', 'total_length'])
+
+class SearchIndex:
+    """
+    BM25 inverted index over video titles, tree labels and transcripts
+
+    Every video of the decision tree is one document. The index is built
+    when first used and updated per video when the catalog changes: only
+    videos whose title, labels or transcript file changed are re-indexed.
+    An update builds a new snapshot of the documents, posting lists,
+    terms and lengths and publishes it with one assignment, so searches
+    never wait for an update and never mix two versions of the index.
+    """
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.catalog_version = None
+        self._transcripts = None
+        self._snapshot = _Snapshot({}, {}, [], 0)
+
+        # Text of the tree that mentions each video
+        self._labels = {}
+        for step in tree.steps.values():
+            for option in step.options:
+                if option.video_ref:
+                    self._labels.setdefault(option.video_ref, []).extend([option.label, step.header])
+
+        # Every (path, position) a video is shown at
+        self._placements = {}
+        for path, refs in sorted(tree.sequences.items(), key=lambda item: (len(item[0]), item[0])):
+            for position, ref in enumerate(refs):
+                self._placements.setdefault(ref, []).append((path, position))
+
+    #--------------------------------------------------------------------------
+    # Updates
+    #--------------------------------------------------------------------------
+    def is_current(self, catalog):
+        """Whether the catalog and its transcripts are unchanged since the last update"""
+        return self.catalog_version == catalog.version and self._transcripts is catalog.transcripts()
+
+    def update(self, catalog):
+        """Re-index the videos whose title, labels or transcript changed (one writer at a time)"""
+        version, transcripts = catalog.version, catalog.transcripts()
+        titles = catalog.titles()
+        refs = set(self._placements) | set(self.tree.titles)
+
+        # Searches keep reading the current snapshot until the new one is
+        # complete; posting lists are replaced, never mutated, so shallow
+        # copies of the maps are enough
+        current = self._snapshot
+        documents, postings = dict(current.documents), dict(current.postings)
+        total_length = current.total_length
+        changed = 0
+        for ref in refs:
+            title = titles.get(ref) or self.tree.title_for(ref)
+            signature = (title, tuple(self._labels.get(ref, ())), _file_stamp(transcripts.get(ref)))
+            document = documents.get(ref)
+            if document is None or document.signature != signature:
+                document = self._build_document(signature, transcripts.get(ref))
+                total_length += _put_document(documents, postings, ref, document)
+                changed += 1
+        for ref in set(documents) - refs:
+            total_length += _put_document(documents, postings, ref, None)
+            changed += 1
+
+        if changed:
+            self._snapshot = _Snapshot(documents, postings, sorted(postings), total_length)
+        self.catalog_version, self._transcripts = version, transcripts
+        logger.info(f"Search index updated ({changed} of {len(documents)} videos re-indexed)")
+
+    def _build_document(self, signature, transcript_path):
+        title, labels, _ = signature
+        terms = Counter()
+        for term in tokenize(title):
+            terms[term] += FIELD_WEIGHTS['title']
+        for label in labels:
+            for term in tokenize(label):
+                terms[term] += FIELD_WEIGHTS['label']
+
+        cues = []
+        if transcript_path:
+            try:
+                with open(transcript_path, encoding='utf-8') as f:
+                    cue_list = parse_vtt(f.read())
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"Could not read transcript {transcript_path}: {str(e)}")
+                cue_list = []
+            for start, text in cue_list:
+                cue_terms = tokenize(text)
+                for term in cue_terms:
+                    terms[term] += FIELD_WEIGHTS['transcript']
+                cues.append((start, text, frozenset(cue_terms)))
+
+        return _Document(signature, sum(terms.values()), terms, tuple(cues))
+
+    #--------------------------------------------------------------------------
+    # Queries
+    #--------------------------------------------------------------------------
+    def search(self, query, limit=5, path_counts=None):
+        """
+        Return the best matching videos for a query, best first
+
+        The last query word also matches longer terms (search as you type).
+        Each hit points at the path that shows the video (the most used one
+        in path_counts, if given) and its position in that sequence.
+        """
+        with metrics.span('search'):
+            # One snapshot for the whole query, even if an update publishes another
+            snapshot = self._snapshot
+            terms = tokenize(query)
+            if not terms or not snapshot.documents:
+                return []
+
+            weights = {term: 1.0 for term in terms[:-1]}
+            if query[-1:].isalnum():
+                for term in self._expand_prefix(snapshot, terms[-1]):
+                    weights.setdefault(term, 1.0 if term == terms[-1] else 0.5)
+            else:
+                weights[terms[-1]] = 1.0
+
+            scores = self._score(snapshot, weights)
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+            return [self._hit(ref, snapshot.documents[ref], score, set(weights), path_counts) for ref, score in ranked]
+
+    def _expand_prefix(self, snapshot, prefix):
+        terms = snapshot.terms
+        start = bisect_left(terms, prefix)
+        expanded = []
+        for term in terms[start:start + MAX_PREFIX_TERMS]:
+            if not term.startswith(prefix):
+                break
+            expanded.append(term)
+        return expanded or [prefix]
+
+    def _score(self, snapshot, weights):
+        count = len(snapshot.documents)
+        average_length = snapshot.total_length / count if count else 1
+        scores = {}
+        for term, weight in weights.items():
+            postings = snapshot.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for ref, frequency in postings.items():
+                document = snapshot.documents[ref]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * document.length / average_length)
+                scores[ref] = scores.get(ref, 0.0) + weight * idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+    def _hit(self, ref, document, score, terms, path_counts):
+        placements = self._placements.get(ref) or [(None, 0)]
+        # Most used path first; otherwise the shortest path showing the video
+        if path_counts:
+            path, position = max(placements, key=lambda item: path_counts.get(path_slug(item[0]) if item[0] else '', 0))
+        else:
+            path, position = placements[0]
+
+        # Jump to the transcript cue sharing the most query terms, if any
+        start_time, snippet = None, None
+        best = 0
+        for start, text, cue_terms in document.cues:
+            matched = len(terms & cue_terms)
+            if matched > best:
+                best, start_time, snippet = matched, start, text
+        return SearchHit(ref, document.signature[0], score, path, position, start_time, snippet)
+
+def _put_document(documents, postings, ref, document):
+    """Put a document (or None to remove it) into unpublished maps; returns the change in total length"""
+    old = documents.get(ref)
+    touched = set(old.terms) if old else set()
+    if document is not None:
+        touched |= set(document.terms)
+
+    for term in touched:
+        refs = dict(postings.get(term, {}))
+        refs.pop(ref, None)
+        if document is not None and term in document.terms:
+            refs[ref] = document.terms[term]
+        if refs:
+            postings[term] = refs
+        else:
+            postings.pop(term, None)
+
+    if document is None:
+        documents.pop(ref, None)
+    else:
+        documents[ref] = document
+    return (document.length if document else 0) - (old.length if old else 0)
+
+def _file_stamp(path):
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (path, stat.st_size, stat.st_mtime_ns)
+
+#------------------------------------------------------------------------------
+# PROCESS-WIDE INDEX ACCESS
+#------------------------------------------------------------------------------
+_index = None
+_index_lock = threading.Lock()
+
+def get_search_index():
+    """
+    Return the search index, updating it if the catalog or transcripts changed
+
+    A new decision tree gets a new index; catalog changes only re-index
+    the videos that changed. The staleness check is an identity and an
+    integer comparison.
+    """
+    global _index
+    tree = get_decision_tree()
+    catalog = get_catalog()
+
+    index = _index
+    if index is None or index.tree is not tree:
+        with _index_lock:
+            if _index is None or _index.tree is not tree:
+                _index = SearchIndex(tree)
+            index = _index
+    if not index.is_current(catalog):
+        with _index_lock:
+            if not index.is_current(catalog):
+                index.update(catalog)
+    return index
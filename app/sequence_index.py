@@ -0,0 +1,81 @@
+import logging
+import threading
+from types import MappingProxyType
+
+from catalog import get_catalog
+from decision_tree import get_decision_tree
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SEQUENCE INDEX
+#==============================================================================
+class SequenceIndex:
+    """
+    Index from every complete decision tree path to its video sequence
+
+    Each sequence is a tuple of read-only {"ref", "title"} mappings shared by
+    all sessions, so resolving the final page's playlist is one hash lookup
+    with no per-session allocation.
+    """
+
+    def __init__(self, tree, catalog):
+        self.tree = tree
+        self.catalog_version = catalog.version
+        catalog_titles = catalog.titles()
+
+        # Identical entries (e.g. the common 4.0/5.0 tail) are shared
+        entries = {}
+        def entry(ref):
+            if ref not in entries:
+                title = catalog_titles.get(ref) or tree.title_for(ref)
+                entries[ref] = MappingProxyType({"ref": ref, "title": title})
+            return entries[ref]
+
+        self._entry = entry
+        self._sequences = MappingProxyType({
+            path: tuple(entry(ref) for ref in refs)
+            for path, refs in tree.sequences.items()
+        })
+        logger.info(f"Built sequence index ({len(self._sequences)} paths, catalog version {self.catalog_version})")
+
+    def lookup(self, path):
+        """Return the shared sequence for a complete path, or None"""
+        return self._sequences.get(path)
+
+    def build(self, refs):
+        """Build a sequence for references that are not a known path"""
+        return tuple(self._entry(ref) for ref in refs)
+
+    def is_current(self, tree, catalog):
+        """Whether the index still matches the tree and catalog in use"""
+        return self.tree is tree and self.catalog_version == catalog.version
+
+#------------------------------------------------------------------------------
+# PROCESS-WIDE INDEX ACCESS
+#------------------------------------------------------------------------------
+_index = None
+_index_lock = threading.Lock()
+
+def get_sequence_index():
+    """
+    Return the sequence index, rebuilding it if the tree or catalog changed
+
+    The staleness check is an identity comparison and an integer comparison.
+    """
+    global _index
+    tree = get_decision_tree()
+    catalog = get_catalog()
+    # Load (or refresh) the snapshot first, so its version is the one indexed
+    catalog.videos()
+
+    index = _index
+    if index is None or not index.is_current(tree, catalog):
+        with _index_lock:
+            if _index is None or not _index.is_current(tree, catalog):
+                _index = SequenceIndex(tree, catalog)
+            index = _index
+    return index
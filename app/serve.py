@@ -0,0 +1,71 @@
+import sys
+import time
+import logging
+import argparse
+import threading
+import urllib.request
+
+from config import get_config
+from metrics import start_ops_server
+from warmup import APP_SCRIPT, warm_up_until_done, mark_ready, seed_script_cache
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SERVER SETTINGS
+#==============================================================================
+# Port of the ops server (/ready, /metrics) when METRICS_PORT is not set
+DEFAULT_OPS_PORT = 9102
+
+#==============================================================================
+# STARTUP
+#==============================================================================
+# Warm-up runs in the same process as Streamlit, before Streamlit opens its
+# port: the catalog, sequence index and search index it builds are the
+# process-wide singletons every session then reuses.
+def _mark_ready_when_listening(port, timeout=60):
+    """Flag the process ready once Streamlit answers its health check"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2):
+                pass
+        except OSError:
+            time.sleep(0.2)
+            continue
+        # The first session then reuses the compiled app.py
+        try:
+            seed_script_cache()
+        except Exception as e:
+            logger.warning(f"Could not pre-compile the app script: {str(e)}")
+        mark_ready()
+        return
+    logger.error(f"Streamlit did not start listening on port {port} within {timeout}s")
+
+def serve(port=8501, address='0.0.0.0', config=None):
+    """Start the ops server, warm up, then run the Streamlit app (blocks)"""
+    config = config or get_config()
+    start_ops_server(config["METRICS_HOST"], config["METRICS_PORT"] or DEFAULT_OPS_PORT)
+
+    warm_up_until_done(config)
+
+    threading.Thread(
+        target=_mark_ready_when_listening, args=(port,), name='readiness', daemon=True
+    ).start()
+
+    from streamlit.web import bootstrap
+    flag_options = {'server_port': port, 'server_address': address, 'server_headless': True}
+    bootstrap.load_config_options(flag_options=flag_options)
+    bootstrap.run(APP_SCRIPT, False, [], flag_options)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm up, then serve the app with a /ready endpoint on the ops server")
+    parser.add_argument('--port', type=int, default=8501, help="Streamlit port (default: 8501)")
+    parser.add_argument('--address', default='0.0.0.0', help="Streamlit bind address (default: 0.0.0.0)")
+    args = parser.parse_args()
+
+    serve(args.port, args.address)
+    sys.exit(0)
@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+
+from config import get_config
+from manifest import build_manifest, load_manifest, save_manifest
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SHARED CATALOG SNAPSHOT
+#==============================================================================
+# With several app replicas on one host, a single refresher discovers the
+# videos and publishes the catalog as a compiled manifest file. Replicas only
+# read that file: no replica lists the bucket, scans or watches the video
+# directory, or probes and hashes videos itself.
+#
+# The snapshot is replaced with os.replace, so readers always see either the
+# old or the new file, and stays in the page cache shared by every replica.
+
+def _snapshot_stamp(path):
+    """Identify one published snapshot file (a replacement gets a new inode)"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+#------------------------------------------------------------------------------
+# REFRESHER SIDE
+#------------------------------------------------------------------------------
+def publish_snapshot(path, config=None, workers=8):
+    """
+    Compile the configured storage into a manifest and publish it at path
+
+    The file is only replaced when the compiled version changed, so
+    replicas do not reload an identical catalog.
+
+    Returns:
+        True if a new snapshot was published
+    """
+    data = build_manifest(config, workers=workers)
+    if _snapshot_stamp(path) is not None:
+        try:
+            if load_manifest(path).version == data['version']:
+                return False
+        except (OSError, ValueError, KeyError):
+            pass
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    save_manifest(path, data)
+    logger.info(f"Published catalog snapshot {data['version']} to {path}")
+    return True
+
+def run_refresher(path, interval, config=None, workers=8, stop_event=None):
+    """Publish the catalog snapshot now and then every interval seconds"""
+    stop_event = stop_event or threading.Event()
+    while True:
+        started = time.monotonic()
+        try:
+            publish_snapshot(path, config, workers)
+        except Exception as e:
+            # Replicas keep serving the last published snapshot
+            logger.error(f"Catalog snapshot refresh failed: {str(e)}")
+        if stop_event.wait(max(0, interval - (time.monotonic() - started))):
+            return
+
+#------------------------------------------------------------------------------
+# REPLICA SIDE
+#------------------------------------------------------------------------------
+def wait_for_snapshot(path, timeout):
+    """
+    Wait until the refresher has published a first snapshot, then load it
+
+    Returns:
+        Tuple of the manifest and the stamp of the snapshot file, taken
+        before reading it (pass it to SnapshotFollower)
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        stamp = _snapshot_stamp(path)
+        if stamp is not None:
+            break
+        if time.monotonic() >= deadline:
+            raise FileNotFoundError(f"No catalog snapshot at {path} after {timeout}s; is the refresher running?")
+        time.sleep(0.5)
+    return load_manifest(path), stamp
+
+class SnapshotFollower:
+    """
+    Background thread that swaps a replica's catalog to each new snapshot
+
+    Polling is a single stat call, so reruns never touch the file and a
+    new snapshot reaches every replica within one poll interval.
+    """
+
+    def __init__(self, catalog, path, interval=2, stamp=None):
+        """
+        Args:
+            catalog: Catalog serving the snapshot
+            path: Snapshot file published by the refresher
+            interval: Seconds between checks
+            stamp: Stamp of the snapshot the catalog was created from
+        """
+        self.catalog = catalog
+        self.path = path
+        self.interval = interval
+        self._stamp = stamp
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='catalog-snapshot', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        self._thread = None
+
+    def check(self):
+        """Load the snapshot if it was replaced since the last check"""
+        # Taken before reading: if the file is replaced while it is read, the
+        # next check sees a new stamp and loads it again
+        stamp = _snapshot_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return False
+        manifest = load_manifest(self.path)
+        self._stamp = stamp
+        self.catalog.use_manifest(manifest)
+        return True
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                # e.g. a snapshot written by a newer refresher; try again later
+                logger.error(f"Could not load catalog snapshot {self.path}: {str(e)}")
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Publish the shared catalog snapshot read by app replicas")
+    parser.add_argument('--path', default=config["CATALOG_SNAPSHOT_PATH"],
+                        help="Snapshot file to publish (default: CATALOG_SNAPSHOT_PATH)")
+    parser.add_argument('--interval', type=int, default=config["CATALOG_SNAPSHOT_SECONDS"],
+                        help="Seconds between refreshes (default: CATALOG_SNAPSHOT_SECONDS)")
+    parser.add_argument('--workers', type=int, default=8, help="Videos described in parallel")
+    parser.add_argument('--once', action='store_true', help="Publish one snapshot and exit")
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error("no snapshot path; set CATALOG_SNAPSHOT_PATH or pass --path")
+
+    if args.once:
+        publish_snapshot(args.path, config, args.workers)
+        sys.exit(0)
+    run_refresher(args.path, args.interval, config, args.workers)
@@ -0,0 +1,428 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+import logging
+import argparse
+import threading
+import subprocess
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from config import get_config
+from utils import hls_package_relpath, HLS_MASTER_PLAYLIST
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# STITCHING SETTINGS
+#==============================================================================
+# Stitched streams are stored here, inside the video directory
+STITCH_DIRNAME = 'stitched'
+
+# CONTINUOUS_PLAYBACK modes: 'mp4' joins the MP4 files without re-encoding,
+# 'hls' writes a playlist over the package_hls.py packages
+CONTINUOUS_MODES = ('mp4', 'hls')
+
+# Stitched stream of each mode: a file, or a directory of playlists
+STITCH_EXTENSIONS = {'mp4': '.mp4', 'hls': '.hls'}
+
+# Stream properties that must match for the MP4 files to be joined as-is
+COPY_COMPATIBLE_FIELDS = ('codec_type', 'codec_name', 'profile', 'width', 'height', 'pix_fmt', 'sample_rate', 'channels')
+
+# One stream for a whole video sequence: its source (path or URL) and the
+# (ref, title, start seconds) chapters; a start is None after a video of
+# unknown duration
+StitchedStream = namedtuple('StitchedStream', ['source', 'chapters'])
+
+#==============================================================================
+# STREAM NAMES
+#==============================================================================
+def stitch_name(mode, versions):
+    """
+    Return the file name stem of the stitched stream of (ref, content version) pairs
+
+    Paths with the same video sequence share one stream, and any change
+    of a video's content gives the sequence a new name.
+    """
+    digest = hashlib.sha256(json.dumps([mode, versions]).encode('utf-8')).hexdigest()[:16]
+    return f"{'_'.join(ref for ref, _ in versions)}-{digest}"
+
+def _stitch_label(entry):
+    # 'refs-digest.ext' -> 'refs'
+    return entry.rpartition('.')[0].rpartition('-')[0]
+
+def _remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+
+#==============================================================================
+# MP4 CONCATENATION
+#==============================================================================
+def probe_streams(video_path):
+    """Return the properties of a video's streams that must match for concatenation"""
+    result = subprocess.run(
+        [
+            'ffprobe', '-v', 'error',
+            '-show_entries', 'stream=' + ','.join(COPY_COMPATIBLE_FIELDS),
+            '-of', 'json',
+            video_path
+        ],
+        capture_output=True, text=True, check=True
+    )
+    return [
+        {field: stream.get(field) for field in COPY_COMPATIBLE_FIELDS}
+        for stream in json.loads(result.stdout).get('streams', [])
+    ]
+
+def concat_mp4(sources, output_path):
+    """Join MP4 files with identical stream layouts into one faststart MP4 without re-encoding"""
+    # Written under a hidden per-process name and renamed when complete, so
+    # players and other replicas never see a partial file
+    directory = os.path.dirname(output_path)
+    work_name = f".{os.path.basename(output_path)}.{os.getpid()}"
+    list_path = os.path.join(directory, work_name + '.txt')
+    work_path = os.path.join(directory, work_name + '.mp4')
+    with open(list_path, 'w') as f:
+        for source in sources:
+            escaped = os.path.abspath(source).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+    try:
+        subprocess.run(
+            [
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'concat', '-safe', '0', '-i', list_path,
+                '-map', '0', '-c', 'copy',
+                '-movflags', '+faststart',
+                work_path
+            ],
+            check=True
+        )
+        os.replace(work_path, output_path)
+    finally:
+        for path in (list_path, work_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+#==============================================================================
+# HLS PLAYLISTS
+#==============================================================================
+# One rendition of a package: its #EXT-X-STREAM-INF line, playlist file,
+# target duration and (seconds, segment file) list
+_Variant = namedtuple('_Variant', ['stream_inf', 'playlist', 'target_duration', 'segments'])
+
+def _read_lines(path):
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+def read_hls_package(package_dir):
+    """Return the renditions of a package_hls.py package, in master playlist order"""
+    lines = _read_lines(os.path.join(package_dir, HLS_MASTER_PLAYLIST))
+    variants = []
+    for i, line in enumerate(lines):
+        if not line.startswith('#EXT-X-STREAM-INF:') or i + 1 >= len(lines):
+            continue
+        playlist = os.path.join(package_dir, lines[i + 1])
+        target_duration, segments, duration = 0, [], None
+        for media_line in _read_lines(playlist):
+            if media_line.startswith('#EXT-X-TARGETDURATION:'):
+                target_duration = int(media_line.split(':', 1)[1])
+            elif media_line.startswith('#EXTINF:'):
+                duration = float(media_line.split(':', 1)[1].split(',')[0])
+            elif not media_line.startswith('#') and duration is not None:
+                segments.append((duration, os.path.join(os.path.dirname(playlist), media_line)))
+                duration = None
+        variants.append(_Variant(line, playlist, target_duration, segments))
+    return variants
+
+def _bandwidth(stream_inf):
+    for attribute in stream_inf.split(':', 1)[1].split(','):
+        name, _, value = attribute.partition('=')
+        if name == 'BANDWIDTH' and value.isdigit():
+            return int(value)
+    return 0
+
+def write_hls_playlists(packages, output_dir):
+    """
+    Write master and rendition playlists that play packages back to back
+
+    Segments are referenced where package_hls.py wrote them (relative URLs),
+    with a discontinuity between videos, so nothing is copied or re-encoded.
+    Every package must have the same renditions, as package_hls.py encodes
+    one ladder for all videos.
+    """
+    variant_count = len(packages[0])
+    if any(len(variants) != variant_count for variants in packages):
+        raise ValueError("HLS packages have different renditions; re-run package_hls.py")
+
+    master = ['#EXTM3U', '#EXT-X-VERSION:3']
+    for i in range(variant_count):
+        renditions = [variants[i] for variants in packages]
+        media = [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            f"#EXT-X-TARGETDURATION:{max(r.target_duration for r in renditions)}",
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+        ]
+        for position, rendition in enumerate(renditions):
+            if position:
+                media.append('#EXT-X-DISCONTINUITY')
+            for duration, segment in rendition.segments:
+                media.append(f"#EXTINF:{duration:.6f},")
+                media.append(os.path.relpath(segment, output_dir).replace(os.sep, '/'))
+        media.append('#EXT-X-ENDLIST')
+
+        playlist = f"stream_{i}.m3u8"
+        with open(os.path.join(output_dir, playlist), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(media) + '\n')
+        # Advertise the most demanding video's bitrate for this rendition
+        master += [max((r.stream_inf for r in renditions), key=_bandwidth), playlist]
+
+    # The master playlist is written last, as in package_hls.py
+    with open(os.path.join(output_dir, HLS_MASTER_PLAYLIST), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(master) + '\n')
+
+#==============================================================================
+# STITCHER
+#==============================================================================
+class Stitcher:
+    """
+    Stitched single-stream playback of whole video sequences
+
+    Each distinct sequence is stitched once per content version of its
+    videos and kept on disk, so restarts and replicas sharing the video
+    directory reuse it. On the rerun path get() is a dictionary lookup;
+    a sequence that is not resolved yet is stitched in the background and
+    the app plays the separate videos meanwhile.
+    """
+
+    def __init__(self, catalog, mode='mp4', output_dir=None, workers=1):
+        """
+        Args:
+            catalog: LocalVideoCatalog whose videos are stitched
+            mode: 'mp4' (concatenate without re-encoding) or 'hls' (playlist over packages)
+            output_dir: Directory of the stitched streams (default <video dir>/stitched)
+            workers: Sequences stitched in parallel in the background
+        """
+        if mode not in CONTINUOUS_MODES:
+            raise ValueError(f"Unknown continuous playback mode '{mode}' (expected one of: {', '.join(CONTINUOUS_MODES)})")
+        self.catalog = catalog
+        self.mode = mode
+        self.output_dir = output_dir or os.path.join(catalog.video_dir, STITCH_DIRNAME)
+        self._lock = threading.Lock()
+        self._streams = {}  # refs -> (catalog version, StitchedStream or None)
+        self._pending = {}
+        self._versions = (None, {})  # content versions of the current catalog version
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stitch')
+
+    def get(self, sequence):
+        """Return the StitchedStream of a video sequence, or None if it is not (yet) available"""
+        refs = tuple(video['ref'] for video in sequence)
+        entry = self._streams.get(refs)
+        if entry is not None and entry[0] == self.catalog.version:
+            metrics.inc('cache_hits_total', cache='stitch')
+            return entry[1]
+
+        metrics.inc('cache_misses_total', cache='stitch')
+        with self._lock:
+            if refs not in self._pending:
+                self._pending[refs] = self._executor.submit(self._resolve, refs, sequence)
+        return None
+
+    def _resolve(self, refs, sequence):
+        stream, version = None, None
+        try:
+            # The version the stream is built from; a later change re-resolves it
+            self.catalog.videos()
+            version = self.catalog.version
+            stream = self.build(sequence)
+        except Exception as e:
+            logger.error(f"Could not stitch {', '.join(refs)}: {str(e)}")
+        finally:
+            # Sequences that cannot be stitched are not retried until the catalog changes
+            with self._lock:
+                self._streams[refs] = (version, stream)
+                self._pending.pop(refs, None)
+
+    def build(self, sequence):
+        """Stitch a video sequence now unless it is already on disk; None if it cannot be stitched"""
+        refs = [video['ref'] for video in sequence]
+        videos = self.catalog.videos()
+        paths = [videos.get(ref) for ref in refs]
+        if not refs or not all(path and os.path.isfile(path) for path in paths):
+            return None
+        # Placeholders and other files that are not real videos
+        media = [self.catalog.media_info(ref) for ref in refs]
+        if any(info is not None and not info['valid'] for info in media):
+            return None
+
+        versions = [(ref, self._content_version(ref)) for ref in refs]
+        name = stitch_name(self.mode, versions)
+        os.makedirs(self.output_dir, exist_ok=True)
+        with metrics.span('stitch', mode=self.mode):
+            if self.mode == 'hls':
+                built = self._build_hls(name, refs)
+            else:
+                built = self._build_mp4(name, paths, media)
+        if built is None:
+            return None
+        source, durations = built
+        self._prune(name + STITCH_EXTENSIONS[self.mode])
+
+        chapters, start = [], 0.0
+        for video, duration in zip(sequence, durations):
+            chapters.append((video['ref'], video['title'], start))
+            start = start + duration if start is not None and duration is not None else None
+        return StitchedStream(self.catalog.file_url(source), tuple(chapters))
+
+    def _content_version(self, ref):
+        # Hashing a local video reads the whole file, so each video is
+        # hashed once per catalog version rather than once per sequence
+        version, versions = self._versions
+        if version != self.catalog.version:
+            version, versions = self.catalog.version, {}
+            self._versions = (version, versions)
+        if ref not in versions:
+            versions[ref] = self.catalog.content_version(ref)
+        return versions[ref]
+
+    def _build_mp4(self, name, paths, media):
+        output_path = os.path.join(self.output_dir, name + STITCH_EXTENSIONS['mp4'])
+        durations = [info['duration'] if info else None for info in media]
+        if os.path.isfile(output_path):
+            return output_path, durations
+
+        if not shutil.which('ffmpeg') or not shutil.which('ffprobe'):
+            logger.warning("ffmpeg and ffprobe must be installed to stitch MP4 videos")
+            return None
+        layouts = [probe_streams(path) for path in paths]
+        if any(layout != layouts[0] for layout in layouts):
+            logger.warning(f"Cannot stitch {name} without re-encoding: its videos differ in codec, resolution or audio")
+            return None
+        concat_mp4(paths, output_path)
+        logger.info(f"Stitched {len(paths)} videos into {output_path}")
+        return output_path, durations
+
+    def _build_hls(self, name, refs):
+        package_dirs = [os.path.join(self.catalog.video_dir, hls_package_relpath(ref)) for ref in refs]
+        if not all(os.path.isfile(os.path.join(d, HLS_MASTER_PLAYLIST)) for d in package_dirs):
+            logger.info(f"Not stitching {name}: run package_hls.py to package every video of the sequence")
+            return None
+        packages = [read_hls_package(d) for d in package_dirs]
+        durations = [sum(seconds for seconds, _ in variants[0].segments) if variants else None for variants in packages]
+
+        output_dir = os.path.join(self.output_dir, name + STITCH_EXTENSIONS['hls'])
+        master_path = os.path.join(output_dir, HLS_MASTER_PLAYLIST)
+        if not os.path.isfile(master_path):
+            # Written next to the final directory so relative segment URLs stay valid
+            work_dir = os.path.join(self.output_dir, f".{name}.{os.getpid()}")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            os.makedirs(work_dir)
+            try:
+                write_hls_playlists(packages, work_dir)
+                shutil.rmtree(output_dir, ignore_errors=True)
+                os.replace(work_dir, output_dir)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            logger.info(f"Stitched {len(refs)} HLS packages into {output_dir}")
+        return master_path, durations
+
+    def _prune(self, current):
+        # Streams of the same sequence and mode built from older video content
+        label, extension = _stitch_label(current), os.path.splitext(current)[1]
+        for entry in os.listdir(self.output_dir):
+            if _stitch_label(entry) == label and entry.endswith(extension) and entry != current:
+                _remove(os.path.join(self.output_dir, entry))
+                logger.info(f"Removed outdated stitched stream {entry}")
+
+#==============================================================================
+# PROCESS-WIDE STITCHER
+#==============================================================================
+_stitcher = None
+_initialized = False
+_stitcher_lock = threading.Lock()
+
+def get_stitcher():
+    """Return the stitcher shared by every session, or None if continuous playback is off"""
+    global _stitcher, _initialized
+    if not _initialized:
+        with _stitcher_lock:
+            if not _initialized:
+                _stitcher = _create_stitcher(get_config())
+                _initialized = True
+    return _stitcher
+
+def _create_stitcher(config):
+    mode = config["CONTINUOUS_PLAYBACK"].lower()
+    if not mode:
+        return None
+    if mode not in CONTINUOUS_MODES:
+        logger.warning(f"Ignoring unknown CONTINUOUS_PLAYBACK '{mode}' (expected one of: {', '.join(CONTINUOUS_MODES)})")
+        return None
+
+    from catalog import get_catalog
+    catalog = get_catalog()
+    # Stitching reads the video files, which only the local backend has
+    if catalog.kind != 'local':
+        logger.warning(f"Continuous playback needs local video files; not available with {catalog.kind} storage")
+        return None
+    # Without it a stitched MP4 would be read into Streamlit's media store per session
+    if not config["LOCAL_VIDEO_SERVER"]:
+        logger.warning(f"CONTINUOUS_PLAYBACK={mode} needs LOCAL_VIDEO_SERVER=True to stream the stitched videos")
+        return None
+    logger.info(f"Continuous playback enabled ({mode})")
+    return Stitcher(catalog, mode)
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+def stitch_all(mode='mp4'):
+    """Stitch every distinct video sequence of the decision tree and remove unused streams"""
+    from catalog import LocalVideoCatalog
+    from decision_tree import get_decision_tree, path_slug
+
+    catalog = LocalVideoCatalog()
+    stitcher = Stitcher(catalog, mode)
+    tree = get_decision_tree()
+
+    ok = True
+    kept = set()
+    for refs in sorted(set(tree.sequences.values())):
+        slugs = [path_slug(path) for path, path_refs in tree.sequences.items() if path_refs == refs]
+        sequence = [{'ref': ref, 'title': tree.title_for(ref)} for ref in refs]
+        try:
+            stream = stitcher.build(sequence)
+        except (OSError, ValueError, subprocess.CalledProcessError) as e:
+            print(f"{' > '.join(refs)}: failed ({e})")
+            ok = False
+            continue
+        if stream is None:
+            print(f"{' > '.join(refs)}: not stitched ({len(slugs)} paths keep separate videos)")
+            continue
+        kept.add(os.path.basename(os.path.dirname(stream.source) if mode == 'hls' else stream.source))
+        print(f"{' > '.join(refs)}: {os.path.relpath(stream.source, catalog.video_dir)} ({len(slugs)} paths)")
+
+    # Remove streams of sequences the tree no longer has
+    if os.path.isdir(stitcher.output_dir):
+        for entry in os.listdir(stitcher.output_dir):
+            if entry.endswith(STITCH_EXTENSIONS[mode]) and not entry.startswith('.') and entry not in kept:
+                _remove(os.path.join(stitcher.output_dir, entry))
+                print(f"Removed unused stream: {entry}")
+    return ok
+
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Stitch each video sequence of the decision tree into one stream")
+    parser.add_argument('--mode', choices=CONTINUOUS_MODES, default=config["CONTINUOUS_PLAYBACK"].lower() or 'mp4',
+                        help="mp4: join the files without re-encoding; hls: playlist over package_hls.py packages (default: CONTINUOUS_PLAYBACK or mp4)")
+    args = parser.parse_args()
+
+    sys.exit(0 if stitch_all(args.mode) else 1)
@@ -0,0 +1,108 @@
+import logging
+
+from config import get_config
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# STORAGE BACKENDS
+#==============================================================================
+# Each factory imports its backend (and that backend's dependencies, such as
+# boto3 for S3 or watchdog for local files) only when it is selected, so a
+# process never pays for storage it does not use.
+def _create_local(config, manifest=None):
+    from catalog import LocalVideoCatalog
+
+    catalog = LocalVideoCatalog(
+        ttl=config["CATALOG_TTL_SECONDS"],
+        probe_media=config["PROBE_MEDIA"],
+        manifest=manifest
+    )
+    # With a manifest the file list is the manifest: only its own file is
+    # watched for a recompiled version (replicas follow the shared snapshot)
+    if manifest is None:
+        catalog.start_watching()
+    elif config["MANIFEST_PATH"] and config["CATALOG_ROLE"] != 'replica':
+        catalog.start_watching(config["MANIFEST_PATH"])
+
+    if config["LOCAL_VIDEO_SERVER"]:
+        from video_server import start_video_server
+        catalog.serve_over_http(start_video_server(
+            catalog.video_dir,
+            host=config["VIDEO_SERVER_HOST"],
+            port=config["VIDEO_SERVER_PORT"],
+            public_url=config["VIDEO_SERVER_PUBLIC_URL"] or None
+        ), prefer_hls=config["USE_HLS"])
+    return catalog
+
+def _create_s3(config, manifest=None):
+    from s3_catalog import create_s3_catalog
+    return create_s3_catalog(config, manifest)
+
+def _create_http(config, manifest=None):
+    from http_catalog import create_http_catalog
+    return create_http_catalog(config, manifest)
+
+STORAGE_BACKENDS = {
+    'local': _create_local,
+    's3': _create_s3,
+    'http': _create_http,
+}
+
+def get_storage_backend_name(config=None):
+    """
+    Return the storage backend selected by the configuration
+
+    STORAGE_BACKEND picks one explicitly; when it is empty, USE_S3 chooses
+    between S3 and local storage as before.
+    """
+    config = config or get_config()
+    name = (config["STORAGE_BACKEND"] or ('s3' if config["USE_S3"] else 'local')).lower()
+    if name not in STORAGE_BACKENDS:
+        raise ValueError(f"Unknown STORAGE_BACKEND '{name}' (expected one of: {', '.join(STORAGE_BACKENDS)})")
+    return name
+
+def create_storage_catalog(config=None):
+    """
+    Create the video catalog of the configured storage backend
+
+    With MANIFEST_PATH set, the catalog serves the videos listed in the
+    compiled manifest (one file read) instead of discovering them. Replicas
+    (CATALOG_ROLE=replica) serve the shared snapshot published by the
+    refresher and switch to every new snapshot it publishes.
+    """
+    config = config or get_config()
+    name = get_storage_backend_name(config)
+    if config["CATALOG_ROLE"] not in ('', 'replica'):
+        raise ValueError(f"Unknown CATALOG_ROLE '{config['CATALOG_ROLE']}' (expected 'replica' or empty)")
+    replica = config["CATALOG_ROLE"] == 'replica'
+
+    manifest = None
+    snapshot_stamp = None
+    if replica:
+        from shared_catalog import wait_for_snapshot
+        if not config["CATALOG_SNAPSHOT_PATH"]:
+            raise ValueError("CATALOG_ROLE=replica requires CATALOG_SNAPSHOT_PATH")
+        manifest, snapshot_stamp = wait_for_snapshot(config["CATALOG_SNAPSHOT_PATH"], config["CATALOG_SNAPSHOT_WAIT_SECONDS"])
+        name = manifest.backend
+    elif config["MANIFEST_PATH"]:
+        from manifest import load_manifest
+        manifest = load_manifest(config["MANIFEST_PATH"])
+        # The manifest knows which backend it was compiled from
+        name = manifest.backend
+
+    logger.info(f"Using {name} video storage" + (" from a compiled manifest" if manifest else ""))
+    catalog = STORAGE_BACKENDS[name](config, manifest)
+
+    if replica:
+        from shared_catalog import SnapshotFollower
+        SnapshotFollower(
+            catalog,
+            config["CATALOG_SNAPSHOT_PATH"],
+            interval=config["CATALOG_SNAPSHOT_POLL_SECONDS"],
+            stamp=snapshot_stamp
+        ).start()
+    return catalog
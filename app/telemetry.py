@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import sqlite3
+import logging
+import argparse
+import threading
+from collections import Counter
+
+import metrics
+from config import get_config
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# TELEMETRY SETTINGS
+#==============================================================================
+# Stores ending in one of these are SQLite databases; anything else is JSONL
+SQLITE_EXTENSIONS = ('.db', '.sqlite', '.sqlite3')
+
+#==============================================================================
+# EVENT STORES
+#==============================================================================
+class JsonlStore:
+    """Append events to a file as one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, events):
+        # One append per batch, so lines of concurrent replicas do not interleave
+        data = ''.join(json.dumps(event, separators=(',', ':')) + '\n' for event in events)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(data)
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def close(self):
+        pass
+
+class SqliteStore:
+    """Insert events into an events table, one transaction per batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = None
+
+    def _connect(self):
+        # Created on first use, i.e. in the thread that writes the batches
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, timeout=30)
+            # WAL lets several replicas append to the same database
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS events ("
+                "ts REAL NOT NULL, kind TEXT NOT NULL, path TEXT, ref TEXT, data TEXT)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS events_kind ON events (kind, ts)")
+        return self._connection
+
+    def write(self, events):
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT INTO events (ts, kind, path, ref, data) VALUES (?, ?, ?, ?, ?)",
+                [_event_row(event) for event in events]
+            )
+
+    def read(self):
+        if not os.path.isfile(self.path):
+            return
+        for ts, kind, path, ref, data in self._connect().execute(
+            "SELECT ts, kind, path, ref, data FROM events ORDER BY ts"
+        ):
+            event = json.loads(data) if data else {}
+            event.update(ts=ts, kind=kind)
+            if path is not None:
+                event['path'] = path
+            if ref is not None:
+                event['ref'] = ref
+            yield event
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+def _event_row(event):
+    # Fields every kind shares get columns; the rest (refs, step, ...) is JSON
+    extra = {key: value for key, value in event.items() if key not in ('ts', 'kind', 'path', 'ref')}
+    return (
+        event['ts'], event['kind'], event.get('path'), event.get('ref'),
+        json.dumps(extra, separators=(',', ':')) if extra else None,
+    )
+
+def open_store(path):
+    """Return the SQLite or JSONL store for a path, chosen by its extension"""
+    if path.lower().endswith(SQLITE_EXTENSIONS):
+        return SqliteStore(path)
+    return JsonlStore(path)
+
+#==============================================================================
+# HOT PATH AND REFERENCE STATISTICS
+#==============================================================================
+class UsageStats:
+    """
+    Running counts of the paths, steps and videos sessions actually use
+
+    Caches and prefetchers read hot_refs()/hot_paths() to decide what is
+    worth keeping warm.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.paths = Counter()  # path slug -> resolved video sequences
+        self.steps = Counter()  # path slug -> sessions arriving at that path
+        self.refs = Counter()   # video reference -> players rendered
+        self.events = 0
+
+    def add(self, events):
+        with self._lock:
+            for event in events:
+                self.events += 1
+                kind = event.get('kind')
+                if kind == 'sequence':
+                    self.paths[event.get('path', '')] += 1
+                elif kind == 'step':
+                    self.steps[event.get('path', '')] += 1
+                elif kind == 'play':
+                    self.refs[event.get('ref')] += 1
+
+    def hot_refs(self, limit=None):
+        """Return (ref, plays) pairs, most played first"""
+        with self._lock:
+            return self.refs.most_common(limit)
+
+    def hot_paths(self, limit=None):
+        """Return (path slug, sequences) pairs, most used first"""
+        with self._lock:
+            return self.paths.most_common(limit)
+
+    def snapshot(self, limit=20):
+        """Return the top entries as plain data for JSON export"""
+        with self._lock:
+            return {
+                'events': self.events,
+                'refs': dict(self.refs.most_common(limit)),
+                'paths': dict(self.paths.most_common(limit)),
+                'steps': dict(self.steps.most_common(limit)),
+            }
+
+#==============================================================================
+# EVENT RECORDER
+#==============================================================================
+class EventRecorder:
+    """
+    Buffer usage events in memory and write them in batches off the rerun path
+
+    record() never blocks: events go into a bounded queue and are dropped
+    (and counted) when it is full, e.g. while the store is slow. A
+    background thread writes batches of up to batch_size events, at least
+    every flush_seconds, and keeps the usage statistics.
+    """
+
+    def __init__(self, store=None, queue_size=10000, batch_size=500, flush_seconds=5):
+        """
+        Args:
+            store: JsonlStore/SqliteStore to write to (None = statistics only)
+            queue_size: Events buffered before new ones are dropped
+            batch_size: Most events written in one batch
+            flush_seconds: Longest time an event waits to be written
+        """
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.stats = UsageStats()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def record(self, kind, **fields):
+        """
+        Queue an event; returns False if it was dropped
+
+        Kinds used by the app: 'step' (a session moved to another path),
+        'sequence' (a session reached a path's video sequence) and 'play'
+        (a video player or its placeholder was shown). Each is recorded
+        once per transition, not on every rerun.
+        """
+        fields['ts'] = time.time()
+        fields['kind'] = kind
+        try:
+            self._queue.put_nowait(fields)
+        except queue.Full:
+            metrics.inc('telemetry_events_dropped_total', kind=kind)
+            return False
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        """Write what is still queued and stop the writer thread"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._flush(self._next_batch())
+        # Drain what was queued before stopping
+        while not self._queue.empty():
+            self._flush(self._next_batch(wait=False))
+        if self.store is not None:
+            self.store.close()
+
+    def _next_batch(self, wait=True):
+        batch = []
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if wait and remaining > 0 and not self._stop_event.is_set():
+                    batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                if not wait or remaining <= 0 or self._stop_event.is_set():
+                    break
+        return batch
+
+    def _flush(self, batch):
+        # A bad event must not end the writer thread, or the queue fills up for good
+        try:
+            self._write(batch)
+        except Exception as e:
+            metrics.inc('telemetry_events_dropped_total', len(batch), kind='error')
+            logger.error(f"Could not process {len(batch)} telemetry events: {str(e)}")
+
+    def _write(self, batch):
+        if not batch:
+            return
+        self.stats.add(batch)
+        metrics.inc('telemetry_events_total', len(batch))
+        if self.store is None:
+            return
+        try:
+            with metrics.span('telemetry_flush'):
+                self.store.write(batch)
+        except Exception as e:
+            # The events still count towards the statistics
+            metrics.inc('telemetry_events_dropped_total', len(batch), kind='write_error')
+            logger.error(f"Could not write {len(batch)} telemetry events to {self.store.path}: {str(e)}")
+
+#==============================================================================
+# PROCESS-WIDE RECORDER
+#==============================================================================
+_recorder = None
+_initialized = False
+_recorder_lock = threading.Lock()
+
+def get_recorder():
+    """Return the recorder shared by every session, or None if telemetry is off"""
+    global _recorder, _initialized
+    if not _initialized:
+        with _recorder_lock:
+            if not _initialized:
+                _recorder = _create_recorder(get_config())
+                _initialized = True
+    return _recorder
+
+def _create_recorder(config):
+    if not config["TELEMETRY"]:
+        return None
+    path = config["TELEMETRY_PATH"]
+    recorder = EventRecorder(
+        open_store(path) if path else None,
+        queue_size=config["TELEMETRY_QUEUE_SIZE"],
+        batch_size=config["TELEMETRY_BATCH_SIZE"],
+        flush_seconds=config["TELEMETRY_FLUSH_SECONDS"]
+    )
+    recorder.start()
+    # Write the last partial batch when the process exits
+    atexit.register(recorder.stop)
+    logger.info("Recording usage telemetry" + (f" to {path}" if path else " (statistics only)"))
+    return recorder
+
+def record(kind, **fields):
+    """Record a usage event if telemetry is enabled (never blocks)"""
+    recorder = get_recorder()
+    if recorder is None:
+        return False
+    return recorder.record(kind, **fields)
+
+def hot_refs(limit=None):
+    """Return the most played (ref, count) pairs of this process, if recorded"""
+    recorder = get_recorder()
+    return recorder.stats.hot_refs(limit) if recorder is not None else []
+
+def hot_paths(limit=None):
+    """Return the most used (path slug, count) pairs of this process, if recorded"""
+    recorder = get_recorder()
+    return recorder.stats.hot_paths(limit) if recorder is not None else []
+
+def _stats_route():
+    recorder = get_recorder()
+    stats = recorder.stats.snapshot() if recorder is not None else {}
+    return 200, 'application/json', json.dumps(stats)
+
+metrics.register_route('/telemetry.json', _stats_route)
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser(description="Summarize the usage telemetry written by the app")
+    parser.add_argument('--path', default=config["TELEMETRY_PATH"],
+                        help="Telemetry store to read (default: TELEMETRY_PATH)")
+    parser.add_argument('--since-hours', type=float, default=0, help="Only count recent events (0 = all)")
+    parser.add_argument('--top', type=int, default=10, help="Entries listed per statistic")
+    parser.add_argument('--json', action='store_true', help="Print the statistics as JSON")
+    args = parser.parse_args()
+
+    if not args.path or not os.path.isfile(args.path):
+        parser.error(f"no telemetry store at '{args.path}'; set TELEMETRY_PATH or pass --path")
+
+    since = time.time() - args.since_hours * 3600 if args.since_hours else 0
+    stats = UsageStats()
+    store = open_store(args.path)
+    stats.add(event for event in store.read() if event['ts'] >= since)
+    store.close()
+
+    summary = stats.snapshot(args.top)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(f"{summary['events']} events in {args.path}")
+        for title, key in [('Most played videos', 'refs'), ('Most used paths', 'paths'), ('Most visited steps', 'steps')]:
+            print(f"\n{title}:")
+            for name, count in summary[key].items():
+                print(f"  {count:8d}  {name or '(start)'}")
+    sys.exit(0)
@@ -1,8 +1,9 @@
 import os
-import boto3
-from botocore.exceptions import NoCredentialsError
-import streamlit as st
+import hashlib
 import logging
+import metrics
+from config import get_config
+from decision_tree import get_decision_tree, canonical_path
 
 #==============================================================================
 # LOGGING CONFIGURATION
@@ -14,26 +15,131 @@ logger = logging.getLogger(__name__)
 #==============================================================================
 # VIDEO PATH LOADING
 #==============================================================================
+@metrics.timed('load_video_paths')
 def load_video_paths():
     """
     Load video paths either from local storage or S3 bucket
     Returns a dictionary of video references and their paths
     """
-    # Check if we're using S3 or local storage
-    use_s3 = os.environ.get('USE_S3', 'False').lower() == 'true'
+    # Imported here to avoid a circular import (storage creates catalogs)
+    from storage import get_storage_backend_name
     
-    if use_s3:
+    # Check which storage backend is configured
+    backend = get_storage_backend_name()
+    
+    if backend == 's3':
         return load_videos_from_s3()
+    elif backend == 'http':
+        from http_catalog import load_http_videos
+        config = get_config()
+        return load_http_videos(config["HTTP_VIDEO_BASE_URL"], config["HTTP_VIDEO_EXTENSION"])
     else:
         return load_local_videos()
 
+#------------------------------------------------------------------------------
+# FILENAME CONVENTIONS
+#------------------------------------------------------------------------------
+def get_local_video_dir():
+    """Return the directory holding local video files"""
+    return os.path.join(os.path.dirname(__file__), 'static', 'videos')
+
+def parse_video_filename(filename):
+    """
+    Parse a video filename following the video_<ref> naming convention
+    
+    Args:
+        filename: File name or path (e.g. video_2_1_1.mp4)
+        
+    Returns:
+        Tuple of (reference, extension) such as ('2.1.1', '.mp4'),
+        or None if the file is not a supported video
+    """
+    base_name, ext = os.path.splitext(os.path.basename(filename))
+    ext = ext.lower()
+    
+    if ext not in ('.mp4', '.mov') or not base_name.startswith('video_'):
+        return None
+    
+    # Extract reference from filename (e.g., video_2_1_1 → 2.1.1)
+    return base_name.replace('video_', '').replace('_', '.'), ext
+
+# Images generated next to each video by generate_thumbnails.py
+THUMBNAIL_KINDS = ('poster', 'sprite')
+
+def thumbnail_filename(ref, kind):
+    """Return the filename of a video's poster or preview sprite image"""
+    return f"video_{ref.replace('.', '_')}.{kind}.jpg"
+
+def parse_thumbnail_filename(filename):
+    """
+    Parse a thumbnail filename such as video_2_1_1.poster.jpg
+    
+    Returns:
+        Tuple of (reference, kind) such as ('2.1.1', 'poster'), or None
+    """
+    name = os.path.basename(filename)
+    if not name.startswith('video_') or not name.lower().endswith('.jpg'):
+        return None
+    
+    base_name, kind = os.path.splitext(name[:-len('.jpg')])
+    kind = kind.lstrip('.')
+    if kind not in THUMBNAIL_KINDS:
+        return None
+    
+    return base_name.replace('video_', '').replace('_', '.'), kind
+
+# WebVTT transcripts/captions stored next to each video, e.g. video_3_3.vtt
+TRANSCRIPT_EXTENSION = '.vtt'
+
+def transcript_filename(ref):
+    """Return the filename of a video's WebVTT transcript"""
+    return f"video_{ref.replace('.', '_')}{TRANSCRIPT_EXTENSION}"
+
+def parse_transcript_filename(filename):
+    """Return the reference of a transcript filename such as video_3_3.vtt, or None"""
+    base_name, ext = os.path.splitext(os.path.basename(filename))
+    if ext.lower() != TRANSCRIPT_EXTENSION or not base_name.startswith('video_'):
+        return None
+    return base_name.replace('video_', '').replace('_', '.')
+
+# Adaptive-bitrate packages written by package_hls.py
+HLS_DIRNAME = 'hls'
+HLS_MASTER_PLAYLIST = 'master.m3u8'
+
+def hls_package_relpath(ref):
+    """Return the HLS package directory of a reference, relative to the video directory"""
+    return os.path.join(HLS_DIRNAME, f"video_{ref.replace('.', '_')}")
+
+def read_into_page_cache(path, chunk_size=1024 * 1024):
+    """Read a file once so the OS keeps it in the page cache; returns the bytes read"""
+    total = 0
+    buffer = bytearray(chunk_size)
+    with open(path, 'rb', buffering=0) as f:
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_WILLNEED)
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            total += count
+    return total
+
+def file_content_hash(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
 #------------------------------------------------------------------------------
 # LOCAL VIDEO LOADING
 #------------------------------------------------------------------------------
-def load_local_videos():
-    """Load videos from local storage"""
+@metrics.timed('load_local_videos')
+def load_local_videos(video_dir=None):
+    """Load videos from local storage (default app/static/videos)"""
     videos = {}
-    video_dir = os.path.join(os.path.dirname(__file__), 'static', 'videos')
+    video_dir = video_dir or get_local_video_dir()
     
     # Check if the directory exists
     if not os.path.exists(video_dir):
@@ -54,34 +160,27 @@ def load_local_videos():
         
         # Process sorted files
         for filename in video_files:
-            base_name = os.path.splitext(filename)[0]  # Remove extension
-            ext = os.path.splitext(filename)[1].lower()
+            parsed = parse_video_filename(filename)
             
-            if base_name.startswith('video_'):
-                # Extract reference from filename (e.g., video_2_1_1 → 2.1.1)
-                ref = base_name.replace('video_', '').replace('_', '.')
+            if parsed:
+                ref, ext = parsed
                 
                 # If this reference already exists and current file is .mov, skip it
                 # (This ensures mp4 is used if both exist)
                 if ref in videos and ext == '.mov' and videos[ref].endswith('.mp4'):
-                    logger.info(f"Skipping {filename} as MP4 version is already loaded")
+                    logger.debug(f"Skipping {filename} as MP4 version is already loaded")
                     continue
                 
                 videos[ref] = os.path.join(video_dir, filename)
-                logger.info(f"Found local video for reference '{ref}': {filename}")
+                logger.debug(f"Found local video for reference '{ref}': {filename}")
     except Exception as e:
         logger.error(f"Error scanning video directory: {str(e)}")
     
     # If no videos found or error occurred, fall back to placeholders
     if not videos:
         logger.info("No local videos found, using placeholders")
-        # Default video references
-        video_refs = [
-            "2.1.1", "2.1.2", "2.2.1", "2.3", "2.4", "2.5",
-            "3.1", "3.2", "3.3", "4.0", "5.0"
-        ]
-        
-        for ref in video_refs:
+        # Every video reference named in the decision tree
+        for ref in get_decision_tree().titles:
             videos[ref] = os.path.join(video_dir, f"video_{ref.replace('.', '_')}.mp4")
     
     return videos
@@ -89,47 +188,48 @@ def load_local_videos():
 #------------------------------------------------------------------------------
 # S3 VIDEO LOADING
 #------------------------------------------------------------------------------
+@metrics.timed('load_videos_from_s3')
 def load_videos_from_s3():
     """Load videos from S3 bucket"""
     videos = {}
     s3_videos = {}  # Temporary storage to sort by format
     
+    # boto3/botocore are only imported when S3 storage is actually used
+    try:
+        from botocore.exceptions import NoCredentialsError
+    except ImportError:
+        logger.error("boto3 is not installed, falling back to local videos")
+        return load_local_videos()
+    
     try:
         # Get S3 configuration from environment variables
         s3_bucket = os.environ.get('S3_BUCKET_NAME')
         s3_prefix = os.environ.get('S3_PREFIX', 'videos/')
         region = os.environ.get('AWS_REGION', 'us-east-1')
         
-        # Initialize S3 client
-        s3 = boto3.client('s3', region_name=region)
+        # Imported here to avoid a circular import (s3_catalog uses utils)
+        from s3_catalog import get_s3_client, iter_s3_objects, build_s3_url
         
-        # List objects in the bucket
-        response = s3.list_objects_v2(Bucket=s3_bucket, Prefix=s3_prefix)
+        # Reuse the process-wide S3 client
+        s3 = get_s3_client(region)
         
-        # First collect all video objects
-        if 'Contents' in response:
-            for obj in response['Contents']:
-                key = obj['Key']
-                # Support both .mp4 and .mov file extensions
-                if key.lower().endswith(('.mp4', '.mov')):
-                    # Extract reference from filename
-                    filename = os.path.basename(key)
-                    base_name = os.path.splitext(filename)[0]  # Remove extension
-                    ext = os.path.splitext(filename)[1].lower()
-                    
-                    # Extract reference number from the filename (e.g., video_2_1_1 → 2.1.1)
-                    if base_name.startswith('video_'):
-                        ref = base_name.replace('video_', '').replace('_', '.')
-                        
-                        # Store in temporary dictionary with format info
-                        if ref not in s3_videos:
-                            s3_videos[ref] = []
-                        
-                        s3_videos[ref].append({
-                            'key': key,
-                            'ext': ext,
-                            'url': f"https://{s3_bucket}.s3.{region}.amazonaws.com/{key}"
-                        })
+        # First collect all video objects (following pagination past 1,000 keys)
+        for obj in iter_s3_objects(s3, s3_bucket, s3_prefix):
+            key = obj['Key']
+            # Support both .mp4 and .mov file extensions
+            parsed = parse_video_filename(key)
+            if parsed:
+                ref, ext = parsed
+                
+                # Store in temporary dictionary with format info
+                if ref not in s3_videos:
+                    s3_videos[ref] = []
+                
+                s3_videos[ref].append({
+                    'key': key,
+                    'ext': ext,
+                    'url': build_s3_url(s3_bucket, region, key)
+                })
         
         # Process collected videos with priority for MP4
         for ref, video_list in s3_videos.items():
@@ -141,12 +241,12 @@ def load_videos_from_s3():
             videos[ref] = selected_video['url']
             
             # Log the selected video and format
-            logger.info(f"Using {selected_video['ext']} format for reference '{ref}': {os.path.basename(selected_video['key'])}")
+            logger.debug(f"Using {selected_video['ext']} format for reference '{ref}': {os.path.basename(selected_video['key'])}")
             
             # Log if we skipped any alternates
             if len(video_list) > 1:
                 skipped = [os.path.basename(v['key']) for v in video_list[1:]]
-                logger.info(f"Skipped alternate formats for reference '{ref}': {', '.join(skipped)}")
+                logger.debug(f"Skipped alternate formats for reference '{ref}': {', '.join(skipped)}")
         
         if not videos:
             logger.warning("No videos found in S3 bucket with the expected naming convention")
@@ -165,6 +265,7 @@ def load_videos_from_s3():
 #==============================================================================
 # VIDEO SEQUENCE DETERMINATION
 #==============================================================================
+@metrics.timed('get_video_sequence')
 def get_video_sequence(selections):
     """
     Determine the sequence of videos to display based on user selections
@@ -173,79 +274,32 @@ def get_video_sequence(selections):
         selections: List of dictionaries containing user selections
         
     Returns:
-        List of dictionaries with video references and titles
+        Tuple of read-only mappings with video references and titles,
+        shared between sessions that chose the same path
     """
-    sequence = []
-    
-    # Extract wound type from selections
-    wound_type = next((s["type_of_wound"] for s in selections if "type_of_wound" in s), None)
-    
-    #------------------------------------------------------------------------------
-    # SPECIAL CASE: DIRECT PATHS (webspace, multiple_toes, povidone)
-    #------------------------------------------------------------------------------
-    if wound_type in ["webspace", "multiple_toes", "povidone"]:
-        # Get the video reference
-        video_ref = next((s["video_ref"] for s in selections if "video_ref" in s), None)
-        if video_ref:
-            sequence.append({
-                "ref": video_ref,
-                "title": get_title_for_reference(video_ref)
-            })
-        
-        # Add secondary dressing automatically
-        sequence.append({
-            "ref": "4.0",
-            "title": "Tubifast to secure"
-        })
-        
-        sequence.append({
-            "ref": "5.0",
-            "title": "Things to watch out for"
-        })
-        
-        return sequence
-    
-    #------------------------------------------------------------------------------
-    # NORMAL CASE: STEP-BY-STEP SELECTION
-    #------------------------------------------------------------------------------
-    # Process selections for superficial and cavity wounds
-    for selection in selections:
-        if "video_ref" in selection:
-            sequence.append({
-                "ref": selection["video_ref"],
-                "title": get_title_for_reference(selection["video_ref"])
-            })
-    
-    # Add Tubifast and watch out videos to all sequences
-    sequence.append({
-        "ref": "4.0",
-        "title": "Tubifast to secure"
-    })
-    
-    sequence.append({
-        "ref": "5.0",
-        "title": "Things to watch out for"
-    })
+    # Imported here to avoid a circular import (the index uses the catalog)
+    from sequence_index import get_sequence_index
+    
+    index = get_sequence_index()
+    path = canonical_path(selections)
     
+    # Complete paths are resolved with a single lookup
+    sequence = index.lookup(path)
+    if sequence is not None:
+        metrics.inc('cache_hits_total', cache='sequence_index')
+    else:
+        metrics.inc('cache_misses_total', cache='sequence_index')
+        
+        # Paths the tree does not know about still get their chosen videos
+        # followed by the videos common to every sequence
+        refs = tuple(s["video_ref"] for s in selections if "video_ref" in s)
+        sequence = index.build(refs + get_decision_tree().common_tail)
     return sequence
 
 #==============================================================================
 # HELPER FUNCTIONS
 #==============================================================================
 def get_title_for_reference(ref):
-    """Get a descriptive title for a video reference"""
-    titles = {
-        "2.1.1": "Sheet Dressing Application",
-        "2.1.2": "Iodosorb Powder/Gels Application",
-        "2.2.1": "Primary Dressing for Cavity Wounds",
-        "2.3": "Webspace Wound Treatment",
-        "2.4": "Multiple Toe Wounds with Inadine",
-        "2.5": "Wounds for Povidone Iodine Soaked Gauze",
-        "3.1": "Toes Location Treatment",
-        "3.2": "Mid Foot/Ankle Location Treatment",
-        "3.3": "Heel Location Treatment",
-        "4.0": "Tubifast to Secure",
-        "5.0": "Things to Watch Out For"
-    }
-    
-    return titles.get(ref, f"Video {ref}")
+    """Get a descriptive title for a video reference (storage titles win over the tree's)"""
+    from catalog import get_catalog
+    return get_catalog().titles().get(ref) or get_decision_tree().title_for(ref)
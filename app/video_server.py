@@ -0,0 +1,293 @@
+import os
+import re
+import logging
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+import metrics
+from utils import parse_video_filename
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+#==============================================================================
+# SERVER SETTINGS
+#==============================================================================
+# File types the server is willing to hand out
+SERVED_EXTENSIONS = {
+    '.mp4': 'video/mp4',
+    '.mov': 'video/quicktime',
+    '.jpg': 'image/jpeg',
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.ts': 'video/mp2t',
+}
+
+# URL prefix under which the video directory is exposed
+VIDEO_URL_PREFIX = '/videos/'
+
+# Browsers may cache video bytes; ETag revalidation catches replacements
+CACHE_CONTROL = 'public, max-age=3600'
+
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+#==============================================================================
+# REQUEST HANDLER
+#==============================================================================
+class VideoRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serve files from the video directory with HTTP Range support
+
+    Bytes are copied from disk to the socket with sendfile where the platform
+    supports it, so memory use does not grow with file size or viewer count.
+    """
+
+    server_version = 'WoundCareVideoServer/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_OPTIONS(self):
+        self.send_response(204)
+        self._send_cors_headers()
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers', 'Range, If-None-Match, If-Modified-Since')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # Route access logs through logging at debug level instead of stderr
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+    #--------------------------------------------------------------------------
+    # File serving
+    #--------------------------------------------------------------------------
+    def _serve(self, send_body):
+        path = self._resolve_path()
+        if path is None:
+            self._send_missing()
+            return
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self._send_missing()
+            return
+
+        with f:
+            stat = os.fstat(f.fileno())
+            size = stat.st_size
+            etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+            last_modified = formatdate(stat.st_mtime, usegmt=True)
+
+            if self._not_modified(etag, stat.st_mtime):
+                self.send_response(304)
+                self._send_cors_headers()
+                self.send_header('ETag', etag)
+                self.send_header('Last-Modified', last_modified)
+                self.send_header('Cache-Control', CACHE_CONTROL)
+                self.end_headers()
+                return
+
+            byte_range = self._parse_range(size, etag, stat.st_mtime)
+            if byte_range == 'invalid':
+                self.send_response(416)
+                self._send_cors_headers()
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+            if byte_range is None:
+                start, end = 0, size - 1
+                self.send_response(200)
+            else:
+                start, end = byte_range
+                self.send_response(206)
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+
+            length = max(0, end - start + 1)
+            ext = os.path.splitext(path)[1].lower()
+            content_type = SERVED_EXTENSIONS.get(ext) or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+            self._send_cors_headers()
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(length))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
+            self.send_header('Last-Modified', last_modified)
+            self.send_header('Cache-Control', CACHE_CONTROL)
+            self.end_headers()
+
+            if send_body and length:
+                # Count playbacks once, not every range request while seeking
+                parsed = parse_video_filename(path)
+                if parsed and start == 0:
+                    metrics.inc('videos_served_total', ref=parsed[0], source='video_server')
+                metrics.inc('video_server_bytes_total', amount=length)
+                try:
+                    # socket.sendfile uses os.sendfile when available and
+                    # falls back to buffered copies otherwise
+                    self.connection.sendfile(f, offset=start, count=length)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Players routinely abort requests when seeking
+                    self.close_connection = True
+
+    def _resolve_path(self):
+        """Map the request path to a file inside the served directory"""
+        url_path = unquote(urlsplit(self.path).path)
+        if not url_path.startswith(VIDEO_URL_PREFIX):
+            return None
+
+        relative = url_path[len(VIDEO_URL_PREFIX):]
+        root = os.path.realpath(self.server.video_dir)
+        path = os.path.realpath(os.path.join(root, relative))
+
+        # Refuse anything outside the video directory
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            return None
+        if os.path.splitext(path)[1].lower() not in SERVED_EXTENSIONS:
+            return None
+        return path
+
+    def _not_modified(self, etag, mtime):
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since:
+            try:
+                return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _parse_range(self, size, etag, mtime):
+        """
+        Parse a single-range Range header
+
+        Returns:
+            (start, end) tuple, None to send the whole file, or 'invalid'
+        """
+        header = self.headers.get('Range')
+        if not header:
+            return None
+
+        # Only honour the range if the client's copy is still current
+        if_range = self.headers.get('If-Range')
+        if if_range:
+            if_range = if_range.strip()
+            if if_range.startswith(('"', 'W/')):
+                if if_range != etag:
+                    return None
+            else:
+                try:
+                    if int(mtime) > parsedate_to_datetime(if_range).timestamp():
+                        return None
+                except (TypeError, ValueError):
+                    return None
+
+        match = RANGE_PATTERN.match(header.strip())
+        if not match:
+            # Multi-range or malformed requests get the whole file
+            return None
+
+        first, last = match.groups()
+        if not first and not last:
+            return None
+
+        if not first:
+            # Suffix range: the last N bytes
+            length = int(last)
+            if length == 0:
+                return 'invalid'
+            return max(0, size - length), size - 1
+
+        start = int(first)
+        end = int(last) if last else size - 1
+        if start >= size or end < start:
+            return 'invalid'
+        return start, min(end, size - 1)
+
+    def _send_cors_headers(self):
+        # The Streamlit page is served from a different port
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers', 'Content-Length, Content-Range, Accept-Ranges, ETag')
+
+    def _send_missing(self):
+        """Redirect to the server's fallback for a missing file (e.g. an evicted cache file), else 404"""
+        url_path = unquote(urlsplit(self.path).path)
+        location = None
+        if self.server.fallback is not None and url_path.startswith(VIDEO_URL_PREFIX):
+            location = self.server.fallback(url_path[len(VIDEO_URL_PREFIX):])
+        if location is None:
+            self._send_error(404)
+            return
+
+        # Temporary: the file may be cached again later
+        self.send_response(307)
+        self._send_cors_headers()
+        self.send_header('Location', location)
+        self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_error(self, code):
+        self.send_response(code)
+        self._send_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+#==============================================================================
+# SERVER LIFECYCLE
+#==============================================================================
+class VideoServer(ThreadingHTTPServer):
+    """Threaded HTTP server bound to a video directory"""
+
+    daemon_threads = True
+
+    def __init__(self, address, video_dir, public_url=None):
+        super().__init__(address, VideoRequestHandler)
+        self.video_dir = video_dir
+        # Optional callable mapping the relative path of a missing file to a
+        # URL players are redirected to
+        self.fallback = None
+        port = self.server_address[1]
+        self.public_url = (public_url or f"http://localhost:{port}").rstrip('/')
+
+    def url_for(self, path):
+        """Return the browser-facing URL of a file in the video directory"""
+        relative = os.path.relpath(path, self.video_dir).replace(os.sep, '/')
+        return f"{self.public_url}{VIDEO_URL_PREFIX}{relative}"
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_video_server(video_dir, host='0.0.0.0', port=8502, public_url=None):
+    """
+    Start the process-wide video server in a background thread
+
+    Returns the running server; calling it again returns the same server.
+    """
+    global _server
+    with _server_lock:
+        if _server is None:
+            server = VideoServer((host, port), video_dir, public_url)
+            thread = threading.Thread(
+                target=server.serve_forever,
+                name='video-server',
+                daemon=True
+            )
+            thread.start()
+            _server = server
+            logger.info(f"Serving videos from {video_dir} on {host}:{server.server_address[1]} ({server.public_url})")
+    return _server
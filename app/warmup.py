@@ -0,0 +1,148 @@
+import os
+import json
+import time
+import logging
+import importlib
+import threading
+
+import metrics
+from config import get_config
+
+#==============================================================================
+# LOGGING CONFIGURATION
+#==============================================================================
+logger = logging.getLogger(__name__)
+
+# The Streamlit script every session runs
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+
+# Third-party modules app.py imports on its first run (the app's own
+# modules are imported by the steps that build the catalog and indexes)
+APP_IMPORTS = ('streamlit', 'streamlit.components.v1')
+
+#==============================================================================
+# READINESS
+#==============================================================================
+# A process is ready once warm-up finished and Streamlit accepts connections
+# (see serve.py); /ready on the ops server answers 503 until then, so load
+# balancers and orchestrators never route users to a cold process.
+_ready = threading.Event()
+_status = {'state': 'starting', 'steps': {}, 'error': None}
+
+def is_ready():
+    """Whether this process finished warming up and serves the app"""
+    return _ready.is_set()
+
+def mark_ready():
+    _status['state'] = 'ready'
+    _ready.set()
+    logger.info("Ready to serve users")
+
+def _ready_route():
+    body = json.dumps(dict(_status, ready=is_ready()))
+    return (200 if is_ready() else 503), 'application/json', body
+
+metrics.register_route('/ready', _ready_route)
+
+#==============================================================================
+# WARM-UP
+#==============================================================================
+def _import_app_modules():
+    for name in APP_IMPORTS:
+        importlib.import_module(name)
+
+def _compile_app_script():
+    # Streamlit compiles app.py (after its "magic" rewrite) on the first
+    # run; doing it here loads the parser and rewrite modules and fails
+    # warm-up on a broken script instead of the first user's page
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    ScriptCache().get_bytecode(APP_SCRIPT)
+
+def seed_script_cache():
+    """
+    Compile app.py into the running Streamlit runtime's script cache
+
+    The runtime only exists once Streamlit started (see serve.py), so this
+    is not a warm-up step. The cache is not public API; without it the
+    first session compiles the script as usual.
+    """
+    from streamlit.runtime import Runtime
+    script_cache = getattr(Runtime.instance(), '_script_cache', None)
+    if script_cache is None:
+        logger.info("Streamlit runtime has no script cache to seed")
+        return False
+    script_cache.get_bytecode(APP_SCRIPT)
+    return True
+
+def _build_catalog():
+    from catalog import get_catalog
+    catalog = get_catalog()
+    # S3 and HTTP catalogs list or probe their storage on first use
+    return len(catalog.videos())
+
+def _resolve_sequences():
+    from decision_tree import get_decision_tree
+    from utils import get_video_sequence
+
+    tree = get_decision_tree()
+    for path in tree.sequences:
+        get_video_sequence(tree.selections_for(path))
+    return len(tree.sequences)
+
+def _build_search_index():
+    from search import get_search_index
+    get_search_index()
+
+def _preload_common_videos():
+    from catalog import get_catalog
+    from decision_tree import get_decision_tree
+
+    # The shared tail (e.g. 4.0 and 5.0) is part of every video sequence
+    catalog = get_catalog()
+    return sum(catalog.preload(ref) for ref in get_decision_tree().common_tail)
+
+def warm_up(config=None):
+    """
+    Build everything the first user of a new process would otherwise wait for
+
+    Imports the app's modules, compiles app.py, builds the catalog (listing S3 or loading
+    the shared snapshot), resolves the video sequence of every complete
+    path, builds the search index and, with WARMUP_PRELOAD_VIDEOS, reads
+    the videos shown in every sequence into the disk and page caches.
+
+    Returns:
+        Dictionary of step names to seconds taken
+    """
+    config = config or get_config()
+    steps = [
+        ('imports', _import_app_modules),
+        ('script', _compile_app_script),
+        ('catalog', _build_catalog),
+        ('sequences', _resolve_sequences),
+        ('search', _build_search_index),
+    ]
+    if config["WARMUP_PRELOAD_VIDEOS"]:
+        steps.append(('preload', _preload_common_videos))
+
+    _status['state'] = 'warming'
+    started = time.perf_counter()
+    for name, step in steps:
+        step_started = time.perf_counter()
+        with metrics.span('warmup', step=name):
+            step()
+        _status['steps'][name] = round(time.perf_counter() - step_started, 3)
+    _status['state'] = 'warm'
+    _status['error'] = None
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.2f}s ({_status['steps']})")
+    return dict(_status['steps'])
+
+def warm_up_until_done(config=None, retry_seconds=10):
+    """Run warm_up until it succeeds (e.g. once S3 is reachable), reporting errors on /ready"""
+    while True:
+        try:
+            return warm_up(config)
+        except Exception as e:
+            _status['state'] = 'failed'
+            _status['error'] = str(e)
+            logger.error(f"Warm-up failed, retrying in {retry_seconds}s: {str(e)}")
+            time.sleep(retry_seconds)
@@ -0,0 +1,516 @@
+import os
+import io
+import sys
+import json
+import math
+import time
+import struct
+import argparse
+import platform
+import subprocess
+import tracemalloc
+import multiprocessing
+
+#==============================================================================
+# BENCHMARK SETTINGS
+#==============================================================================
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_DIR = os.path.join(REPO_DIR, 'app')
+APP_SCRIPT = os.path.join(APP_DIR, 'app.py')
+
+# The app imports its modules (utils, catalog, ...) from its own directory
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+# Seconds a single AppTest run may take before it is treated as hung
+RUN_TIMEOUT = 30
+
+# Bucket and prefix used by the S3 stand-in
+BENCH_BUCKET = 'wound-care-bench'
+BENCH_PREFIX = 'videos/'
+
+PERCENTILES = (50, 95, 99)
+
+# _reset_triggers_on_rerun patches AppTest internals of this release
+# (pinned in benchmarks/requirements.txt)
+PATCHED_STREAMLIT_VERSION = '1.31.1'
+
+#==============================================================================
+# STATISTICS
+#==============================================================================
+def percentile(samples, pct):
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def summarize(samples):
+    """Summarize latency samples (seconds) in milliseconds"""
+    summary = {'count': len(samples)}
+    if samples:
+        summary['mean_ms'] = sum(samples) / len(samples) * 1000
+        summary['max_ms'] = max(samples) * 1000
+        for pct in PERCENTILES:
+            summary[f'p{pct}_ms'] = percentile(samples, pct) * 1000
+    return summary
+
+#==============================================================================
+# DECISION PATHS
+#==============================================================================
+def enumerate_scenarios(tree):
+    """
+    Return the clicks that walk every complete decision tree path
+
+    Each scenario is (path id, button labels, selections) where the labels
+    are clicked in order from the first step and the selections are what
+    the app stores in session state along the way. Shortcuts straight to
+    the final page (e.g. webspace) are included as complete paths too.
+    """
+    scenarios = []
+    for path in sorted(tree.sequences):
+        labels = []
+        selections = []
+        step_id = tree.start
+        for depth, (key, value) in enumerate(path):
+            step = tree.steps[step_id]
+            option = next(o for o in step.options if o.value == value)
+            labels.append(option.label)
+            selections.append(dict(option.selection))
+            step_id = tree.next_step(path[:depth], step, option)
+        scenarios.append(('/'.join(value for _, value in path), labels, selections))
+    return scenarios
+
+#==============================================================================
+# APPTEST SESSIONS
+#==============================================================================
+_runner_patched = False
+
+def _reset_triggers_on_rerun():
+    """
+    Make AppTest reset button triggers when the script calls st.rerun()
+
+    The real ScriptRunner does this, but AppTest's runner keeps triggers set
+    so they stay inspectable; a clicked "Next Video" would then fire again
+    on every rerun until the button disappears.
+    """
+    global _runner_patched
+    if _runner_patched:
+        return
+    import streamlit
+    if streamlit.__version__ != PATCHED_STREAMLIT_VERSION:
+        raise RuntimeError(
+            f"bench_app.py patches LocalScriptRunner._on_script_finished of Streamlit "
+            f"{PATCHED_STREAMLIT_VERSION}, but {streamlit.__version__} is installed; "
+            f"check the patch against that release and update PATCHED_STREAMLIT_VERSION"
+        )
+    from streamlit.runtime.scriptrunner.script_runner import ScriptRunnerEvent
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner
+
+    original = LocalScriptRunner._on_script_finished
+
+    def on_script_finished(self, ctx, event, premature_stop):
+        if event == ScriptRunnerEvent.SCRIPT_STOPPED_FOR_RERUN:
+            self._session_state._state._reset_triggers()
+        original(self, ctx, event, premature_stop)
+
+    LocalScriptRunner._on_script_finished = on_script_finished
+    _runner_patched = True
+
+def new_session():
+    """Start a headless session and run the first page"""
+    from streamlit.testing.v1 import AppTest
+
+    _reset_triggers_on_rerun()
+
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=RUN_TIMEOUT)
+    return at, _timed_run(at.run)
+
+def click(at, label):
+    """Click the first button with a label and return the rerun latency"""
+    for button in at.button:
+        if button.label == label:
+            return _timed_run(button.click().run)
+    raise LookupError(f"No button labelled '{label}' on step {at.session_state['current_step']}")
+
+def _timed_run(run):
+    start = time.perf_counter()
+    at = run()
+    elapsed = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"App raised: {at.exception[0].value}")
+    return elapsed
+
+def run_scenario(labels, latencies):
+    """
+    Walk one path like a user would and append each rerun's latency
+
+    The session clicks through the steps, steps through every video on the
+    final page (lazy playback), goes back once and starts a new guide.
+    """
+    at, elapsed = new_session()
+    latencies.append(elapsed)
+
+    for label in labels:
+        latencies.append(click(at, label))
+
+    sequence = at.session_state['video_sequence']
+    if any(button.label == 'Next Video' for button in at.button):
+        for _ in range(len(sequence) - 1):
+            latencies.append(click(at, 'Next Video'))
+
+    latencies.append(click(at, 'Back to Previous Step'))
+    latencies.append(click(at, labels[-1]))
+    latencies.append(click(at, 'Start New Guide'))
+    return at
+
+#==============================================================================
+# BENCHMARKS
+#==============================================================================
+def bench_reruns(scenarios, rounds):
+    """Rerun latency of every path for a single user"""
+    latencies = []
+    per_path = {}
+    for _ in range(rounds):
+        for path_id, labels, _ in scenarios:
+            path_latencies = []
+            run_scenario(labels, path_latencies)
+            per_path.setdefault(path_id, []).extend(path_latencies)
+            latencies.extend(path_latencies)
+
+    return {
+        'overall': summarize(latencies),
+        'paths': {path_id: summarize(samples) for path_id, samples in per_path.items()},
+    }
+
+def bench_memory(scenarios, sessions):
+    """
+    Python heap retained per live session
+
+    Sessions are kept alive so their session state and element trees count;
+    tracemalloc slows execution, so this runs apart from the latency passes.
+    """
+    # Warm process-wide caches (catalog, tree, sequence index) first
+    run_scenario(scenarios[0][1], [])
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    alive = []
+    for i in range(sessions):
+        _, labels, _ = scenarios[i % len(scenarios)]
+        at, _ = new_session()
+        for label in labels:
+            click(at, label)
+        alive.append(at)
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {
+        'sessions': sessions,
+        'bytes_per_session': retained / sessions,
+        'peak_bytes': peak,
+    }
+
+def bench_throughput(scenarios, users, duration):
+    """
+    Completed reruns per second of N single-user processes walking paths
+
+    AppTest swaps a process-global mock runtime in and out around every
+    run, so sessions cannot overlap inside one interpreter; each simulated
+    user is a forked worker process instead. This is per-process
+    throughput, closer to N replicas serving one user each than to N
+    sessions sharing one Streamlit server (no GIL or lock contention
+    between sessions is measured).
+    """
+    # Workers are forked rather than submitted to a pool: AppTest replaces
+    # __main__ with the app script, so functions here cannot be pickled
+    context = multiprocessing.get_context('fork')
+    queue = context.Queue()
+    workers = [
+        context.Process(target=_throughput_user, args=(scenarios, i, duration, queue))
+        for i in range(users)
+    ]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = [sample for samples, _, _ in results for sample in samples]
+    sessions = sum(completed for _, completed, _ in results)
+    elapsed = max(seconds for _, _, seconds in results)
+    return {
+        'users': users,
+        'processes': users,
+        'seconds': elapsed,
+        'sessions': sessions,
+        'reruns': len(latencies),
+        'reruns_per_second': len(latencies) / elapsed,
+        'sessions_per_second': sessions / elapsed,
+        'latency': summarize(latencies),
+    }
+
+def _throughput_user(scenarios, index, duration, queue):
+    latencies = []
+    completed = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        _, labels, _ = scenarios[(index + completed) % len(scenarios)]
+        run_scenario(labels, latencies)
+        completed += 1
+    queue.put((latencies, completed, time.perf_counter() - start))
+
+def bench_functions(scenarios, iterations):
+    """Per-call latency of the helpers reruns depend on"""
+    from utils import load_video_paths, get_video_sequence
+    from search import get_search_index
+
+    def time_calls(func, args_list, count):
+        samples = []
+        for i in range(count):
+            args = args_list[i % len(args_list)]
+            start = time.perf_counter()
+            func(*args)
+            samples.append(time.perf_counter() - start)
+        return summarize(samples)
+
+    return {
+        # Rescans storage on every call, so far fewer iterations
+        'load_video_paths': time_calls(load_video_paths, [()], max(1, iterations // 100)),
+        'get_video_sequence': time_calls(get_video_sequence, [(selections,) for _, _, selections in scenarios], iterations),
+        'search': time_calls(get_search_index().search, [('heel',), ('sheet dress',), ('watch out for',)], iterations),
+    }
+
+#==============================================================================
+# STORAGE MODES
+#==============================================================================
+def minimal_mp4(duration_seconds=5):
+    """Bytes of a tiny faststart MP4 (ftyp, moov with mvhd, mdat)"""
+    def box(box_type, body):
+        return struct.pack('>I4s', 8 + len(body), box_type) + body
+
+    mvhd = box(b'mvhd', bytes(12) + struct.pack('>II', 1000, duration_seconds * 1000) + bytes(80))
+    return box(b'ftyp', b'isom' + bytes(4) + b'isom') + box(b'moov', mvhd) + box(b'mdat', bytes(1024))
+
+def configure_mode(mode):
+    """
+    Point the app at local storage or at an in-process S3 stand-in
+
+    Returns a context object to stop when the benchmark is done. Settings
+    are read from the environment, so this must run before the catalog is
+    first created.
+    """
+    if mode == 'local':
+        os.environ['USE_S3'] = 'False'
+        return None
+
+    try:
+        from moto import mock_aws
+    except ImportError:
+        # moto < 5
+        from moto import mock_s3 as mock_aws
+
+    os.environ.update({
+        'USE_S3': 'True',
+        'S3_BUCKET_NAME': BENCH_BUCKET,
+        'S3_PREFIX': BENCH_PREFIX,
+        'AWS_REGION': 'us-east-1',
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        # Refreshes would only add noise to the numbers
+        'S3_REFRESH_SECONDS': '0',
+        'CATALOG_TTL_SECONDS': '0',
+    })
+
+    mock = mock_aws()
+    mock.start()
+
+    import boto3
+    from decision_tree import get_decision_tree
+
+    client = boto3.client('s3', region_name='us-east-1')
+    client.create_bucket(Bucket=BENCH_BUCKET)
+    body = minimal_mp4()
+    for ref in get_decision_tree().titles:
+        client.upload_fileobj(io.BytesIO(body), BENCH_BUCKET, f"{BENCH_PREFIX}video_{ref.replace('.', '_')}.mp4")
+    return mock
+
+#==============================================================================
+# COLD START
+#==============================================================================
+COLD_START_CODE = """
+import sys, time, json
+start = time.perf_counter()
+import utils, catalog, decision_tree, sequence_index
+imported = time.perf_counter()
+catalog.get_catalog().videos()
+sequence_index.get_sequence_index()
+ready = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'first_catalog_seconds': ready - imported,
+    'total_seconds': ready - start,
+    'boto3_imported': 'boto3' in sys.modules,
+    'streamlit_imported': 'streamlit' in sys.modules,
+    'modules_loaded': len(sys.modules),
+}))
+"""
+
+def bench_cold_start(repeat):
+    """
+    Time importing the app's modules and building the catalog in fresh interpreters
+
+    The interpreter's own start-up is excluded; only the app's imports and
+    first catalog load are timed.
+    """
+    runs = []
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', COLD_START_CODE],
+            cwd=APP_DIR, capture_output=True, text=True, check=True
+        )
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    summary = {
+        key: summarize([run[key] for run in runs])
+        for key in ('import_seconds', 'first_catalog_seconds', 'total_seconds')
+    }
+    summary.update({key: runs[-1][key] for key in ('boto3_imported', 'streamlit_imported', 'modules_loaded')})
+    return summary
+
+#==============================================================================
+# RESULTS
+#==============================================================================
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(baseline_path, current_path, threshold):
+    """
+    Print latency changes between two result files
+
+    Returns False if any p50/p95/p99 got slower by more than the threshold.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    ok = True
+
+    def walk(old, new, name):
+        nonlocal ok
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in sorted(old.keys() & new.keys()):
+                walk(old[key], new[key], f"{name}.{key}" if name else key)
+        elif name.endswith(tuple(f'p{pct}_ms' for pct in PERCENTILES)) and old:
+            change = (new - old) / old
+            flag = ''
+            if change > threshold:
+                flag = '  << regression'
+                ok = False
+            print(f"{name}: {old:.3f} -> {new:.3f} ms ({change:+.1%}){flag}")
+
+    print(f"Baseline {baseline.get('commit')} vs current {current.get('commit')}")
+    walk(baseline.get('modes', {}), current.get('modes', {}), '')
+    return ok
+
+def run_mode(mode, args):
+    """Run every selected benchmark for one storage mode"""
+    mock = configure_mode(mode)
+    try:
+        from decision_tree import get_decision_tree
+        scenarios = enumerate_scenarios(get_decision_tree())
+        results = {'paths': [path_id for path_id, _, _ in scenarios]}
+
+        # First session pays for the catalog, tree and index builds
+        first_latencies = []
+        run_scenario(scenarios[0][1], first_latencies)
+        results['first_session'] = summarize(first_latencies)
+
+        results['reruns'] = bench_reruns(scenarios, args.rounds)
+        results['functions'] = bench_functions(scenarios, args.iterations)
+        results['memory'] = bench_memory(scenarios, args.memory_sessions)
+        results['throughput'] = [
+            bench_throughput(scenarios, users, args.duration)
+            for users in args.users
+        ]
+        return results
+    finally:
+        if mock is not None:
+            mock.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark rerun latency, memory and throughput of the Streamlit app")
+    parser.add_argument('--mode', choices=['local', 's3'], action='append',
+                        help="Storage mode to benchmark (repeatable, default: local)")
+    parser.add_argument('--rounds', type=int, default=3, help="Passes over every decision path for latency")
+    parser.add_argument('--users', type=int, nargs='+', default=[1, 4, 16], help="Simulated users, one process each")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per throughput run")
+    parser.add_argument('--iterations', type=int, default=10000, help="Calls per helper function benchmark")
+    parser.add_argument('--memory-sessions', type=int, default=50, help="Live sessions for the memory benchmark")
+    parser.add_argument('--cold-start', type=int, default=0, metavar='N', help="Also time N cold starts")
+    parser.add_argument('--output', help="Write JSON results to this file (default: stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two result files")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Slowdown counted as a regression by --compare")
+    parser.add_argument('--_child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(0 if compare(*args.compare, args.threshold) else 1)
+
+    modes = args.mode or ['local']
+
+    if args._child:
+        # Worker for a single mode: results go to stdout for the parent
+        print(json.dumps(run_mode(modes[0], args)))
+        return
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'rounds': args.rounds,
+            'users': args.users,
+            'duration': args.duration,
+            'iterations': args.iterations,
+            'memory_sessions': args.memory_sessions,
+        },
+        'modes': {},
+    }
+
+    # Each mode gets a fresh interpreter, since the catalog is process-wide
+    for mode in modes:
+        print(f"Benchmarking {mode} mode...", file=sys.stderr)
+        command = [sys.executable, os.path.abspath(__file__), '--_child', '--mode', mode,
+                   '--rounds', str(args.rounds), '--duration', str(args.duration),
+                   '--iterations', str(args.iterations), '--memory-sessions', str(args.memory_sessions),
+                   '--users', *map(str, args.users)]
+        child = subprocess.run(command, cwd=REPO_DIR, stdout=subprocess.PIPE, text=True, check=True)
+        results['modes'][mode] = json.loads(child.stdout.strip().splitlines()[-1])
+
+    if args.cold_start:
+        print("Timing cold starts...", file=sys.stderr)
+        results['cold_start'] = bench_cold_start(args.cold_start)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+import urllib.request
+
+from bench_app import APP_DIR, APP_SCRIPT, summarize, git_commit
+
+#==============================================================================
+# LOAD TEST SETTINGS
+#==============================================================================
+# Ports of replicas started by --replicas (one per replica, counting up)
+FIRST_REPLICA_PORT = 8601
+
+# Seconds a replica may take to answer its health check after starting
+STARTUP_TIMEOUT = 60
+
+# Seconds a single rerun may take before the user gives up
+RERUN_TIMEOUT = 30
+
+#==============================================================================
+# STREAMLIT WEBSOCKET CLIENT
+#==============================================================================
+# Each simulated user is a browser session: one websocket on /_stcore/stream
+# that asks for script reruns exactly like the frontend does, so the load
+# goes through the same proxy, session and script runner code as real users.
+def final_path_slugs():
+    """Return the ?path= value of every complete decision path"""
+    from decision_tree import get_decision_tree, path_slug, FINAL_STEP
+    tree = get_decision_tree()
+    return sorted(path_slug(path) for path, step in tree.path_steps.items() if step == FINAL_STEP)
+
+def _stream_url(base_url):
+    return base_url.rstrip('/').replace('http://', 'ws://', 1).replace('https://', 'wss://', 1) + '/_stcore/stream'
+
+async def _rerun(connection, slug):
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    message = BackMsg()
+    message.rerun_script.query_string = f"path={slug}"
+    await connection.write_message(message.SerializeToString(), binary=True)
+
+    while True:
+        payload = await asyncio.wait_for(connection.read_message(), RERUN_TIMEOUT)
+        if payload is None:
+            raise ConnectionError("websocket closed during a rerun")
+        reply = ForwardMsg.FromString(payload)
+        if reply.WhichOneof('type') != 'script_finished':
+            continue
+        # Runs that end early for st.rerun are followed by another run
+        if reply.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY:
+            return
+        if reply.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+            raise RuntimeError("app.py failed to compile")
+
+async def _user(base_url, slugs, deadline, latencies, seed):
+    from tornado.websocket import websocket_connect
+
+    rng = random.Random(seed)
+    connection = await websocket_connect(_stream_url(base_url), subprotocols=['streamlit'])
+    try:
+        while time.monotonic() < deadline:
+            # Every rerun deep-links to another complete path
+            start = time.perf_counter()
+            await _rerun(connection, rng.choice(slugs))
+            latencies.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+
+def _client_process(targets, slugs, duration, seed, queue):
+    async def run():
+        latencies = []
+        deadline = time.monotonic() + duration
+        await asyncio.gather(*(
+            _user(url, slugs, deadline, latencies, seed + i)
+            for i, url in enumerate(targets)
+        ))
+        return latencies
+
+    start = time.perf_counter()
+    latencies = asyncio.run(run())
+    queue.put((latencies, time.perf_counter() - start))
+
+def run_load(targets, slugs, duration, client_processes):
+    """
+    Drive one websocket user per target URL for duration seconds
+
+    Users are spread over several client processes so that parsing the
+    replicas' replies does not become the bottleneck being measured.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    client_processes = max(1, min(client_processes, len(targets)))
+    workers = [
+        context.Process(target=_client_process,
+                        args=(targets[i::client_processes], slugs, duration, i * 1000, queue))
+        for i in range(client_processes)
+    ]
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+
+    latencies = [sample for samples, _ in results for sample in samples]
+    elapsed = max(seconds for _, seconds in results)
+    return {
+        'users': len(targets),
+        'seconds': elapsed,
+        'reruns': len(latencies),
+        'reruns_per_second': len(latencies) / elapsed,
+        'latency': summarize(latencies),
+    }
+
+#==============================================================================
+# LOCAL REPLICAS
+#==============================================================================
+def publish_snapshot(path):
+    """Publish the catalog snapshot once, like the refresher service does"""
+    subprocess.run(
+        [sys.executable, 'shared_catalog.py', '--once', '--path', path],
+        cwd=APP_DIR, check=True, stdout=subprocess.DEVNULL
+    )
+
+def start_replicas(count, snapshot_path):
+    """Start count Streamlit replicas serving the shared snapshot"""
+    env = dict(os.environ, CATALOG_ROLE='replica', CATALOG_SNAPSHOT_PATH=snapshot_path,
+               LOCAL_VIDEO_SERVER='False', METRICS_PORT='0')
+    replicas = []
+    for i in range(count):
+        port = FIRST_REPLICA_PORT + i
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'streamlit', 'run', APP_SCRIPT,
+             f'--server.port={port}', '--server.headless=true',
+             '--server.fileWatcherType=none', '--browser.gatherUsageStats=false'],
+            cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        replicas.append((f"http://localhost:{port}", process))
+
+    for url, process in replicas:
+        _wait_healthy(url, process)
+    return replicas
+
+def stop_replicas(replicas):
+    for _, process in replicas:
+        process.terminate()
+    for _, process in replicas:
+        try:
+            process.wait(10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def _wait_healthy(url, process):
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Replica {url} exited with status {process.returncode}")
+        try:
+            with urllib.request.urlopen(f"{url}/_stcore/health", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise RuntimeError(f"Replica {url} did not become healthy within {STARTUP_TIMEOUT}s")
+
+def bench_scaling(replica_counts, users_per_replica, duration, client_processes):
+    """
+    Throughput with 1..N replicas on this host at a fixed load per replica
+
+    Users are pinned to replicas round-robin, as the proxy's sticky
+    sessions do. Near-linear scaling shows up as a speedup close to the
+    replica count (an efficiency close to 1).
+    """
+    if max(replica_counts) > (os.cpu_count() or 1):
+        print(f"Warning: more replicas than the {os.cpu_count()} CPU(s) here; they will share cores", file=sys.stderr)
+
+    slugs = final_path_slugs()
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, 'catalog.json')
+        publish_snapshot(snapshot_path)
+
+        for count in replica_counts:
+            print(f"Load testing {count} replica(s)...", file=sys.stderr)
+            replicas = start_replicas(count, snapshot_path)
+            try:
+                targets = [replicas[i % count][0] for i in range(count * users_per_replica)]
+                # Let every replica load the catalog and compile the script once
+                run_load([url for url, _ in replicas], slugs, 1, client_processes)
+                result = run_load(targets, slugs, duration, client_processes)
+            finally:
+                stop_replicas(replicas)
+            result['replicas'] = count
+            results.append(result)
+
+    base = results[0]['reruns_per_second'] / results[0]['replicas']
+    for result in results:
+        result['speedup'] = result['reruns_per_second'] / base
+        result['efficiency'] = result['speedup'] / result['replicas']
+    return results
+
+#==============================================================================
+# COMMAND LINE
+#==============================================================================
+def main():
+    parser = argparse.ArgumentParser(description="Load test app replicas through Streamlit's websocket protocol")
+    parser.add_argument('--url', help="Load test a running deployment (e.g. the proxy at http://localhost:8080)")
+    parser.add_argument('--replicas', type=int, nargs='+', default=[1, 2, 4],
+                        help="Start this many local replicas per run (default: 1 2 4)")
+    parser.add_argument('--users', type=int, default=8,
+                        help="Concurrent users (per replica when starting replicas)")
+    parser.add_argument('--duration', type=float, default=20, help="Seconds per run")
+    parser.add_argument('--client-processes', type=int, default=os.cpu_count() or 1,
+                        help="Processes simulating the users")
+    parser.add_argument('--output', help="Write JSON results to this file (default: stdout)")
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'settings': {'users': args.users, 'duration': args.duration},
+    }
+
+    if args.url:
+        results['target'] = args.url
+        results['load'] = run_load([args.url] * args.users, final_path_slugs(), args.duration,
+                                   args.client_processes)
+    else:
+        results['scaling'] = bench_scaling(args.replicas, args.users, args.duration,
+                                           args.client_processes)
+        for result in results['scaling']:
+            print(f"{result['replicas']} replica(s): {result['reruns_per_second']:.1f} reruns/s, "
+                  f"speedup {result['speedup']:.2f}x, efficiency {result['efficiency']:.0%}, "
+                  f"p95 {result['latency'].get('p95_ms', 0):.1f} ms", file=sys.stderr)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+        print(f"Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+from catalog import get_catalog
+from decision_tree import get_decision_tree, FINAL_STEP
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'app.py')
+
+@pytest.fixture
+def lazy_playback(monkeypatch):
+    """Lazy playback with preloading, every video served from a CDN URL"""
+    monkeypatch.setenv('LAZY_PLAYBACK', 'True')
+    monkeypatch.setenv('PRELOAD_NEXT_VIDEO', 'True')
+    monkeypatch.setattr(get_catalog(), 'get', lambda ref, default=None: f"http://cdn.example/{ref}.mp4")
+
+def open_final_page(path):
+    tree = get_decision_tree()
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.session_state['current_step'] = FINAL_STEP
+    at.session_state['selected_videos'] = tree.selections_for(path)
+    return at
+
+def srcdocs(at):
+    return [element.proto.srcdoc for element in at.get('iframe')]
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_next_video_is_preloaded(lazy_playback):
+    tree = get_decision_tree()
+    path, sequence = next((path, refs) for path, refs in sorted(tree.sequences.items()) if len(refs) > 1)
+    at = open_final_page(path).run()
+    assert not at.exception
+
+    next_ref = list(sequence)[1]
+    preloads = [doc for doc in srcdocs(at) if 'preload="auto"' in doc]
+    assert preloads == [f'<video src="http://cdn.example/{next_ref}.mp4" preload="auto" muted playsinline></video>']
+
+def test_last_video_preloads_nothing(lazy_playback):
+    tree = get_decision_tree()
+    path, sequence = next((path, refs) for path, refs in sorted(tree.sequences.items()) if len(refs) > 1)
+    at = open_final_page(path)
+    at.session_state['current_video'] = len(sequence) - 1
+    at.run()
+    assert not at.exception
+    assert not any('preload="auto"' in doc for doc in srcdocs(at))
@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+import telemetry
+from decision_tree import get_decision_tree, FINAL_STEP
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+APP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'app.py')
+
+@pytest.fixture
+def events(monkeypatch):
+    """Telemetry events the app records, as (kind, fields) pairs"""
+    recorded = []
+    monkeypatch.setattr(telemetry, 'record', lambda kind, **fields: recorded.append((kind, fields)) or True)
+    return recorded
+
+def open_final_page(path):
+    tree = get_decision_tree()
+    at = AppTest.from_file(APP_SCRIPT, default_timeout=30)
+    at.session_state['current_step'] = FINAL_STEP
+    at.session_state['selected_videos'] = tree.selections_for(path)
+    return at
+
+def kinds(events):
+    return [kind for kind, _ in events]
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_reruns_do_not_record_plays_again(events):
+    tree = get_decision_tree()
+    path = sorted(tree.sequences)[0]
+    at = open_final_page(path).run()
+    assert not at.exception
+
+    refs = list(tree.sequences[path])
+    assert kinds(events) == ['step', 'sequence'] + ['play'] * len(refs)
+    assert [fields['ref'] for kind, fields in events if kind == 'play'] == refs
+
+    # Widget interactions and other reruns stay on the same page
+    events.clear()
+    at.run()
+    at.run()
+    assert events == []
+
+def test_moving_to_another_path_records_again(events):
+    tree = get_decision_tree()
+    first, second = sorted(tree.sequences)[:2]
+    at = open_final_page(first).run()
+
+    events.clear()
+    at.session_state['selected_videos'] = tree.selections_for(second)
+    at.run()
+    assert kinds(events) == ['step', 'sequence'] + ['play'] * len(tree.sequences[second])
@@ -0,0 +1,89 @@
+import time
+
+import pytest
+
+from catalog import LocalVideoCatalog
+from manifest import MANIFEST_FORMAT, CatalogManifest, describe_local, save_manifest
+
+pytest.importorskip('watchdog')
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+def manifest_data(video_dir, version):
+    return {
+        'format': MANIFEST_FORMAT,
+        'version': version,
+        'backend': 'local',
+        'source': {'video_dir': str(video_dir)},
+        'videos': describe_local(str(video_dir), 2),
+    }
+
+@pytest.fixture
+def video_dir(tmp_path):
+    directory = tmp_path / 'videos'
+    directory.mkdir()
+    (directory / 'video_1_1.mp4').write_bytes(b'first')
+    return directory
+
+@pytest.fixture
+def watched():
+    catalogs = []
+    yield catalogs
+    for catalog in catalogs:
+        catalog.stop_watching()
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_watcher_updates_single_references_and_disables_the_ttl(video_dir, watched):
+    catalog = LocalVideoCatalog(str(video_dir), ttl=300, probe_media=False)
+    assert list(catalog.videos()) == ['1.1']
+    catalog.start_watching()
+    watched.append(catalog)
+    assert not catalog._needs_refresh()
+    assert catalog._ttl == 0
+
+    (video_dir / 'video_2_3.mov').write_bytes(b'second')
+    wait_for(lambda: '2.3' in catalog.videos())
+    # MP4 wins over MOV for the same reference
+    (video_dir / 'video_2_3.mp4').write_bytes(b'second')
+    wait_for(lambda: catalog.videos()['2.3'].endswith('.mp4'))
+
+    (video_dir / 'video_1_1.mp4').unlink()
+    wait_for(lambda: '1.1' not in catalog.videos())
+
+def test_ttl_rescans_without_a_watcher(video_dir):
+    catalog = LocalVideoCatalog(str(video_dir), ttl=300, probe_media=False)
+    catalog.videos()
+    assert not catalog._needs_refresh()
+    catalog._loaded_at -= 301
+    assert catalog._needs_refresh()
+
+def test_manifest_catalog_serves_only_listed_files(video_dir, tmp_path, watched):
+    manifest_path = tmp_path / 'catalog.json'
+    save_manifest(str(manifest_path), manifest_data(video_dir, 'v1'))
+    catalog = LocalVideoCatalog(str(video_dir), probe_media=False,
+                                manifest=CatalogManifest(manifest_data(video_dir, 'v1')))
+    assert list(catalog.videos()) == ['1.1']
+    catalog.start_watching(str(manifest_path))
+    watched.append(catalog)
+    version = catalog.version
+
+    # A file the manifest does not list is not served
+    (video_dir / 'video_2_3.mp4').write_bytes(b'unlisted')
+    time.sleep(0.5)
+    assert list(catalog.videos()) == ['1.1']
+    assert catalog.version == version
+
+    # A recompiled manifest is picked up
+    save_manifest(str(manifest_path), manifest_data(video_dir, 'v2'))
+    wait_for(lambda: '2.3' in catalog.videos())
+    assert catalog.manifest.version == 'v2'
+    assert catalog.version > version
@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from decision_tree import (
+    CompiledDecisionTree, load_decision_tree, canonical_path, path_slug, format_step_text, FINAL_STEP,
+)
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+def definition(**steps):
+    return {
+        'start': 'kind',
+        'common_tail': ['9.0'],
+        'titles': {'1.1': 'Small wound'},
+        'steps': steps or {
+            'kind': {
+                'header': 'Kind', 'selection_key': 'kind', 'columns': 2,
+                'options': [
+                    {'value': 'small', 'label': 'Small', 'video_ref': '1.1', 'next': 'place'},
+                    {'value': 'large', 'label': 'Large', 'column': 1, 'next': 'place'},
+                    {'value': 'other', 'label': 'Other', 'column': 1, 'video_ref': '1.3'},
+                ],
+            },
+            'place': {
+                'header': 'Place', 'subheader': 'A {kind} wound', 'selection_key': 'place',
+                'options': [
+                    {'value': 'heel', 'label': 'Heel', 'video_ref': '2.1',
+                     'next': {'kind': {'small': 'final', 'large': 'dressing'}}},
+                ],
+            },
+            'dressing': {
+                'header': 'Dressing', 'selection_key': 'dressing',
+                'options': [{'value': 'sheet', 'label': 'Sheet', 'video_ref': '3.1', 'next': 'final'}],
+            },
+        },
+    }
+
+SMALL_HEEL = (('kind', 'small'), ('place', 'heel'))
+LARGE_HEEL_SHEET = (('kind', 'large'), ('place', 'heel'), ('dressing', 'sheet'))
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_transition_table():
+    tree = CompiledDecisionTree(definition())
+    assert dict(tree.path_steps) == {
+        (): 'kind',
+        (('kind', 'small'),): 'place',
+        (('kind', 'large'),): 'place',
+        (('kind', 'other'),): FINAL_STEP,
+        SMALL_HEEL: FINAL_STEP,
+        (('kind', 'large'), ('place', 'heel')): 'dressing',
+        LARGE_HEEL_SHEET: FINAL_STEP,
+    }
+    assert dict(tree.sequences) == {
+        (('kind', 'other'),): ('1.3', '9.0'),
+        SMALL_HEEL: ('1.1', '2.1', '9.0'),
+        LARGE_HEEL_SHEET: ('2.1', '3.1', '9.0'),
+    }
+
+    step = tree.steps['kind']
+    assert tree.next_step((), step, step.options[1]) == 'place'
+    assert tree.step_for_path((('kind', 'missing'),)) is None
+    assert tree.sequence_for((('kind', 'small'),)) is None
+
+def test_compiled_tables_are_read_only():
+    tree = CompiledDecisionTree(definition())
+    with pytest.raises(TypeError):
+        tree.sequences[()] = ('1.1',)
+    with pytest.raises(TypeError):
+        tree.steps['kind'].options[0].selection['video_ref'] = '9.9'
+
+def test_slugs_and_selections_round_trip():
+    tree = CompiledDecisionTree(definition())
+    assert tree.path_for_slug('/large/heel/sheet/') == LARGE_HEEL_SHEET
+    assert tree.path_for_slug('large/toes') is None
+
+    selections = tree.selections_for(SMALL_HEEL)
+    assert selections == [{'kind': 'small', 'video_ref': '1.1'}, {'place': 'heel', 'video_ref': '2.1'}]
+    assert canonical_path(selections) == SMALL_HEEL
+    assert path_slug(SMALL_HEEL) == 'small/heel'
+
+def test_titles_and_step_text():
+    tree = CompiledDecisionTree(definition())
+    assert tree.title_for('1.1') == 'Small wound'
+    assert tree.title_for('2.1') == 'Video 2.1'
+    assert format_step_text(tree.steps['place'].subheader, (('kind', 'multiple_toes'),)) == 'A Multiple Toes wound'
+
+@pytest.mark.parametrize('broken, message', [
+    ({'kind': {'header': 'Kind', 'selection_key': 'kind',
+               'options': [{'value': 'a', 'label': 'A', 'next': 'nowhere'}]}}, 'unknown step'),
+    ({'kind': {'header': 'Kind', 'selection_key': 'kind',
+               'options': [{'value': 'a', 'label': 'A', 'next': 'kind'}]}}, 'cycle'),
+    ({'kind': {'header': 'Kind', 'selection_key': 'kind', 'options': []}}, 'at least one option'),
+    ({'kind': {'header': 'Kind', 'selection_key': 'kind',
+               'options': [{'value': 'a', 'label': 'A', 'column': 1}]}}, 'column 1 of 1'),
+    ({'kind': {'header': 'Kind', 'selection_key': 'kind',
+               'options': [{'value': 'a', 'label': 'A', 'next': {'kind': {'b': 'final'}}}]}}, 'no next step'),
+])
+def test_invalid_definitions(broken, message):
+    with pytest.raises(ValueError, match=message):
+        CompiledDecisionTree(definition(**broken))
+
+def test_shipped_tree_keeps_the_original_sequences():
+    tree = load_decision_tree()
+    tail = ('4.0', '5.0')
+    assert len(tree.sequences) == 12
+    assert tree.sequence_for((('type_of_wound', 'webspace'),)) == ('2.3',) + tail
+    assert tree.sequence_for(tree.path_for_slug('superficial/toes/sheet')) == ('3.1', '2.1.1') + tail
+    assert tree.sequence_for(tree.path_for_slug('superficial/heel/iodosorb')) == ('3.3', '2.1.2') + tail
+    assert tree.sequence_for(tree.path_for_slug('cavity/midfoot/cavity_primary')) == ('3.2', '2.2.1') + tail
+
+def test_load_records_fingerprint(tmp_path):
+    path = tmp_path / 'tree.json'
+    path.write_text(json.dumps(definition()))
+    first = load_decision_tree(str(path))
+
+    changed = definition()
+    changed['common_tail'] = ['9.1']
+    path.write_text(json.dumps(changed))
+    second = load_decision_tree(str(path))
+    assert first.fingerprint != second.fingerprint
+    assert second.sequence_for(SMALL_HEEL) == ('1.1', '2.1', '9.1')
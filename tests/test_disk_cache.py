@@ -0,0 +1,88 @@
+import os
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from disk_cache import DiskCache, PARTIAL_SUFFIX, STALE_PARTIAL_SECONDS
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+BUCKET = 'wound-care-cache-test'
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        for name, size in [('a', 40), ('b', 40), ('c', 40), ('big', 200)]:
+            client.put_object(Bucket=BUCKET, Key=f"videos/{name}.mp4", Body=b'x' * size)
+        yield client
+
+def make_cache(s3, cache_dir, max_bytes=100):
+    return DiskCache(str(cache_dir), max_bytes, s3, BUCKET, fetch_workers=2)
+
+def cached_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if not name.endswith(PARTIAL_SUFFIX))
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_least_recently_used_file_is_evicted(s3, tmp_path):
+    cache = make_cache(s3, tmp_path)
+    path_a = cache.fetch('videos/a.mp4')
+    path_b = cache.fetch('videos/b.mp4')
+    assert open(path_a, 'rb').read() == b'x' * 40
+
+    # A hit makes a the most recently used, so b goes first
+    assert cache.get('videos/a.mp4') == path_a
+    path_c = cache.fetch('videos/c.mp4')
+    assert cache.size == 80
+    assert not os.path.exists(path_b)
+    assert os.path.exists(path_a) and os.path.exists(path_c)
+
+def test_miss_downloads_in_the_background(s3, tmp_path):
+    cache = make_cache(s3, tmp_path)
+    assert cache.get('videos/a.mp4') is None
+    cache._pending[DiskCache.filename_for('videos/a.mp4', None)].result()
+    assert cache.get('videos/a.mp4') is not None
+
+def test_object_larger_than_the_cache_is_not_kept(s3, tmp_path):
+    cache = make_cache(s3, tmp_path)
+    cache.fetch('videos/a.mp4')
+    cache.fetch('videos/b.mp4')
+    before = cached_files(tmp_path)
+
+    # Known size: refused up front; unknown size: discarded after the download
+    assert cache.fetch('videos/big.mp4', size=200) is None
+    assert cache.fetch('videos/big.mp4') is None
+    assert cache.get('videos/big.mp4', size=200) is None
+    assert cached_files(tmp_path) == before
+    assert cache.size == 80
+
+def test_replaced_object_drops_the_older_version(s3, tmp_path):
+    cache = make_cache(s3, tmp_path)
+    old = cache.fetch('videos/a.mp4', etag='"v1"')
+    new = cache.fetch('videos/a.mp4', etag='"v2"')
+    assert old != new
+    assert not os.path.exists(old) and os.path.exists(new)
+
+def test_restart_keeps_files_and_recent_partials(s3, tmp_path):
+    cache = make_cache(s3, tmp_path)
+    path = cache.fetch('videos/a.mp4')
+
+    # Another replica's running download and a crashed one
+    running = tmp_path / f"running.mp4.123{PARTIAL_SUFFIX}"
+    crashed = tmp_path / f"crashed.mp4.456{PARTIAL_SUFFIX}"
+    running.write_bytes(b'partial')
+    crashed.write_bytes(b'partial')
+    stale = time.time() - STALE_PARTIAL_SECONDS - 60
+    os.utime(crashed, (stale, stale))
+
+    restarted = make_cache(s3, tmp_path)
+    assert restarted.get('videos/a.mp4') == path
+    assert restarted.size == 40
+    assert running.exists()
+    assert not crashed.exists()
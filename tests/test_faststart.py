@@ -0,0 +1,146 @@
+import os
+import struct
+
+import pytest
+
+from faststart import rewrite_faststart, rewrite_all
+from mp4info import iter_boxes, probe_file
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+CHUNKS = [b'first chunk of media', b'second', b'third and last chunk']
+
+def box(box_type, payload=b''):
+    return struct.pack('>I4s', 8 + len(payload), box_type) + payload
+
+def offsets_box(box_type, offsets):
+    fmt = '>I' if box_type == b'stco' else '>Q'
+    return box(box_type, struct.pack('>II', 0, len(offsets)) + b''.join(struct.pack(fmt, o) for o in offsets))
+
+def moov(stco_offsets, co64_offsets):
+    mvhd = box(b'mvhd', bytes(12) + struct.pack('>II', 1000, 5000) + bytes(80))
+    stbl = box(b'stbl', offsets_box(b'stco', stco_offsets) + offsets_box(b'co64', co64_offsets))
+    return box(b'moov', mvhd + box(b'trak', box(b'mdia', box(b'minf', stbl))))
+
+def write_video(path, faststart=False):
+    """
+    Write a minimal MP4 whose stco/co64 tables point at CHUNKS in the mdat
+
+    Returns the offsets of the chunks in the file.
+    """
+    ftyp = box(b'ftyp', b'isom' + bytes(4))
+    mdat_payload = b''.join(CHUNKS)
+    relative = [sum(len(c) for c in CHUNKS[:i]) for i in range(len(CHUNKS))]
+
+    # The moov size does not depend on the offset values
+    moov_size = len(moov([0, 0], [0]))
+    mdat_offset = len(ftyp) + (moov_size if faststart else 0)
+    offsets = [mdat_offset + 8 + r for r in relative]
+    movie = moov(offsets[:2], [offsets[2]])
+    mdat = box(b'mdat', mdat_payload)
+
+    boxes = [ftyp, movie, mdat] if faststart else [ftyp, mdat, box(b'free', bytes(16)), movie]
+    path.write_bytes(b''.join(boxes))
+    return offsets
+
+def chunk_offsets(path):
+    """Return the stco and co64 entries of a file, in table order"""
+    data = path.read_bytes()
+
+    def read_at(offset, length):
+        return data[offset:offset + length]
+
+    offsets = []
+
+    def walk(start, end):
+        for box_type, offset, size, header_size in iter_boxes(read_at, start, end):
+            if box_type in (b'moov', b'trak', b'mdia', b'minf', b'stbl'):
+                walk(offset + header_size, offset + size)
+            elif box_type in (b'stco', b'co64'):
+                fmt, width = ('>I', 4) if box_type == b'stco' else ('>Q', 8)
+                count = struct.unpack_from('>I', data, offset + header_size + 4)[0]
+                table = offset + header_size + 8
+                offsets.extend(struct.unpack_from(fmt, data, table + i * width)[0] for i in range(count))
+
+    walk(0, len(data))
+    return offsets
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_moves_moov_and_rewrites_chunk_offsets(tmp_path):
+    path = tmp_path / 'video_1_1.mp4'
+    write_video(path)
+    size = path.stat().st_size
+    info = probe_file(str(path))
+    assert info['valid'] and not info['faststart']
+
+    assert rewrite_faststart(str(path)) == 'rewritten'
+
+    info = probe_file(str(path))
+    assert info['valid'] and info['faststart']
+    assert info['duration'] == 5
+    assert path.stat().st_size == size
+
+    # Every chunk offset, stco and co64, still points at its chunk
+    data = path.read_bytes()
+    offsets = chunk_offsets(path)
+    assert [data[o:o + len(c)] for o, c in zip(offsets, CHUNKS)] == CHUNKS
+    assert not os.path.exists(str(path) + '.faststart.tmp')
+
+def test_offsets_outside_media_data_are_kept(tmp_path):
+    path = tmp_path / 'video_1_1.mp4'
+    write_video(path)
+    data = bytearray(path.read_bytes())
+
+    # Point the co64 entry into the ftyp, in front of the media data
+    co64 = data.index(b'co64')
+    struct.pack_into('>Q', data, co64 + 12, 4)
+    path.write_bytes(bytes(data))
+
+    rewrite_faststart(str(path))
+    assert chunk_offsets(path)[2] == 4
+
+def test_faststart_file_is_left_alone(tmp_path):
+    path = tmp_path / 'video_1_1.mp4'
+    offsets = write_video(path, faststart=True)
+    before = path.read_bytes()
+
+    assert rewrite_faststart(str(path)) == 'already faststart'
+    assert path.read_bytes() == before
+    assert chunk_offsets(path) == offsets
+
+def test_placeholder_is_skipped(tmp_path):
+    path = tmp_path / 'video_1_1.mp4'
+    path.write_text('placeholder')
+    assert rewrite_faststart(str(path)).startswith('skipped')
+    assert path.read_text() == 'placeholder'
+
+def test_compressed_movie_header_fails_without_touching_the_file(tmp_path):
+    path = tmp_path / 'video_1_1.mp4'
+    write_video(path)
+    data = path.read_bytes().replace(b'stbl', b'cmov')
+    path.write_bytes(data)
+
+    with pytest.raises(ValueError):
+        rewrite_faststart(str(path))
+    assert path.read_bytes() == data
+    assert os.listdir(tmp_path) == ['video_1_1.mp4']
+
+def test_rewrite_all(tmp_path, capsys):
+    write_video(tmp_path / 'video_1_1.mp4')
+    write_video(tmp_path / 'video_1_2.mp4', faststart=True)
+    (tmp_path / 'video_1_3.mp4').write_text('placeholder')
+    (tmp_path / 'notes.mp4').write_text('not a catalog video')
+
+    assert rewrite_all(str(tmp_path), workers=1, dry_run=True)
+    assert not probe_file(str(tmp_path / 'video_1_1.mp4'))['faststart']
+
+    assert rewrite_all(str(tmp_path), workers=1)
+    assert probe_file(str(tmp_path / 'video_1_1.mp4'))['faststart']
+    output = capsys.readouterr().out
+    assert 'video_1_1.mp4: rewritten' in output
+    assert 'video_1_2.mp4: already faststart' in output
+    assert 'video_1_3.mp4: skipped' in output
+    assert 'notes.mp4' not in output
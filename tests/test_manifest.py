@@ -0,0 +1,130 @@
+import threading
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import manifest
+import s3_catalog
+from config import get_config
+from manifest import CatalogManifest, build_manifest, load_manifest, save_manifest, verify_manifest
+from video_server import VideoServer
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+BUCKET = 'wound-care-manifest-test'
+
+# Smallest file the MP4 probe accepts: an empty moov box
+VIDEO = b'\x00\x00\x00\x08moov'
+
+@pytest.fixture
+def video_dir(tmp_path, monkeypatch):
+    directory = tmp_path / 'videos'
+    directory.mkdir()
+    (directory / 'video_2_3.mp4').write_bytes(VIDEO)
+    (directory / 'video_2_3.mov').write_bytes(VIDEO + b'mov')
+    (directory / 'video_4_0.mov').write_bytes(VIDEO)
+    (directory / 'notes.txt').write_text('not a video')
+    monkeypatch.setattr(manifest, 'get_local_video_dir', lambda: str(directory))
+    return directory
+
+@pytest.fixture
+def s3_config(monkeypatch):
+    monkeypatch.setattr(s3_catalog, '_clients', {})
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        client.put_object(Bucket=BUCKET, Key='videos/video_2_3.mp4', Body=VIDEO, Metadata={'sha256': 'abc'})
+        client.put_object(Bucket=BUCKET, Key='videos/video_5_0.mp4', Body=VIDEO)
+        config = dict(get_config(), S3_BUCKET_NAME=BUCKET, S3_PREFIX='videos/', S3_ENDPOINT_URL='')
+        yield client, config
+
+@pytest.fixture
+def http_server(video_dir):
+    server = VideoServer(('127.0.0.1', 0), str(video_dir))
+    threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def saved(tmp_path, data):
+    path = str(tmp_path / 'catalog_manifest.json')
+    save_manifest(path, data)
+    return load_manifest(path)
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_build_local(video_dir):
+    data = build_manifest(backend='local', workers=2)
+    videos = data['videos']
+
+    # MP4 wins over MOV; every tree reference is listed, present or not
+    assert videos['2.3']['key'] == 'video_2_3.mp4'
+    assert videos['2.3']['title'] == 'Webspace Wound Treatment'
+    assert videos['2.3']['size'] == len(VIDEO)
+    assert videos['2.3']['media']['valid']
+    assert videos['4.0']['format'] == 'mov'
+    assert videos['5.0'] == {'title': 'Things to watch out for', 'key': None}
+    assert data['source'] == {'video_dir': str(video_dir)}
+
+    # Unchanged storage compiles to the same version
+    assert build_manifest(backend='local', workers=2)['version'] == data['version']
+    (video_dir / 'video_5_0.mp4').write_bytes(VIDEO)
+    assert build_manifest(backend='local', workers=2)['version'] != data['version']
+
+def test_verify_local(video_dir, tmp_path):
+    loaded = saved(tmp_path, build_manifest(backend='local', workers=2))
+    assert sorted(loaded.available()) == ['2.3', '4.0']
+    assert verify_manifest(loaded, workers=2) == []
+
+    # Same size, other content: only a deep check re-hashes
+    (video_dir / 'video_2_3.mp4').write_bytes(VIDEO[::-1])
+    assert verify_manifest(loaded, workers=2) == []
+    assert verify_manifest(loaded, workers=2, deep=True) == [('2.3', 'content hash changed')]
+
+    (video_dir / 'video_2_3.mp4').write_bytes(VIDEO * 2)
+    (video_dir / 'video_4_0.mov').unlink()
+    problems = dict(verify_manifest(loaded, workers=2))
+    assert problems['2.3'] == f"size changed ({len(VIDEO)} -> {2 * len(VIDEO)})"
+    assert problems['4.0'].startswith('missing file')
+
+def test_build_and_verify_s3(s3_config, tmp_path):
+    client, config = s3_config
+    data = build_manifest(config, backend='s3', workers=2)
+    videos = data['videos']
+    assert videos['2.3']['key'] == 'videos/video_2_3.mp4'
+    assert videos['2.3']['sha256'] == 'abc'
+    assert videos['2.3']['url'] == f"https://{BUCKET}.s3.us-east-1.amazonaws.com/videos/video_2_3.mp4"
+    assert videos['2.3']['etag']
+    assert videos['5.0']['media']['valid']
+    assert data['source'] == {'bucket': BUCKET, 'prefix': 'videos/'}
+
+    loaded = saved(tmp_path, data)
+    assert verify_manifest(loaded, config, workers=2) == []
+
+    # Same size, other content: the ETag gives it away
+    client.put_object(Bucket=BUCKET, Key='videos/video_2_3.mp4', Body=VIDEO[::-1])
+    client.delete_object(Bucket=BUCKET, Key='videos/video_5_0.mp4')
+    problems = dict(verify_manifest(loaded, config, workers=2))
+    assert problems['2.3'] == 'ETag changed'
+    assert problems['5.0'].startswith('check failed')
+
+def test_build_and_verify_http(http_server, video_dir, tmp_path):
+    config = dict(get_config(), HTTP_VIDEO_BASE_URL=f"{http_server.public_url}/videos", HTTP_VIDEO_EXTENSION='.mp4')
+    data = build_manifest(config, backend='http', workers=2)
+    videos = data['videos']
+    assert videos['2.3']['url'] == f"{http_server.public_url}/videos/video_2_3.mp4"
+    assert videos['2.3']['media']['valid']
+    # Only the .mp4 extension is published under the base URL
+    assert videos['4.0']['key'] is None
+
+    loaded = saved(tmp_path, data)
+    assert verify_manifest(loaded, config, workers=2) == []
+    (video_dir / 'video_2_3.mp4').write_bytes(VIDEO * 3)
+    assert verify_manifest(loaded, config, workers=2) == [('2.3', f"size changed ({len(VIDEO)} -> {3 * len(VIDEO)})")]
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError, match='Unsupported manifest format'):
+        CatalogManifest({'format': 99, 'version': 'x', 'backend': 'local', 'videos': {}})
@@ -0,0 +1,137 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import presign
+from presign import PresignedUrlCache
+from s3_catalog import S3VideoCatalog
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+BUCKET = 'wound-care-presign-test'
+
+class SigningClient:
+    """Stands in for an S3 client; every signature gives a new URL"""
+
+    def __init__(self):
+        self.signed = []
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        self.signed.append(Params['Key'])
+        return f"https://{Params['Bucket']}.example/{Params['Key']}?sig={len(self.signed)}&expires={ExpiresIn}"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(presign.time, 'time', clock)
+    return clock
+
+@pytest.fixture
+def client():
+    return SigningClient()
+
+@pytest.fixture
+def cache(client, clock):
+    cache = PresignedUrlCache(client, BUCKET, expires_in=3600, renew_before=300)
+    # Renewal is driven by the tests, not the background thread
+    cache.stop()
+    return cache
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_url_is_reused_until_renewal(cache, client, clock):
+    url = cache.get('1.1', 'videos/video_1_1.mp4')
+    clock.now += 3000
+    assert cache.get('1.1', 'videos/video_1_1.mp4') == url
+    assert client.signed == ['videos/video_1_1.mp4']
+
+    # Nothing is close to expiry yet
+    cache.renew_expiring()
+    assert cache.get('1.1', 'videos/video_1_1.mp4') == url
+
+    # Within renew_before of expiry the renewer signs a replacement
+    clock.now += 400
+    cache.renew_expiring()
+    renewed = cache.get('1.1', 'videos/video_1_1.mp4')
+    assert renewed != url
+    assert len(client.signed) == 2
+
+    clock.now += 3000
+    assert cache.get('1.1', 'videos/video_1_1.mp4') == renewed
+
+def test_expired_url_is_signed_on_request(cache, client, clock):
+    url = cache.get('1.1', 'videos/video_1_1.mp4')
+    clock.now += 3600
+    assert cache.get('1.1', 'videos/video_1_1.mp4') != url
+    assert len(client.signed) == 2
+
+def test_idle_urls_are_dropped_instead_of_renewed(cache, client, clock):
+    cache.get('1.1', 'videos/video_1_1.mp4')
+    cache.get('1.2', 'videos/video_1_2.mp4')
+
+    # 1.2 keeps being requested; 1.1 was used less than a lifetime ago, so
+    # it is still renewed once
+    clock.now += 3400
+    cache.get('1.2', 'videos/video_1_2.mp4')
+    cache.renew_expiring()
+    assert client.signed.count('videos/video_1_1.mp4') == 2
+
+    # Not asked for during a whole lifetime: dropped instead of renewed
+    clock.now += 3400
+    cache.get('1.2', 'videos/video_1_2.mp4')
+    cache.renew_expiring()
+    assert client.signed.count('videos/video_1_1.mp4') == 2
+    assert client.signed.count('videos/video_1_2.mp4') == 3
+
+    cache.get('1.1', 'videos/video_1_1.mp4')
+    assert client.signed.count('videos/video_1_1.mp4') == 3
+
+def test_invalidate(cache, client):
+    first = cache.get('1.1', 'videos/video_1_1.mp4')
+    second = cache.get('1.2', 'videos/video_1_2.mp4')
+
+    cache.invalidate('1.1')
+    assert cache.get('1.1', 'videos/video_1_1.mp4') != first
+    assert cache.get('1.2', 'videos/video_1_2.mp4') == second
+
+    cache.invalidate()
+    assert cache.get('1.2', 'videos/video_1_2.mp4') != second
+    assert len(client.signed) == 4
+
+def test_renew_before_is_capped_at_half_the_lifetime(client):
+    assert PresignedUrlCache(client, BUCKET, expires_in=60, renew_before=300).renew_before == 30
+
+def test_catalog_replaced_object_gets_a_new_url(monkeypatch):
+    signed = []
+    sign = PresignedUrlCache._sign
+    monkeypatch.setattr(PresignedUrlCache, '_sign', lambda self, key, now: signed.append(key) or sign(self, key, now))
+
+    with mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_object(Bucket=BUCKET, Key='videos/video_1_1.mp4', Body=b'x' * 16)
+
+        catalog = S3VideoCatalog(BUCKET, client=s3, refresh_interval=0, metadata_workers=0,
+                                 probe_media=False, presign_expires=3600)
+        url = catalog.get('1.1')
+        assert 'Signature=' in url and 'Expires=' in url
+        assert catalog.get('1.1') == url
+        assert signed == ['videos/video_1_1.mp4']
+
+        # Unchanged listings keep the URL; a replaced object is signed again
+        catalog.refresh()
+        assert catalog.get('1.1') == url
+        s3.put_object(Bucket=BUCKET, Key='videos/video_1_1.mp4', Body=b'y' * 32)
+        catalog.refresh()
+        catalog.get('1.1')
+        assert signed == ['videos/video_1_1.mp4'] * 2
+        catalog.presigner.stop()
@@ -0,0 +1,83 @@
+import boto3
+import pytest
+from moto import mock_aws
+
+import s3_catalog
+from s3_catalog import S3VideoCatalog
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+BUCKET = 'wound-care-catalog-test'
+
+# More than one ListObjectsV2 page (1,000 keys)
+OBJECT_COUNT = 1100
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+@pytest.fixture
+def probed(monkeypatch):
+    """Record the keys the catalog reads MP4 headers of"""
+    keys = []
+
+    def fake_probe(client, bucket, key, size):
+        keys.append(key)
+        return {'valid': True, 'faststart': True, 'size': size}
+
+    monkeypatch.setattr(s3_catalog, 'probe_s3_object', fake_probe)
+    return keys
+
+def make_catalog(client):
+    return S3VideoCatalog(BUCKET, client=client, refresh_interval=0, metadata_workers=0)
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_lists_every_page_and_probes_only_changed_objects(s3, probed):
+    for i in range(OBJECT_COUNT):
+        s3.put_object(Bucket=BUCKET, Key=f"videos/video_9_{i}.mp4", Body=b'x' * 16)
+
+    catalog = make_catalog(s3)
+    videos = catalog.videos()
+    assert len(videos) == OBJECT_COUNT
+    assert sorted(probed) == sorted(f"videos/video_9_{i}.mp4" for i in range(OBJECT_COUNT))
+    assert catalog.media_info('9.1099') == {'valid': True, 'faststart': True, 'size': 16}
+
+    # Nothing changed: nothing is probed again
+    probed.clear()
+    catalog.refresh()
+    assert probed == []
+    assert len(catalog.videos()) == OBJECT_COUNT
+
+    # Only the replaced and the added objects are probed
+    s3.put_object(Bucket=BUCKET, Key='videos/video_9_7.mp4', Body=b'y' * 32)
+    s3.put_object(Bucket=BUCKET, Key='videos/video_9_2000.mp4', Body=b'z' * 8)
+    s3.delete_object(Bucket=BUCKET, Key='videos/video_9_8.mp4')
+    catalog.refresh()
+    assert sorted(probed) == ['videos/video_9_2000.mp4', 'videos/video_9_7.mp4']
+    assert catalog.media_info('9.7')['size'] == 32
+
+    videos = catalog.videos()
+    assert len(videos) == OBJECT_COUNT
+    assert '9.8' not in videos and '9.2000' in videos
+
+def test_skips_probing_when_disabled(s3, probed):
+    s3.put_object(Bucket=BUCKET, Key='videos/video_1_0.mp4', Body=b'x' * 16)
+
+    catalog = S3VideoCatalog(BUCKET, client=s3, refresh_interval=0, metadata_workers=0, probe_media=False)
+    assert list(catalog.videos()) == ['1.0']
+    assert probed == []
+    assert catalog.media_info('1.0') is None
+
+def test_client_is_pooled_per_region_and_endpoint(monkeypatch):
+    monkeypatch.setattr(s3_catalog, '_clients', {})
+    with mock_aws():
+        client = s3_catalog.get_s3_client('us-east-1')
+        assert s3_catalog.get_s3_client('us-east-1') is client
+        assert s3_catalog.get_s3_client('eu-west-1') is not client
+        assert s3_catalog.get_s3_client('us-east-1', 'http://localhost:5000') is not client
@@ -0,0 +1,178 @@
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import s3_sync
+from manifest import S3_HASH_METADATA_KEY
+from s3_sync import MIN_PART_SIZE, STATE_FILENAME, SyncState, hash_file, sync_videos
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+BUCKET = 'wound-care-sync-test'
+PREFIX = 'videos/'
+
+# Files this large are multipart uploads of three parts
+LARGE_SIZE = 2 * MIN_PART_SIZE + 1024
+
+@pytest.fixture
+def s3():
+    with mock_aws():
+        client = boto3.client('s3', region_name='us-east-1')
+        client.create_bucket(Bucket=BUCKET)
+        yield client
+
+@pytest.fixture
+def video_dir(tmp_path):
+    write_video(tmp_path, 'video_1_1.mp4', b'small video')
+    write_video(tmp_path, 'video_2_1.mp4', os.urandom(LARGE_SIZE))
+    return tmp_path
+
+def write_video(directory, filename, data):
+    path = directory / filename
+    path.write_bytes(data)
+    return path
+
+def sync(client, video_dir, **kwargs):
+    return sync_videos(video_dir=str(video_dir), bucket=BUCKET, prefix=PREFIX, client=client,
+                       part_size=MIN_PART_SIZE, workers=4, **kwargs)
+
+def bucket_contents(client):
+    """{key: bytes} of every object in the bucket"""
+    keys = [obj['Key'] for obj in client.list_objects_v2(Bucket=BUCKET).get('Contents', [])]
+    return {key: client.get_object(Bucket=BUCKET, Key=key)['Body'].read() for key in keys}
+
+def local_contents(video_dir, *filenames):
+    return {PREFIX + name: (video_dir / name).read_bytes() for name in filenames}
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_first_upload_then_nothing_to_do(s3, video_dir):
+    result = sync(s3, video_dir)
+    assert sorted(result['uploaded']) == ['videos/video_1_1.mp4', 'videos/video_2_1.mp4']
+    assert result['failed'] == {}
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+
+    # Both the single PUT and the multipart upload carry the content hash
+    for name in ('video_1_1.mp4', 'video_2_1.mp4'):
+        head = s3.head_object(Bucket=BUCKET, Key=PREFIX + name)
+        assert head['Metadata'][S3_HASH_METADATA_KEY] == hash_file(str(video_dir / name))[0]
+        assert head['ContentType'] == 'video/mp4'
+    assert s3.head_object(Bucket=BUCKET, Key='videos/video_2_1.mp4')['ETag'].endswith('-3"')
+
+    result = sync(s3, video_dir)
+    assert result['uploaded'] == []
+    assert result['up_to_date'] == ['videos/video_1_1.mp4', 'videos/video_2_1.mp4']
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+
+def test_changed_file_is_uploaded_again(s3, video_dir):
+    sync(s3, video_dir)
+    write_video(video_dir, 'video_1_1.mp4', b'edited video')
+
+    result = sync(s3, video_dir)
+    assert result['uploaded'] == ['videos/video_1_1.mp4']
+    assert result['planned_uploads'] == [('videos/video_1_1.mp4', 'changed', len(b'edited video'))]
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+
+def test_objects_uploaded_elsewhere_are_matched_by_etag(s3, video_dir):
+    # No SHA-256 metadata: a plain PUT (MD5 ETag) and a multipart upload
+    small = (video_dir / 'video_1_1.mp4').read_bytes()
+    s3.put_object(Bucket=BUCKET, Key='videos/video_1_1.mp4', Body=small)
+
+    large = (video_dir / 'video_2_1.mp4').read_bytes()
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET, Key='videos/video_2_1.mp4')['UploadId']
+    parts = []
+    for number, offset in enumerate(range(0, len(large), MIN_PART_SIZE), start=1):
+        response = s3.upload_part(Bucket=BUCKET, Key='videos/video_2_1.mp4', UploadId=upload_id,
+                                  PartNumber=number, Body=large[offset:offset + MIN_PART_SIZE])
+        parts.append({'PartNumber': number, 'ETag': response['ETag']})
+    s3.complete_multipart_upload(Bucket=BUCKET, Key='videos/video_2_1.mp4', UploadId=upload_id,
+                                 MultipartUpload={'Parts': parts})
+
+    result = sync(s3, video_dir)
+    assert result['uploaded'] == []
+    assert result['up_to_date'] == ['videos/video_1_1.mp4', 'videos/video_2_1.mp4']
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+
+def test_interrupted_multipart_upload_resumes(s3, video_dir, monkeypatch):
+    upload_part = s3_sync.Uploader._upload_part
+    sent = []
+
+    def failing_upload_part(self, item, upload_id, number, part_size):
+        if number == 2:
+            raise ConnectionError("connection reset")
+        sent.append(number)
+        return upload_part(self, item, upload_id, number, part_size)
+
+    monkeypatch.setattr(s3_sync.Uploader, '_upload_part', failing_upload_part)
+    result = sync(s3, video_dir)
+    assert list(result['failed']) == ['videos/video_2_1.mp4']
+    assert sorted(sent) == [1, 3]
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4')
+
+    # The unfinished upload is remembered in the state file
+    state = SyncState(str(video_dir / STATE_FILENAME))
+    saved = state.uploads['videos/video_2_1.mp4']
+    assert s3.list_parts(Bucket=BUCKET, Key='videos/video_2_1.mp4', UploadId=saved['upload_id'])['Parts']
+
+    # The next run only sends the missing part, under the same upload ID
+    sent.clear()
+    monkeypatch.setattr(s3_sync.Uploader, '_upload_part',
+                        lambda self, *args: sent.append(args[2]) or upload_part(self, *args))
+    result = sync(s3, video_dir)
+    assert result['uploaded'] == ['videos/video_2_1.mp4']
+    assert sent == [2]
+    assert SyncState(str(video_dir / STATE_FILENAME)).uploads == {}
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+
+def test_stale_alternates_and_removed_refs_are_deleted(s3, video_dir):
+    # A .mov left over from before the .mp4, and a reference removed locally
+    s3.put_object(Bucket=BUCKET, Key='videos/video_1_1.mov', Body=b'old format')
+    s3.put_object(Bucket=BUCKET, Key='videos/video_9_9.mp4', Body=b'removed video')
+    # Objects in sub-prefixes (e.g. HLS packages) are never touched
+    s3.put_object(Bucket=BUCKET, Key='videos/hls/video_1_1/master.m3u8', Body=b'#EXTM3U')
+
+    result = sync(s3, video_dir)
+    assert result['deleted'] == ['videos/video_1_1.mov']
+    expected = local_contents(video_dir, 'video_1_1.mp4', 'video_2_1.mp4')
+    expected['videos/video_9_9.mp4'] = b'removed video'
+    expected['videos/hls/video_1_1/master.m3u8'] = b'#EXTM3U'
+    assert bucket_contents(s3) == expected
+
+    result = sync(s3, video_dir, delete_missing=True)
+    assert result['deleted'] == ['videos/video_9_9.mp4']
+    del expected['videos/video_9_9.mp4']
+    assert bucket_contents(s3) == expected
+
+def test_keep_alternates_and_dry_run_change_nothing(s3, video_dir):
+    s3.put_object(Bucket=BUCKET, Key='videos/video_1_1.mov', Body=b'old format')
+
+    result = sync(s3, video_dir, keep_alternates=True, dry_run=True)
+    assert [key for key, _, _ in result['planned_uploads']] == ['videos/video_1_1.mp4', 'videos/video_2_1.mp4']
+    assert result['planned_deletes'] == []
+    assert bucket_contents(s3) == {'videos/video_1_1.mov': b'old format'}
+
+    result = sync(s3, video_dir, keep_alternates=True)
+    assert result['deleted'] == []
+    assert 'videos/video_1_1.mov' in bucket_contents(s3)
+
+def test_unfinished_upload_not_resumed_is_aborted(s3, video_dir, monkeypatch):
+    def failing_upload_part(self, item, upload_id, number, part_size):
+        raise ConnectionError("connection reset")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(s3_sync.Uploader, '_upload_part', failing_upload_part)
+        sync(s3, video_dir)
+    assert len(s3.list_multipart_uploads(Bucket=BUCKET)['Uploads']) == 1
+
+    # The large video is gone locally, so its upload will never be resumed
+    (video_dir / 'video_2_1.mp4').unlink()
+    result = sync(s3, video_dir)
+    assert result['aborted'] == ['videos/video_2_1.mp4']
+    assert s3.list_multipart_uploads(Bucket=BUCKET).get('Uploads', []) == []
+    assert SyncState(str(video_dir / STATE_FILENAME)).uploads == {}
+    assert bucket_contents(s3) == local_contents(video_dir, 'video_1_1.mp4')
@@ -0,0 +1,107 @@
+from types import MappingProxyType
+
+import pytest
+
+from decision_tree import get_decision_tree, path_slug
+from search import SearchIndex, parse_vtt, tokenize
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+class FakeCatalog:
+    """Catalog version, titles and transcripts as the index reads them"""
+
+    def __init__(self):
+        self.version = 1
+        self._titles = MappingProxyType({})
+        self._transcripts = MappingProxyType({})
+
+    def titles(self):
+        return self._titles
+
+    def transcripts(self):
+        return self._transcripts
+
+    def change(self, titles=None, transcripts=None):
+        if titles is not None:
+            self._titles = MappingProxyType(titles)
+        if transcripts is not None:
+            self._transcripts = MappingProxyType(transcripts)
+        self.version += 1
+
+@pytest.fixture
+def catalog():
+    return FakeCatalog()
+
+@pytest.fixture
+def index(catalog):
+    index = SearchIndex(get_decision_tree())
+    index.update(catalog)
+    return index
+
+def refs(hits):
+    return [hit.ref for hit in hits]
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_tokenize_drops_stopwords_and_plurals():
+    assert tokenize("The Wounds of the Toes") == ['wound', 'toe']
+    assert tokenize("dressing gloss") == ['dressing', 'gloss']
+
+def test_parse_vtt_keeps_cue_text_and_start():
+    text = "WEBVTT\n\nNOTE skip me\n\n1\n00:00:01.500 --> 00:00:04.000\n<v Nurse>Clean the <b>heel</b>\n\n01:02.250 --> 01:05.000 align:start\nApply tubifast\n"
+    assert parse_vtt(text) == [(1.5, 'Clean the heel'), (62.25, 'Apply tubifast')]
+
+def test_title_matches_rank_first(index):
+    hits = index.search("heel location")
+    assert refs(hits)[0] == '3.3'
+    assert hits[0].title == 'Heel Location Treatment'
+    # The hit points at a path that shows the video, at its position
+    tree = get_decision_tree()
+    assert tree.sequences[hits[0].path][hits[0].position] == '3.3'
+
+def test_last_word_matches_as_a_prefix(index):
+    assert refs(index.search("tubi"))[0] == '4.0'
+    # A finished word (trailing space) is not expanded
+    assert index.search("tubi ") == []
+
+def test_path_counts_pick_the_most_used_path(index):
+    tree = get_decision_tree()
+    paths = [path for path, sequence in tree.sequences.items() if '4.0' in sequence]
+    busiest = paths[-1]
+    hit = index.search("tubifast", path_counts={path_slug(busiest): 10})[0]
+    assert hit.path == busiest
+
+def test_update_reindexes_only_changed_videos(index, catalog):
+    before = index._snapshot
+    heel_score = index.search("heel")[0].score
+    catalog.change(titles={'3.3': 'Calcaneus care'})
+    assert not index.is_current(catalog)
+    index.update(catalog)
+    after = index._snapshot
+
+    assert refs(index.search("calcaneus")) == ['3.3']
+    # Still matched by its option label, but no longer by its title
+    assert index.search("heel")[0].score < heel_score
+    # Unchanged documents are reused; the published snapshot was not touched
+    assert after.documents['3.1'] is before.documents['3.1']
+    assert before.documents['3.3'].signature[0] == 'Heel Location Treatment'
+    assert 'calcaneu' not in before.postings and 'calcaneu' in after.postings
+    assert after.total_length - before.total_length == (
+        after.documents['3.3'].length - before.documents['3.3'].length
+    )
+
+def test_transcript_cues_are_searchable(index, catalog, tmp_path):
+    transcript = tmp_path / 'video_3_3.vtt'
+    transcript.write_text("WEBVTT\n\n00:00:12.000 --> 00:00:15.000\nOffload pressure with a pillow\n")
+    catalog.change(transcripts={'3.3': str(transcript)})
+    index.update(catalog)
+
+    hit = index.search("pillow")[0]
+    assert (hit.ref, hit.start_time, hit.snippet) == ('3.3', 12.0, 'Offload pressure with a pillow')
+
+    # Removing the transcript drops its terms
+    catalog.change(transcripts={})
+    index.update(catalog)
+    assert index.search("pillow") == []
@@ -0,0 +1,86 @@
+import pytest
+
+import sequence_index
+from decision_tree import load_decision_tree
+from sequence_index import SequenceIndex, get_sequence_index
+from utils import get_video_sequence
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+class FakeCatalog:
+    """Just enough of a video catalog for the sequence index"""
+
+    def __init__(self, titles=None):
+        self.version = 1
+        self._titles = titles or {}
+
+    def videos(self):
+        return {}
+
+    def titles(self):
+        return self._titles
+
+@pytest.fixture
+def tree():
+    return load_decision_tree()
+
+@pytest.fixture
+def catalog(monkeypatch, tree):
+    """Serve get_sequence_index() from a fresh index over a fake catalog"""
+    catalog = FakeCatalog({'4.0': 'Tubifast (storage title)'})
+    monkeypatch.setattr(sequence_index, 'get_catalog', lambda: catalog)
+    monkeypatch.setattr(sequence_index, 'get_decision_tree', lambda: tree)
+    monkeypatch.setattr(sequence_index, '_index', None)
+    return catalog
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_every_path_is_indexed(tree):
+    index = SequenceIndex(tree, FakeCatalog())
+    for path, refs in tree.sequences.items():
+        assert [entry['ref'] for entry in index.lookup(path)] == list(refs)
+    assert index.lookup((('type_of_wound', 'unknown'),)) is None
+
+def test_entries_are_shared_and_read_only(tree):
+    index = SequenceIndex(tree, FakeCatalog())
+    first = index.lookup(tree.path_for_slug('webspace'))
+    second = index.lookup(tree.path_for_slug('povidone'))
+    # The common tail is the same objects in every sequence
+    assert first[-1] is second[-1]
+    assert index.lookup(tree.path_for_slug('webspace')) is first
+    with pytest.raises(TypeError):
+        first[0]['title'] = 'Edited'
+
+def test_storage_titles_win_over_the_tree(tree):
+    index = SequenceIndex(tree, FakeCatalog({'2.3': 'Webspace (storage title)'}))
+    sequence = index.lookup(tree.path_for_slug('webspace'))
+    assert [entry['title'] for entry in sequence] == [
+        'Webspace (storage title)', 'Tubifast to secure', 'Things to watch out for',
+    ]
+
+def test_index_is_rebuilt_when_catalog_or_tree_changes(catalog, tree, monkeypatch):
+    index = get_sequence_index()
+    assert get_sequence_index() is index
+
+    catalog.version += 1
+    rebuilt = get_sequence_index()
+    assert rebuilt is not index
+    assert get_sequence_index() is rebuilt
+
+    other_tree = load_decision_tree()
+    monkeypatch.setattr(sequence_index, 'get_decision_tree', lambda: other_tree)
+    assert get_sequence_index() is not rebuilt
+
+def test_get_video_sequence(catalog, tree):
+    selections = tree.selections_for(tree.path_for_slug('superficial/heel/sheet'))
+    sequence = get_video_sequence(selections)
+    assert [entry['ref'] for entry in sequence] == ['3.3', '2.1.1', '4.0', '5.0']
+    assert sequence[2]['title'] == 'Tubifast (storage title)'
+    assert get_video_sequence(selections) is sequence
+
+    # Incomplete paths still get their chosen videos and the common tail
+    partial = get_video_sequence(selections[:2])
+    assert [entry['ref'] for entry in partial] == ['3.3', '4.0', '5.0']
+    assert partial[1] is sequence[2]
@@ -0,0 +1,54 @@
+import pytest
+
+from stitch import Stitcher, _create_stitcher
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+class FakeCatalog:
+    """Just enough of a LocalVideoCatalog for the stitcher"""
+    kind = 'local'
+
+    def __init__(self, video_dir, error=None):
+        self.video_dir = str(video_dir)
+        self.version = 1
+        self.error = error
+
+    def videos(self):
+        if self.error is not None:
+            raise self.error
+        return {}
+
+SEQUENCE = [{'ref': '1.1', 'title': 'Cleanse'}, {'ref': '4.0', 'title': 'Secure'}]
+
+def settings(mode, video_server=True):
+    return {"CONTINUOUS_PLAYBACK": mode, "LOCAL_VIDEO_SERVER": video_server}
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_unknown_mode_is_ignored():
+    assert _create_stitcher(settings('webm')) is None
+    assert _create_stitcher(settings('')) is None
+
+@pytest.mark.parametrize('mode', ['mp4', 'hls'])
+def test_stitching_needs_the_video_server(mode, monkeypatch, tmp_path):
+    import catalog
+    monkeypatch.setattr(catalog, 'get_catalog', lambda: FakeCatalog(tmp_path))
+    assert _create_stitcher(settings(mode, video_server=False)) is None
+    assert isinstance(_create_stitcher(settings(mode)), Stitcher)
+
+@pytest.mark.parametrize('error', [KeyError('1.1'), RuntimeError("executor shut down")])
+def test_failed_resolve_is_not_left_pending(error, tmp_path):
+    stitcher = Stitcher(FakeCatalog(tmp_path, error=error))
+    assert stitcher.get(SEQUENCE) is None
+    stitcher._pending[('1.1', '4.0')].result()
+    assert stitcher._pending == {}
+
+    # Once the catalog works again the sequence is resolved again
+    stitcher.catalog.error = None
+    assert stitcher.get(SEQUENCE) is None
+    stitcher._pending[('1.1', '4.0')].result()
+    assert stitcher._streams[('1.1', '4.0')] == (1, None)
+    assert stitcher.get(SEQUENCE) is None
+    assert stitcher._pending == {}
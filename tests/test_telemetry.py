@@ -0,0 +1,57 @@
+import json
+import time
+
+import pytest
+
+from telemetry import EventRecorder, JsonlStore, SqliteStore, open_store
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+@pytest.fixture
+def recorder(tmp_path):
+    recorder = EventRecorder(JsonlStore(str(tmp_path / 'events.jsonl')), batch_size=1, flush_seconds=0.05)
+    recorder.start()
+    yield recorder
+    recorder.stop()
+
+#==============================================================================
+# TESTS
+#==============================================================================
+@pytest.mark.parametrize('filename, store_type', [('events.jsonl', JsonlStore), ('events.db', SqliteStore)])
+def test_batches_are_written_and_counted(tmp_path, filename, store_type):
+    store = open_store(str(tmp_path / filename))
+    assert isinstance(store, store_type)
+    recorder = EventRecorder(store, batch_size=2, flush_seconds=0.05)
+    recorder.start()
+    recorder.record('step', path='superficial', step='location_selection', source='app')
+    recorder.record('sequence', path='superficial/heel', refs=['3.3', '4.0'])
+    recorder.record('play', ref='3.3')
+    recorder.record('play', ref='3.3')
+    recorder.stop()
+
+    assert [event['kind'] for event in open_store(store.path).read()] == ['step', 'sequence', 'play', 'play']
+    assert recorder.stats.hot_refs() == [('3.3', 2)]
+    assert recorder.stats.hot_paths() == [('superficial/heel', 1)]
+
+def test_bad_event_does_not_stop_the_writer(recorder):
+    recorder.record('play', ref=object())
+    wait_for(lambda: recorder._queue.empty())
+    recorder.record('play', ref='4.0')
+    wait_for(lambda: ('4.0', 1) in recorder.stats.hot_refs())
+
+    assert recorder._thread.is_alive()
+    recorder.stop()
+    with open(recorder.store.path) as f:
+        assert [json.loads(line)['ref'] for line in f] == ['4.0']
+
+def test_full_queue_drops_instead_of_blocking(tmp_path):
+    recorder = EventRecorder(JsonlStore(str(tmp_path / 'events.jsonl')), queue_size=2)
+    assert recorder.record('play', ref='1') and recorder.record('play', ref='2')
+    assert recorder.record('play', ref='3') is False
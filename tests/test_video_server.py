@@ -0,0 +1,126 @@
+import os
+import threading
+import http.client
+from email.utils import formatdate
+
+import pytest
+
+from video_server import VideoServer
+
+#==============================================================================
+# FIXTURES
+#==============================================================================
+DATA = bytes(range(256)) * 40  # 10,240 bytes
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / 'video_1_1.mp4').write_bytes(DATA)
+    (tmp_path / 'notes.txt').write_text('not a video')
+    server = VideoServer(('127.0.0.1', 0), str(tmp_path))
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def request(server, path='/videos/video_1_1.mp4', method='GET', **headers):
+    connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=10)
+    try:
+        connection.request(method, path, headers={key.replace('_', '-'): value for key, value in headers.items()})
+        response = connection.getresponse()
+        return response.status, response.headers, response.read()
+    finally:
+        connection.close()
+
+#==============================================================================
+# TESTS
+#==============================================================================
+def test_whole_file(server):
+    status, headers, body = request(server)
+    assert status == 200
+    assert body == DATA
+    assert headers['Content-Length'] == str(len(DATA))
+    assert headers['Content-Type'] == 'video/mp4'
+    assert headers['Accept-Ranges'] == 'bytes'
+    assert headers['ETag']
+
+def test_head_sends_headers_only(server):
+    status, headers, body = request(server, method='HEAD')
+    assert status == 200
+    assert headers['Content-Length'] == str(len(DATA))
+    assert body == b''
+
+@pytest.mark.parametrize('header, start, end', [
+    ('bytes=0-99', 0, 99),
+    ('bytes=10000-', 10000, len(DATA) - 1),
+    ('bytes=-100', len(DATA) - 100, len(DATA) - 1),
+    ('bytes=10000-99999', 10000, len(DATA) - 1),
+])
+def test_byte_ranges(server, header, start, end):
+    status, headers, body = request(server, Range=header)
+    assert status == 206
+    assert headers['Content-Range'] == f"bytes {start}-{end}/{len(DATA)}"
+    assert body == DATA[start:end + 1]
+
+@pytest.mark.parametrize('header', ['bytes=20000-', 'bytes=-0', 'bytes=50-10'])
+def test_unsatisfiable_range(server, header):
+    status, headers, body = request(server, Range=header)
+    assert status == 416
+    assert headers['Content-Range'] == f"bytes */{len(DATA)}"
+    assert body == b''
+
+def test_multi_range_gets_whole_file(server):
+    status, _, body = request(server, Range='bytes=0-9,20-29')
+    assert status == 200
+    assert body == DATA
+
+def test_if_range_honours_range_only_for_current_copy(server):
+    etag = request(server, method='HEAD')[1]['ETag']
+
+    status, _, body = request(server, Range='bytes=0-9', If_Range=etag)
+    assert status == 206 and body == DATA[:10]
+
+    # A stale validator means the client's bytes are from another version
+    status, _, body = request(server, Range='bytes=0-9', If_Range='"stale"')
+    assert status == 200 and body == DATA
+
+    status, _, body = request(server, Range='bytes=0-9', If_Range=formatdate(0, usegmt=True))
+    assert status == 200 and body == DATA
+
+def test_not_modified(server, tmp_path):
+    status, headers, _ = request(server, method='HEAD')
+    etag, last_modified = headers['ETag'], headers['Last-Modified']
+
+    status, headers, body = request(server, If_None_Match=etag)
+    assert status == 304
+    assert headers['ETag'] == etag
+    assert body == b''
+
+    status, _, _ = request(server, If_Modified_Since=last_modified)
+    assert status == 304
+
+    # A replaced file gets a new ETag
+    path = tmp_path / 'video_1_1.mp4'
+    path.write_bytes(DATA[::-1])
+    os.utime(path, (0, os.stat(path).st_mtime + 10))
+    status, headers, body = request(server, If_None_Match=etag)
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert body == DATA[::-1]
+
+@pytest.mark.parametrize('path', [
+    '/videos/missing.mp4',
+    '/videos/notes.txt',
+    '/videos/../video_1_1.mp4',
+    '/videos/%2e%2e/%2e%2e/etc/passwd',
+    '/other/video_1_1.mp4',
+])
+def test_refuses_other_paths(server, path):
+    assert request(server, path)[0] == 404
+
+def test_missing_file_redirects_to_fallback(server):
+    server.fallback = lambda relative: f"https://bucket.example/{relative}" if relative.endswith('.mp4') else None
+    status, headers, _ = request(server, '/videos/video_2_1.mp4')
+    assert status == 307
+    assert headers['Location'] == 'https://bucket.example/video_2_1.mp4'
+    assert headers['Cache-Control'] == 'no-store'